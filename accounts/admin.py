@@ -1,7 +1,76 @@
 from django.contrib import admin
+from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.cache import cache
 
-from .models import FriendShip, User
+from mysite.admin import ScalableModelAdmin
 
-admin.site.register(User)
-admin.site.register(FriendShip)
-# Register your models here.
+from .backends import user_cache_key
+from .models import Block, DegreeBucket, FriendShip, GraphAnalysis, Influencer, User
+
+
+@admin.register(User)
+class UserAdmin(ScalableModelAdmin, BaseUserAdmin):
+    # is_staff, is_active and groups are not indexed; search by exact username instead.
+    list_filter = ()
+    search_fields = ("=username",)
+    actions = ["delete_in_chunks", "deactivate_in_chunks"]
+
+    @admin.action(description="選択されたユーザーを分割して無効化", permissions=["change"])
+    def deactivate_in_chunks(self, request, queryset):
+        updated = self.update_in_chunks(queryset, is_active=False)
+        self.message_user(request, f"{updated}人を無効化しました。")
+
+    def chunk_updated(self, pks):
+        # Otherwise CachedModelBackend keeps authenticating deactivated users until their entries expire.
+        cache.delete_many([user_cache_key(pk) for pk in pks])
+
+
+@admin.register(FriendShip)
+class FriendShipAdmin(ScalableModelAdmin):
+    list_display = ("id", "follower", "following", "created_at")
+    list_select_related = ("follower", "following")
+    raw_id_fields = ("follower", "following")
+
+
+@admin.register(Block)
+class BlockAdmin(ScalableModelAdmin):
+    list_display = ("id", "blocker", "blocked", "kind", "created_at")
+    list_select_related = ("blocker", "blocked")
+    raw_id_fields = ("blocker", "blocked")
+
+
+class ReadOnlyInline(admin.TabularInline):
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class DegreeBucketInline(ReadOnlyInline):
+    model = DegreeBucket
+    fields = ("direction", "min_degree", "max_degree", "users")
+    ordering = ("direction", "min_degree")
+
+
+class InfluencerInline(ReadOnlyInline):
+    model = Influencer
+    fields = ("rank", "user", "pagerank", "followers")
+    raw_id_fields = ("user",)
+
+
+@admin.register(GraphAnalysis)
+class GraphAnalysisAdmin(admin.ModelAdmin):
+    """Written by ``python manage.py analyze_graph``; read-only here."""
+
+    list_display = ("created_at", "users", "edges", "reciprocity", "components", "largest_component", "duration")
+    inlines = [DegreeBucketInline, InfluencerInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+
+def user_cache_key(user_id):
+    return f"accounts:user:{user_id}"
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend that serves ``get_user()`` from the cache.
+
+    ``AuthenticationMiddleware`` calls ``get_user()`` on every request and then
+    compares the user's session auth hash with the one stored in the session,
+    so a cached row with an outdated password is still rejected. The entry is
+    dropped whenever the user is saved or deleted (see ``accounts.signals``).
+    """
+
+    def get_user(self, user_id):
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, settings.USER_CACHE_TIMEOUT)
+        return user
@@ -0,0 +1,77 @@
+import random
+
+from django.contrib.auth import get_user_model
+
+from mysite.benchmarks import scenario, timed
+from tweets.models import Tweet
+
+from .blocking import get_block_set, invalidate_block_set
+from .graph import analyze
+from .models import Block, FriendShip
+
+User = get_user_model()
+
+
+@scenario("blocks")
+def blocks(blocked=5000, authors=200, tweets=2000, repeat=5):
+    """Filter a timeline for a heavy blocker: NOT IN subquery vs. the cached id set, in SQL and in Python."""
+    viewer = User.objects.create(username="benchmark-blocker")
+    users = User.objects.bulk_create(User(username=f"benchmark-blocked-{i}") for i in range(blocked + authors))
+    Block.objects.bulk_create(Block(blocker=viewer, blocked=user, kind=Block.Kind.BLOCK) for user in users[:blocked])
+    # A quarter of the timeline is written by blocked users.
+    candidates = users[: authors // 4] + users[blocked:]
+    Tweet.objects.bulk_create(Tweet(user=random.choice(candidates), content=f"tweet {i}") for i in range(tweets))
+
+    def subquery(limit=None):
+        hidden = Block.objects.filter(blocker=viewer).values("blocked")
+        return list(Tweet.objects.exclude(user__in=hidden).order_by("-created_at")[:limit])
+
+    def literal_ids(limit=None):
+        hidden = get_block_set(viewer.pk).hidden
+        return list(Tweet.objects.exclude(user__in=hidden).order_by("-created_at")[:limit])
+
+    def cached_set(limit=None):
+        return list(get_block_set(viewer.pk).exclude(Tweet.objects.order_by("-created_at"))[:limit])
+
+    def python_filter():
+        return get_block_set(viewer.pk).exclude(list(Tweet.objects.order_by("-created_at")))
+
+    def cold_set(limit=None):
+        invalidate_block_set(viewer.pk)
+        return cached_set(limit)
+
+    assert len(subquery()) == len(literal_ids()) == len(cached_set()) == len(python_filter())
+    return [
+        (f"NOT IN subquery ({blocked} blocks)", timed(subquery, repeat)),
+        (f"NOT IN cached ids ({blocked} blocks)", timed(literal_ids, repeat)),
+        (f"filter in Python ({blocked} blocks)", timed(python_filter, repeat)),
+        (f"BlockSet.exclude ({blocked} blocks)", timed(cached_set, repeat)),
+        (f"cold BlockSet.exclude ({blocked} blocks)", timed(cold_set, repeat)),
+        ("first page: NOT IN subquery", timed(lambda: subquery(20), repeat)),
+        ("first page: NOT IN cached ids", timed(lambda: literal_ids(20), repeat)),
+        ("first page: BlockSet.exclude", timed(lambda: cached_set(20), repeat)),
+        ("set load only", timed(lambda: (invalidate_block_set(viewer.pk), get_block_set(viewer.pk)), repeat)),
+    ]
+
+
+@scenario("graph")
+def graph(users=20000, edges=400000, chunk_size=100000, repeat=1):
+    """Analyze a random follow graph with a few very popular accounts (see ``analyze_graph``)."""
+    created = User.objects.bulk_create((User(username=f"benchmark-graph-{i}") for i in range(users)), batch_size=5000)
+    ids = [user.pk for user in created]
+    popular = ids[:20]
+    pairs = set()
+    while len(pairs) < edges:
+        follower = random.choice(ids)
+        following = random.choice(popular if random.random() < 0.2 else ids)
+        if follower != following:
+            pairs.add((follower, following))
+    FriendShip.objects.bulk_create(
+        (FriendShip(follower_id=follower, following_id=following) for follower, following in pairs), batch_size=5000
+    )
+    summary = analyze(chunk_size, top=10)
+    assert summary.influencers[0][0] in popular
+    return [
+        (f"analyze ({users} users, {edges} follows)", timed(lambda: analyze(chunk_size, top=10), repeat)),
+        *[(f"  {step} (cumulative s)", {"s": seconds}) for step, seconds in summary.timings.items()],
+    ]
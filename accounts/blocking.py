@@ -0,0 +1,101 @@
+"""The accounts a user has blocked or muted, loaded once and cached as integer sets.
+
+QuerySets are still filtered with a ``NOT IN`` subquery on the Block table:
+``manage.py benchmark blocks`` has it ahead of both a literal ``NOT IN`` over
+the cached ids and filtering the fetched rows in Python. The set decides
+whether the subquery is needed at all, and filters the rows that are already
+in memory (merged sharded timelines, streamed chunks, ranked candidates). The
+cache holds the ids as packed 64-bit arrays (8 bytes per id) and is
+invalidated whenever the viewer's blocks change.
+"""
+from array import array
+from operator import attrgetter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q, QuerySet
+
+from .models import Block, FriendShip, expire_follow_counts
+
+
+def block_cache_key(user_id):
+    return f"accounts:blocks:{user_id}"
+
+
+class BlockSet:
+    def __init__(self, user_id, blocked=(), muted=()):
+        self.user_id = user_id
+        self.blocked = frozenset(blocked)
+        self.muted = frozenset(muted)
+        self.hidden = self.blocked | self.muted
+
+    def __contains__(self, user_id):
+        return user_id in self.hidden
+
+    def __len__(self):
+        return len(self.hidden)
+
+    def kind_of(self, user_id):
+        if user_id in self.blocked:
+            return Block.Kind.BLOCK
+        if user_id in self.muted:
+            return Block.Kind.MUTE
+        return None
+
+    def exclude(self, rows, attr="user_id"):
+        """Drop the rows whose ``attr`` is a hidden user.
+
+        A QuerySet comes back as a QuerySet, so the database still does the
+        paging; any other iterable comes back as a list.
+        """
+        if isinstance(rows, QuerySet):
+            if not self.hidden:
+                return rows
+            return rows.exclude(**{f"{attr}__in": Block.objects.filter(blocker_id=self.user_id).values("blocked")})
+        get = attrgetter(attr)
+        return [row for row in rows if get(row) not in self.hidden]
+
+
+def _unpack(data):
+    ids = array("q")
+    ids.frombytes(data)
+    return ids
+
+
+def get_block_set(user_id):
+    entry = cache.get(block_cache_key(user_id))
+    if entry is None:
+        blocked, muted = array("q"), array("q")
+        for blocked_id, kind in Block.objects.filter(blocker_id=user_id).values_list("blocked_id", "kind"):
+            (blocked if kind == Block.Kind.BLOCK else muted).append(blocked_id)
+        entry = (blocked.tobytes(), muted.tobytes())
+        cache.set(block_cache_key(user_id), entry, settings.BLOCK_CACHE_TIMEOUT)
+    return BlockSet(user_id, _unpack(entry[0]), _unpack(entry[1]))
+
+
+def invalidate_block_set(user_id):
+    cache.delete(block_cache_key(user_id))
+
+
+def block(blocker, blocked, kind=Block.Kind.BLOCK):
+    """Block or mute ``blocked``, replacing an earlier block or mute of the same user."""
+    with transaction.atomic():
+        Block.objects.bulk_create(
+            [Block(blocker=blocker, blocked=blocked, kind=kind)],
+            update_conflicts=True,
+            unique_fields=["blocker", "blocked"],
+            update_fields=["kind"],
+        )
+        if kind == Block.Kind.BLOCK:
+            FriendShip.objects.filter(
+                Q(follower=blocker, following=blocked) | Q(follower=blocked, following=blocker)
+            ).delete()
+            expire_follow_counts([blocker.pk, blocked.pk])
+    invalidate_block_set(blocker.pk)
+
+
+def unblock(blocker, blocked, kind=Block.Kind.BLOCK):
+    deleted = Block.objects.filter(blocker=blocker, blocked=blocked, kind=kind).delete()[0]
+    invalidate_block_set(blocker.pk)
+    return deleted
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from accounts.graph import analyze, save_summary
+from accounts.tasks import analyze_graph
+from jobs.queue import enqueue
+
+
+class Command(BaseCommand):
+    help = "Compute degree distributions, reciprocity, components and PageRank of the follow graph for the admin."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=100000, help="Rows loaded per query.")
+        parser.add_argument("--top", type=int, default=100, help="Number of influencers to keep.")
+        parser.add_argument("--dry-run", action="store_true", help="Print the summary without saving it.")
+        parser.add_argument("--enqueue", action="store_true", help="Leave the analysis to `runworker` instead.")
+
+    def handle(self, *args, **options):
+        if options["enqueue"]:
+            job = enqueue(analyze_graph, chunk_size=options["chunk_size"], top=options["top"])
+            self.stdout.write(self.style.SUCCESS(f"Queued job {job.pk}."))
+            return
+        summary = analyze(chunk_size=options["chunk_size"], top=options["top"])
+        self.stdout.write(f"{summary.users} users, {summary.edges} follows")
+        self.stdout.write(f"reciprocity: {summary.reciprocity:.1%}")
+        self.stdout.write(
+            f"components: {summary.components} (largest {summary.largest_component}, "
+            f"{summary.isolated_users} isolated users)"
+        )
+        for label, buckets in [("followers", summary.in_degrees), ("following", summary.out_degrees)]:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{label} per user"))
+            for low, high, users in buckets:
+                self.stdout.write(f"  {f'{low}-{high}' if high != low else str(low):>15}  {users}")
+        self.stdout.write(self.style.MIGRATE_HEADING("top PageRank"))
+        for user_id, score, followers in summary.influencers[:10]:
+            self.stdout.write(f"  user {user_id:<10} pagerank {score:.6f}  followers {followers}")
+        self.stdout.write("  ".join(f"{step} {seconds}s" for step, seconds in summary.timings.items()))
+
+        if not options["dry_run"]:
+            analysis = save_summary(summary)
+            self.stdout.write(self.style.SUCCESS(f"Saved analysis {analysis.pk}."))
@@ -0,0 +1,47 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from accounts.models import FriendShip
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Make a user follow (or unfollow) many users in one transaction."
+
+    def add_arguments(self, parser):
+        parser.add_argument("follower", help="Username of the user who follows.")
+        parser.add_argument("usernames", nargs="*", help="Usernames to follow.")
+        parser.add_argument("--file", help="Read additional usernames from a file, one per line.")
+        parser.add_argument("--unfollow", action="store_true")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            follower = User.objects.get(username=options["follower"])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['follower']!r} does not exist.")
+
+        usernames = set(options["usernames"])
+        if options["file"]:
+            with open(options["file"]) as f:
+                usernames.update(line.strip() for line in f if line.strip())
+        usernames.discard(follower.username)
+
+        users = list(User.objects.filter(username__in=usernames).only("pk", "username"))
+        missing = usernames - {user.username for user in users}
+        if missing:
+            self.stderr.write(f"Skipping unknown users: {', '.join(sorted(missing))}")
+
+        with transaction.atomic():
+            if options["unfollow"]:
+                count = FriendShip.objects.bulk_unfollow(follower, users)
+                self.stdout.write(f"{follower.username} unfollowed {count} users.")
+            else:
+                result = FriendShip.objects.bulk_follow(follower, users, batch_size=options["batch_size"])
+                if result.not_allowed:
+                    blockers = ", ".join(sorted(user.username for user in result.not_allowed))
+                    self.stderr.write(f"Skipping users who blocked {follower.username}: {blockers}")
+                followed = len(users) - len(result.not_allowed)
+                self.stdout.write(f"{follower.username} now follows {followed} requested users.")
@@ -0,0 +1,79 @@
+# Generated by Django 4.1.13 on 2026-10-19 00:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_block_block_block_unique"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GraphAnalysis",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("users", models.PositiveBigIntegerField()),
+                ("edges", models.PositiveBigIntegerField()),
+                ("reciprocity", models.FloatField(help_text="Share of follows that are followed back.")),
+                (
+                    "components",
+                    models.PositiveBigIntegerField(help_text="Weakly connected components, isolated users included."),
+                ),
+                ("largest_component", models.PositiveBigIntegerField()),
+                ("isolated_users", models.PositiveBigIntegerField()),
+                ("duration", models.FloatField(help_text="Seconds.")),
+            ],
+            options={
+                "verbose_name_plural": "graph analyses",
+            },
+        ),
+        migrations.CreateModel(
+            name="Influencer",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("rank", models.PositiveIntegerField()),
+                ("pagerank", models.FloatField()),
+                ("followers", models.PositiveBigIntegerField()),
+                (
+                    "analysis",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="influencers",
+                        to="accounts.graphanalysis",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="+", to=settings.AUTH_USER_MODEL
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["analysis", "rank"],
+            },
+        ),
+        migrations.CreateModel(
+            name="DegreeBucket",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("direction", models.CharField(choices=[("in", "フォロワー"), ("out", "フォロー")], max_length=3)),
+                ("min_degree", models.PositiveBigIntegerField()),
+                ("max_degree", models.PositiveBigIntegerField()),
+                ("users", models.PositiveBigIntegerField()),
+                (
+                    "analysis",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="degree_buckets",
+                        to="accounts.graphanalysis",
+                    ),
+                ),
+            ],
+        ),
+    ]
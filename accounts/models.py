@@ -1,18 +1,192 @@
+from dataclasses import dataclass
+
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.utils import timezone
+
+from mysite import metrics
+from mysite.bloom import MembershipIndex
+from mysite.caching import expire, get_or_compute
 
 
 class User(AbstractUser):
     email = models.EmailField()
 
 
+FOLLOW_FIELDS = ("follower", "following", "created_at")
+
+
+@dataclass
+class BulkFollowResult:
+    followed: list
+    not_allowed: list
+
+
+class FriendShipQuerySet(models.QuerySet):
+    def follow(self, follower, following):
+        """Create the relationship unless it already exists, in one statement; return whether it was created."""
+        db = self._db or router.db_for_write(self.model)
+        connection = connections[db]
+        opts = self.model._meta
+        columns = ", ".join(connection.ops.quote_name(opts.get_field(name).column) for name in FOLLOW_FIELDS)
+        with connection.cursor() as cursor:
+            # follow_unique turns a repeated follow into a no-op instead of an error.
+            cursor.execute(
+                f"INSERT INTO {connection.ops.quote_name(opts.db_table)} ({columns}) "
+                "VALUES (%s, %s, %s) ON CONFLICT DO NOTHING",
+                [follower.pk, following.pk, connection.ops.adapt_datetimefield_value(timezone.now())],
+            )
+            created = cursor.rowcount == 1
+        if created:
+            # No post_save is sent for the raw INSERT.
+            following_index.add(follower.pk, following.pk, using=db)
+            metrics.writes.inc(kind="follow")
+            expire_follow_counts([follower.pk, following.pk])
+        return created
+
+    def unfollow(self, follower, following):
+        """Delete the relationship if it exists and return the number of deleted rows."""
+        deleted = self.filter(follower=follower, following=following).delete()[0]
+        expire_follow_counts([follower.pk, following.pk])
+        return deleted
+
+    def bulk_follow(self, follower, users, batch_size=500):
+        """Follow every user in ``users`` who has not blocked ``follower``.
+
+        Returns the users followed by this call and the ones who blocked ``follower``.
+        """
+        users = [user for user in users if user != follower]
+        blockers = set(
+            Block.objects.filter(blocker__in=users, blocked=follower, kind=Block.Kind.BLOCK).values_list(
+                "blocker_id", flat=True
+            )
+        )
+        followed = set(self.filter(follower=follower, following__in=users).values_list("following_id", flat=True))
+        new = [user for user in users if user.pk not in blockers and user.pk not in followed]
+        relationships = [self.model(follower=follower, following=user) for user in new]
+        # A concurrent request may have created some since; those are skipped.
+        self.bulk_create(relationships, batch_size=batch_size, ignore_conflicts=True)
+        for relationship in relationships:
+            following_index.add(follower.pk, relationship.following_id)
+        expire_follow_counts([follower.pk, *(relationship.following_id for relationship in relationships)])
+        metrics.writes.inc(len(relationships), kind="follow")
+        return BulkFollowResult(new, [user for user in users if user.pk in blockers])
+
+    def bulk_unfollow(self, follower, users):
+        deleted = self.filter(follower=follower, following__in=users).delete()[0]
+        expire_follow_counts([follower.pk, *(user.pk for user in users)])
+        return deleted
+
+
 class FriendShip(models.Model):
     following = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="follower")
     follower = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="following")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = FriendShipQuerySet.as_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=["following", "follower"], name="follow_unique"),
         ]
+
+
+def _following_ids(follower_id):
+    return FriendShip.objects.filter(follower_id=follower_id).values_list("following_id", flat=True)
+
+
+def _confirm_following(follower_id, user_ids):
+    return FriendShip.objects.filter(follower_id=follower_id, following_id__in=user_ids).values_list(
+        "following_id", flat=True
+    )
+
+
+# "Does X follow Y?" without a query when the answer is no (see mysite/bloom.py).
+following_index = MembershipIndex("following", _following_ids, _confirm_following)
+
+
+def follow_counts_key(user_id):
+    return f"accounts:follow_counts:{user_id}"
+
+
+def follow_counts(user_id):
+    """``(followings, followers)`` of ``user_id``, cached for ``FOLLOW_COUNTS_CACHE_TIMEOUT`` seconds."""
+    return get_or_compute(
+        follow_counts_key(user_id),
+        lambda: (
+            FriendShip.objects.filter(follower_id=user_id).count(),
+            FriendShip.objects.filter(following_id=user_id).count(),
+        ),
+        settings.FOLLOW_COUNTS_CACHE_TIMEOUT,
+    )
+
+
+def expire_follow_counts(user_ids):
+    keys = [follow_counts_key(user_id) for user_id in user_ids]
+    # Before the commit, a concurrent read would cache the old counts again for the whole timeout.
+    transaction.on_commit(lambda: expire(keys, settings.FOLLOW_COUNTS_CACHE_TIMEOUT))
+
+
+class Block(models.Model):
+    """``blocker`` hides ``blocked``'s tweets and relationships; blocking also ends follows both ways."""
+
+    class Kind(models.TextChoices):
+        BLOCK = "block", "ブロック"
+        MUTE = "mute", "ミュート"
+
+    blocker = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="blocks")
+    blocked = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    kind = models.CharField(max_length=8, choices=Kind.choices)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["blocker", "blocked"], name="block_unique"),
+        ]
+
+
+class GraphAnalysis(models.Model):
+    """One run of ``python manage.py analyze_graph`` over the follow graph."""
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    users = models.PositiveBigIntegerField()
+    edges = models.PositiveBigIntegerField()
+    reciprocity = models.FloatField(help_text="Share of follows that are followed back.")
+    components = models.PositiveBigIntegerField(help_text="Weakly connected components, isolated users included.")
+    largest_component = models.PositiveBigIntegerField()
+    isolated_users = models.PositiveBigIntegerField()
+    duration = models.FloatField(help_text="Seconds.")
+
+    class Meta:
+        verbose_name_plural = "graph analyses"
+
+    def __str__(self):
+        return f"{self.created_at:%Y-%m-%d %H:%M} ({self.users} users, {self.edges} follows)"
+
+
+class DegreeBucket(models.Model):
+    """How many users have between ``min_degree`` and ``max_degree`` followers or followees."""
+
+    class Direction(models.TextChoices):
+        IN = "in", "フォロワー"
+        OUT = "out", "フォロー"
+
+    analysis = models.ForeignKey(GraphAnalysis, on_delete=models.CASCADE, related_name="degree_buckets")
+    direction = models.CharField(max_length=3, choices=Direction.choices)
+    min_degree = models.PositiveBigIntegerField()
+    max_degree = models.PositiveBigIntegerField()
+    users = models.PositiveBigIntegerField()
+
+
+class Influencer(models.Model):
+    """The users with the highest PageRank in an analysis."""
+
+    analysis = models.ForeignKey(GraphAnalysis, on_delete=models.CASCADE, related_name="influencers")
+    rank = models.PositiveIntegerField()
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    pagerank = models.FloatField()
+    followers = models.PositiveBigIntegerField()
+
+    class Meta:
+        ordering = ["analysis", "rank"]
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from mysite import metrics
+
+from .backends import user_cache_key
+from .blocking import invalidate_block_set
+from .models import Block, FriendShip, following_index
+from .usernames import invalidate_user
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_cached_user(sender, instance, **kwargs):
+    cache.delete(user_cache_key(instance.pk))
+    invalidate_user(instance)
+
+
+@receiver(post_save, sender=Block)
+@receiver(post_delete, sender=Block)
+def invalidate_cached_blocks(sender, instance, **kwargs):
+    invalidate_block_set(instance.blocker_id)
+
+
+@receiver(post_save, sender=FriendShip)
+def record_follow(sender, instance, created, using, **kwargs):
+    if created:
+        following_index.add(instance.follower_id, instance.following_id, using=using)
+        metrics.writes.inc(kind="follow")
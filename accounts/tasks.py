@@ -0,0 +1,9 @@
+from jobs.queue import task
+
+from .graph import analyze, save_summary
+
+
+@task
+def analyze_graph(chunk_size=100000, top=100):
+    """Background version of ``python manage.py analyze_graph``, run by ``runworker``."""
+    save_summary(analyze(chunk_size=chunk_size, top=top))
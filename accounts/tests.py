@@ -1,10 +1,25 @@
+from io import StringIO
+from unittest import mock
+
+import numpy as np
 from django.conf import settings
 from django.contrib.auth import SESSION_KEY, get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
-from accounts.models import FriendShip
-from tweets.models import Tweet
+from accounts import views
+from accounts.backends import user_cache_key
+from accounts.blocking import block, get_block_set, unblock
+from accounts.graph import analyze, load_adjacency, pagerank
+from accounts.models import Block, FriendShip, GraphAnalysis, follow_counts, following_index
+from accounts.usernames import LRUCache, local_cache, resolve_username
+from jobs.models import Job
+from jobs.queue import claim_jobs, run_job
+from notifications.notify import buffer as notifications_buffer
+from tweets.models import Like, Tweet
 
 User = get_user_model()
 
@@ -289,6 +304,7 @@ class TestLogoutView(TestCase):
 
 class TestUserProfileView(TestCase):
     def setUp(self):
+        cache.clear()
         self.user1 = User.objects.create_user(
             username="test1",
             email="test@example.com",
@@ -308,6 +324,44 @@ class TestUserProfileView(TestCase):
         ct_following = FriendShip.objects.filter(follower__exact=self.user1).count()
         self.assertEqual(context["followings_num"], ct_following)
 
+    def test_is_following_after_follow(self):
+        cache.clear()
+        following_index.clear()
+        self.addCleanup(notifications_buffer.clear)
+        User.objects.create_user(username="test2", password="password2")
+        url = reverse("accounts:user_profile", kwargs={"username": "test2"})
+        self.assertFalse(self.client.get(url).context["is_following"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("accounts:follow", kwargs={"username": "test2"}))
+        self.assertTrue(self.client.get(url).context["is_following"])
+        self.assertEqual(following_index.stats.builds, 1)
+
+    def test_follow_counts_after_follow(self):
+        self.addCleanup(notifications_buffer.clear)
+        User.objects.create_user(username="test2", password="password2")
+        url = reverse("accounts:user_profile", kwargs={"username": "test2"})
+        self.assertEqual(self.client.get(url).context["followers_num"], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("accounts:follow", kwargs={"username": "test2"}))
+        with self.assertNumQueries(2):
+            self.assertEqual(follow_counts(self.user1.pk), (1, 0))
+        self.assertEqual(self.client.get(url).context["followers_num"], 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(follow_counts(self.user1.pk), (1, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("accounts:unfollow", kwargs={"username": "test2"}))
+        self.assertEqual(self.client.get(url).context["followers_num"], 0)
+        self.assertEqual(self.client.get(self.url).context["followings_num"], 0)
+
+    def test_follow_counts_expire_on_commit(self):
+        user2 = User.objects.create_user(username="test2", password="password2")
+        self.assertEqual(follow_counts(user2.pk), (0, 0))
+        with self.captureOnCommitCallbacks(execute=True):
+            FriendShip.objects.follow(self.user1, user2)
+            self.assertEqual(follow_counts(user2.pk), (0, 0))
+        self.assertEqual(follow_counts(user2.pk), (0, 1))
+
 
 class TestUserProfileEditView(TestCase):
     def test_success_get(self):
@@ -360,6 +414,14 @@ class TestFollowView(TestCase):
         self.assertEqual(response.status_code, 400)
         self.assertFalse(FriendShip.objects.exists())
 
+    def test_success_post_twice(self):
+        url = reverse("accounts:follow", kwargs={"username": self.user2.username})
+        self.client.post(url)
+        response = self.client.post(url)
+        self.assertRedirects(response, reverse("tweets:home"), status_code=302, target_status_code=200)
+        self.assertEqual(FriendShip.objects.filter(follower=self.user1, following=self.user2).count(), 1)
+        self.assertEqual(Job.objects.get().payload["recipient_ids"], [self.user2.pk])
+
 
 class TestUnfollowView(TestCase):
     def setUp(self):
@@ -398,6 +460,97 @@ class TestUnfollowView(TestCase):
         response = self.client.post(url)
         self.assertEqual(response.status_code, 400)
 
+    def test_success_post_twice(self):
+        url = reverse("accounts:unfollow", kwargs={"username": self.user2.username})
+        self.client.post(url)
+        response = self.client.post(url)
+        self.assertRedirects(response, reverse("tweets:home"), status_code=302, target_status_code=200)
+        self.assertFalse(FriendShip.objects.exists())
+
+
+class TestFriendShipQuerySet(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username="test1", password="password1")
+        self.user2 = User.objects.create_user(username="test2", password="password2")
+
+    def test_follow_is_single_insert(self):
+        with mock.patch.object(following_index, "add") as add, self.assertNumQueries(1):
+            self.assertTrue(FriendShip.objects.follow(self.user1, self.user2))
+        add.assert_called_once()
+        with self.assertNumQueries(1):
+            self.assertFalse(FriendShip.objects.follow(self.user1, self.user2))
+        relationship = FriendShip.objects.get()
+        self.assertEqual((relationship.follower, relationship.following), (self.user1, self.user2))
+        self.assertIsNotNone(relationship.created_at)
+
+    def test_bulk_follow_returns_new_followings(self):
+        user3 = User.objects.create_user(username="test3", password="password3")
+        FriendShip.objects.follow(self.user1, self.user2)
+        self.assertEqual(FriendShip.objects.bulk_follow(self.user1, [self.user1, self.user2, user3]).followed, [user3])
+        self.assertEqual(FriendShip.objects.count(), 2)
+
+    def test_unfollow_returns_row_count(self):
+        FriendShip.objects.follow(self.user1, self.user2)
+        self.assertEqual(FriendShip.objects.unfollow(self.user1, self.user2), 1)
+        self.assertEqual(FriendShip.objects.unfollow(self.user1, self.user2), 0)
+
+
+class TestBulkFollowView(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="test", password="password1")
+        self.others = [User.objects.create_user(username=f"other{i}", password="password1") for i in range(3)]
+        FriendShip.objects.create(follower=self.user, following=self.others[0])
+        self.client.login(username="test", password="password1")
+
+    def test_success_post(self):
+        usernames = ["other0", "other1", "other2", "unknown", "test"]
+        response = self.client.post(reverse("accounts:bulk_follow"), {"usernames": usernames})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(), {"following": ["other0", "other1", "other2"], "not_allowed": [], "not_found": ["unknown"]}
+        )
+        self.assertEqual(FriendShip.objects.filter(follower=self.user).count(), 3)
+
+    def test_blockers_are_skipped(self):
+        block(self.others[1], self.user)
+        response = self.client.post(reverse("accounts:bulk_follow"), {"usernames": ["other0", "other1", "other2"]})
+        self.assertEqual(
+            response.json(), {"following": ["other0", "other2"], "not_allowed": ["other1"], "not_found": []}
+        )
+        self.assertFalse(FriendShip.objects.filter(follower=self.user, following=self.others[1]).exists())
+        # other0 was followed already.
+        payload = Job.objects.get().payload
+        self.assertEqual(payload, {"verb": "follow", "actor_id": self.user.pk, "recipient_ids": [self.others[2].pk]})
+
+    def test_success_unfollow(self):
+        response = self.client.post(reverse("accounts:bulk_unfollow"), {"usernames": ["other0", "other1"]})
+        self.assertEqual(response.json(), {"unfollowed": 1})
+        self.assertFalse(FriendShip.objects.exists())
+
+
+class TestBulkFollowCommand(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="test", password="password1")
+        self.others = [User.objects.create_user(username=f"other{i}", password="password1") for i in range(3)]
+
+    def test_success_follow_and_unfollow(self):
+        usernames = ["other0", "other1", "other2", "missing"]
+        call_command("bulk_follow", "test", *usernames, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(FriendShip.objects.filter(follower=self.user).count(), 3)
+        call_command("bulk_follow", "test", "other0", "--unfollow", stdout=StringIO())
+        self.assertEqual(FriendShip.objects.filter(follower=self.user).count(), 2)
+
+    def test_blockers_are_skipped(self):
+        block(self.others[1], self.user)
+        out, err = StringIO(), StringIO()
+        call_command("bulk_follow", "test", "other0", "other1", "other2", stdout=out, stderr=err)
+        self.assertEqual(
+            set(FriendShip.objects.filter(follower=self.user).values_list("following__username", flat=True)),
+            {"other0", "other2"},
+        )
+        self.assertIn("Skipping users who blocked test: other1", err.getvalue())
+        self.assertIn("test now follows 2 requested users.", out.getvalue())
+
 
 class TestFollowingListView(TestCase):
     def setUp(self):
@@ -444,3 +597,299 @@ class TestFollowerListView(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, "accounts/follower_list.html")
         self.assertEqual(response.context["follower_list"].count(), 1)
+
+
+class TestCachedAuthentication(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="test", password="password1")
+        self.client.login(username="test", password="password1")
+        self.url = reverse("tweets:create")
+
+    def test_no_queries_on_cache_hit(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.context["user"], self.user)
+
+    def test_cache_invalidated_on_save(self):
+        self.client.get(self.url)
+        self.assertIsNotNone(cache.get(user_cache_key(self.user.pk)))
+        self.user.first_name = "changed"
+        self.user.save()
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+
+    def test_password_change_ends_session(self):
+        self.client.get(self.url)
+        self.user.set_password("newpassword1")
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn(SESSION_KEY, self.client.session)
+
+
+class TestUsernameResolution(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = User.objects.create_user(username="test", password="password1")
+
+    def test_no_queries_when_cached(self):
+        resolve_username("test")
+        with self.assertNumQueries(0):
+            user = resolve_username("test")
+        self.assertEqual(user, self.user)
+        self.assertEqual(user.username, "test")
+
+    def test_shared_tier_after_local_miss(self):
+        resolve_username("test")
+        local_cache.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_username("test"), self.user)
+
+    def test_unknown_username_is_cached(self):
+        self.assertIsNone(resolve_username("unknown"))
+        with self.assertNumQueries(0):
+            self.assertIsNone(resolve_username("unknown"))
+
+    def test_invalidated_on_username_change(self):
+        resolve_username("test")
+        self.user.username = "renamed"
+        self.user.save()
+        self.assertIsNone(resolve_username("test"))
+        self.assertEqual(resolve_username("renamed"), self.user)
+
+    def test_invalidated_on_create_and_delete(self):
+        self.assertIsNone(resolve_username("new"))
+        new_user = User.objects.create_user(username="new", password="password1")
+        self.assertEqual(resolve_username("new"), new_user)
+        new_user.delete()
+        self.assertIsNone(resolve_username("new"))
+
+    def test_profile_view_with_unknown_username(self):
+        self.client.login(username="test", password="password1")
+        response = self.client.get(reverse("accounts:user_profile", kwargs={"username": "unknown"}))
+        self.assertEqual(response.status_code, 404)
+
+
+class TestLRUCache(TestCase):
+    def test_evicts_least_recently_used(self):
+        lru = LRUCache(maxsize=2, timeout=60)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        lru.get("a")
+        lru.set("c", 3)
+        self.assertEqual(lru.get("a"), 1)
+        self.assertIsNone(lru.get("b"))
+
+    def test_entries_expire(self):
+        lru = LRUCache(maxsize=2, timeout=-1)
+        lru.set("a", 1)
+        self.assertIsNone(lru.get("a"))
+
+
+class TestLikedTweetListView(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="test", password="password1")
+        self.client.login(username="test", password="password1")
+        self.tweets = [Tweet.objects.create(user=self.user, content=f"tweet{i}") for i in range(3)]
+        for tweet in self.tweets:
+            Like.objects.create(user=self.user, tweet=tweet)
+        self.url = reverse("accounts:liked_list", kwargs={"username": self.user.username})
+
+    @mock.patch.object(views.LikedTweetListView, "paginate_by", 2)
+    def test_success_get_pages(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "accounts/liked_list.html")
+        page = response.context["page"]
+        self.assertEqual([like.tweet.content for like in page.object_list], ["tweet2", "tweet1"])
+
+        response = self.client.get(self.url, {"cursor": page.next_cursor})
+        page = response.context["page"]
+        self.assertEqual([like.tweet.content for like in page.object_list], ["tweet0"])
+        self.assertFalse(page.has_next)
+
+    def test_failure_get_with_not_exist_user(self):
+        response = self.client.get(reverse("accounts:liked_list", kwargs={"username": "unknown"}))
+        self.assertEqual(response.status_code, 404)
+
+
+class TestBlockView(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = User.objects.create_user(username="test", password="password1")
+        self.other = User.objects.create_user(username="other", password="password1")
+        self.client.login(username="test", password="password1")
+        self.tweet = Tweet.objects.create(user=self.other, content="hidden")
+        FriendShip.objects.follow(self.user, self.other)
+        FriendShip.objects.follow(self.other, self.user)
+
+    def test_success_block(self):
+        response = self.client.post(reverse("accounts:block", kwargs={"username": "other"}))
+        self.assertRedirects(response, reverse("accounts:user_profile", kwargs={"username": "other"}))
+        self.assertEqual(Block.objects.get().kind, Block.Kind.BLOCK)
+        self.assertFalse(FriendShip.objects.exists())
+        self.assertNotIn(self.tweet, self.client.get(reverse("tweets:home")).context["tweet_list"])
+        response = self.client.get(reverse("accounts:user_profile", kwargs={"username": "other"}))
+        self.assertEqual(response.context["tweet_list"], [])
+        self.assertEqual(response.context["block_kind"], Block.Kind.BLOCK)
+
+    def test_success_mute_keeps_follows(self):
+        self.client.post(reverse("accounts:mute", kwargs={"username": "other"}))
+        self.assertEqual(FriendShip.objects.count(), 2)
+        self.assertNotIn(self.tweet, self.client.get(reverse("tweets:home")).context["tweet_list"])
+        response = self.client.get(reverse("accounts:following_list", kwargs={"username": "test"}))
+        self.assertQuerysetEqual(response.context["following_list"], [])
+        response = self.client.get(reverse("accounts:follower_list", kwargs={"username": "test"}))
+        self.assertQuerysetEqual(response.context["follower_list"], [])
+
+    def test_success_unblock(self):
+        self.client.post(reverse("accounts:block", kwargs={"username": "other"}))
+        self.client.post(reverse("accounts:unblock", kwargs={"username": "other"}))
+        self.assertFalse(Block.objects.exists())
+        self.assertIn(self.tweet, self.client.get(reverse("tweets:home")).context["tweet_list"])
+
+    def test_mute_replaced_by_block(self):
+        self.client.post(reverse("accounts:mute", kwargs={"username": "other"}))
+        self.client.post(reverse("accounts:block", kwargs={"username": "other"}))
+        self.assertEqual(Block.objects.get().kind, Block.Kind.BLOCK)
+
+    def test_failure_block_self(self):
+        response = self.client.post(reverse("accounts:block", kwargs={"username": "test"}))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Block.objects.exists())
+
+    def test_failure_follow_when_blocked(self):
+        block(self.other, self.user)
+        response = self.client.post(reverse("accounts:follow", kwargs={"username": "other"}))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(FriendShip.objects.exists())
+
+
+class TestBlockSet(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="test", password="password1")
+        self.other = User.objects.create_user(username="other", password="password1")
+
+    def test_cached(self):
+        block(self.user, self.other)
+        self.assertIn(self.other.pk, get_block_set(self.user.pk))
+        with self.assertNumQueries(0):
+            blocks = get_block_set(self.user.pk)
+        self.assertEqual(blocks.kind_of(self.other.pk), Block.Kind.BLOCK)
+
+    def test_invalidated_on_change(self):
+        self.assertNotIn(self.other.pk, get_block_set(self.user.pk))
+        Block.objects.create(blocker=self.user, blocked=self.other, kind=Block.Kind.MUTE)
+        self.assertEqual(get_block_set(self.user.pk).kind_of(self.other.pk), Block.Kind.MUTE)
+        unblock(self.user, self.other, Block.Kind.MUTE)
+        self.assertEqual(len(get_block_set(self.user.pk)), 0)
+
+    def test_exclude_keeps_the_type(self):
+        third = User.objects.create_user(username="third", password="password1")
+        FriendShip.objects.bulk_follow(self.user, [self.other, third])
+        friendships = FriendShip.objects.filter(follower=self.user).order_by("following_id")
+        kept = get_block_set(self.user.pk).exclude(friendships, "following_id")
+        self.assertIsInstance(kept, QuerySet)
+        self.assertEqual(kept.count(), 2)
+
+        block(self.user, self.other, Block.Kind.MUTE)
+        blocks = get_block_set(self.user.pk)
+        kept = blocks.exclude(friendships, "following_id")
+        self.assertIsInstance(kept, QuerySet)
+        with self.assertNumQueries(1):
+            self.assertEqual([friendship.following_id for friendship in kept], [third.pk])
+        self.assertEqual(blocks.exclude(list(friendships), "following_id"), list(kept))
+        self.assertEqual(blocks.exclude(iter([])), [])
+
+
+class TestUserAdmin(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="admin", password="password1")
+        self.client.force_login(self.admin)
+        self.users = [User.objects.create_user(username=f"user{i}", password="password1") for i in range(3)]
+
+    def test_success_get_changelist(self):
+        response = self.client.get(reverse("admin:accounts_user_changelist"), {"q": "user1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([user.username for user in response.context["cl"].result_list], ["user1"])
+
+    @override_settings(ADMIN_ACTION_CHUNK_SIZE=2)
+    def test_success_deactivate_in_chunks(self):
+        data = {"action": "deactivate_in_chunks", "_selected_action": [user.pk for user in self.users]}
+        response = self.client.post(reverse("admin:accounts_user_changelist"), data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(User.objects.filter(is_active=False).count(), 3)
+
+    def test_deactivated_users_are_logged_out(self):
+        cache.clear()
+        client = self.client_class()
+        client.force_login(self.users[0])
+        self.assertEqual(client.get(reverse("tweets:home")).status_code, 200)
+        data = {"action": "deactivate_in_chunks", "_selected_action": [self.users[0].pk]}
+        self.client.post(reverse("admin:accounts_user_changelist"), data)
+        self.assertEqual(client.get(reverse("tweets:home")).status_code, 302)
+
+
+class TestAnalyzeGraph(TestCase):
+    def setUp(self):
+        self.a, self.b, self.c, self.d, self.e = [User.objects.create(username=name) for name in "abcde"]
+        FriendShip.objects.bulk_follow(self.a, [self.b])
+        FriendShip.objects.bulk_follow(self.b, [self.a])
+        FriendShip.objects.bulk_follow(self.c, [self.b])
+        FriendShip.objects.bulk_follow(self.d, [self.b])
+
+    def test_summary(self):
+        summary = analyze(chunk_size=2, top=2)
+        self.assertEqual((summary.users, summary.edges), (5, 4))
+        self.assertEqual(summary.reciprocity, 0.5)
+        self.assertEqual((summary.components, summary.largest_component, summary.isolated_users), (2, 4, 1))
+        self.assertEqual(summary.in_degrees, [(0, 0, 3), (1, 1, 1), (2, 3, 1)])
+        self.assertEqual(summary.out_degrees, [(0, 0, 1), (1, 1, 4)])
+        self.assertEqual([user_id for user_id, _, _ in summary.influencers], [self.b.pk, self.a.pk])
+        self.assertEqual(summary.influencers[0][2], 3)
+
+    def test_users_created_during_the_run_are_left_out(self):
+        user_ids = np.array(sorted(user.pk for user in [self.a, self.b, self.c, self.d, self.e]), dtype=np.int64)
+        late = User.objects.create(username="late")
+        FriendShip.objects.bulk_follow(late, [self.a])
+        FriendShip.objects.bulk_follow(self.a, [late])
+        adjacency = load_adjacency(user_ids, chunk_size=2)
+        self.assertEqual(adjacency.shape, (5, 5))
+        self.assertEqual(adjacency.nnz, 4)
+
+    def test_pagerank_sums_to_one(self):
+        summary = analyze(top=5)
+        self.assertAlmostEqual(sum(score for _, score, _ in summary.influencers), 1.0, places=5)
+        self.assertEqual(len(pagerank(mock.Mock(shape=(0, 0)))), 0)
+
+    def test_command_saves_summary(self):
+        out = StringIO()
+        call_command("analyze_graph", "--top", "3", stdout=out)
+        self.assertIn("reciprocity: 50.0%", out.getvalue())
+        analysis = GraphAnalysis.objects.get()
+        self.assertEqual(analysis.edges, 4)
+        influencers = analysis.influencers.values_list("user_id", flat=True)
+        self.assertEqual(list(influencers), [self.b.pk, self.a.pk, self.c.pk])
+        self.assertEqual(analysis.degree_buckets.count(), 5)
+
+        admin = User.objects.create_superuser(username="admin", password="password1")
+        self.client.force_login(admin)
+        self.assertEqual(self.client.get(reverse("admin:accounts_graphanalysis_changelist")).status_code, 200)
+        response = self.client.get(reverse("admin:accounts_graphanalysis_change", args=[analysis.pk]))
+        self.assertContains(response, "pagerank")
+
+    def test_dry_run(self):
+        call_command("analyze_graph", "--dry-run", stdout=StringIO())
+        self.assertFalse(GraphAnalysis.objects.exists())
+
+    def test_enqueue(self):
+        call_command("analyze_graph", "--enqueue", "--top", "3", stdout=StringIO())
+        self.assertFalse(GraphAnalysis.objects.exists())
+        job = Job.objects.get(name="accounts.tasks.analyze_graph")
+        self.assertEqual(claim_jobs("worker"), [job.pk])
+        self.assertTrue(run_job(job.pk, "worker"))
+        self.assertEqual(GraphAnalysis.objects.get().influencers.count(), 3)
@@ -9,9 +9,16 @@ urlpatterns = [
     path("signup/", views.SignUpView.as_view(), name="signup"),
     path("login/", views.LoginView.as_view(), name="login"),
     path("logout/", views.LogoutView.as_view(), name="logout"),
+    path("bulk_follow/", views.BulkFollowView.as_view(), name="bulk_follow"),
+    path("bulk_unfollow/", views.BulkUnFollowView.as_view(), name="bulk_unfollow"),
     path("<str:username>/", views.UserProfileView.as_view(), name="user_profile"),
     path("<str:username>/follow/", views.FollowView.as_view(), name="follow"),
     path("<str:username>/unfollow/", views.UnFollowView.as_view(), name="unfollow"),
     path("<str:username>/following_list/", views.FollowingListView.as_view(), name="following_list"),
     path("<str:username>/follower_list/", views.FollowerListView.as_view(), name="follower_list"),
+    path("<str:username>/likes/", views.LikedTweetListView.as_view(), name="liked_list"),
+    path("<str:username>/block/", views.BlockView.as_view(), name="block"),
+    path("<str:username>/unblock/", views.UnBlockView.as_view(), name="unblock"),
+    path("<str:username>/mute/", views.MuteView.as_view(), name="mute"),
+    path("<str:username>/unmute/", views.UnMuteView.as_view(), name="unmute"),
 ]
@@ -0,0 +1,106 @@
+"""Resolve the ``<str:username>`` URL segment to a user without hitting the database.
+
+Lookups go through two tiers: a small per-process LRU (memory speed, short TTL)
+and the shared cache. Both store the essential fields of the row, or ``MISSING``
+for usernames that do not exist so that repeated 404s are cheap too. Entries are
+invalidated when a user is saved or deleted (see ``accounts.signals``); other
+processes' LRUs catch up once their short TTL expires.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import Http404
+
+User = get_user_model()
+
+FIELDS = ("id", "username")
+MISSING = "missing"
+
+
+class LRUCache:
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                return None
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_cache = LRUCache(settings.USERNAME_CACHE_SIZE, settings.USERNAME_CACHE_LOCAL_TIMEOUT)
+
+
+def username_cache_key(username):
+    return f"accounts:username:{username}"
+
+
+def user_username_cache_key(user_id):
+    return f"accounts:username-of:{user_id}"
+
+
+def resolve_username(username):
+    """Return a ``User`` with only ``FIELDS`` loaded, or ``None`` if the username is unknown."""
+    entry = local_cache.get(username)
+    if entry is None:
+        key = username_cache_key(username)
+        entry = cache.get(key)
+        if entry is None:
+            row = User.objects.filter(username=username).values_list(*FIELDS).first()
+            if row is None:
+                entry = MISSING
+                cache.set(key, entry, settings.USERNAME_CACHE_MISSING_TIMEOUT)
+            else:
+                entry = row
+                cache.set_many(
+                    {key: entry, user_username_cache_key(row[0]): username}, settings.USERNAME_CACHE_TIMEOUT
+                )
+        local_cache.set(username, entry)
+    if entry == MISSING:
+        return None
+    # Other fields are loaded lazily if a caller touches them.
+    return User.from_db("default", FIELDS, entry)
+
+
+def get_user_or_404(username):
+    user = resolve_username(username)
+    if user is None:
+        raise Http404(f"No user named {username!r}.")
+    return user
+
+
+def invalidate_user(user):
+    """Forget the user's current username and the one it was cached under, if different."""
+    usernames = {user.username, cache.get(user_username_cache_key(user.pk))} - {None}
+    cache.delete_many([username_cache_key(username) for username in usernames] + [user_username_cache_key(user.pk)])
+    for username in usernames:
+        local_cache.delete(username)
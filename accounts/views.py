@@ -3,15 +3,25 @@ from django.contrib import messages
 from django.contrib.auth import authenticate, get_user_model, login
 from django.contrib.auth import views as auth_views
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import HttpResponseBadRequest
-from django.shortcuts import HttpResponseRedirect, get_object_or_404, render
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.shortcuts import HttpResponseRedirect, render
 from django.urls import reverse, reverse_lazy
-from django.views.generic import CreateView, DetailView, ListView, RedirectView
+from django.views.generic import CreateView, DetailView, ListView, RedirectView, TemplateView, View
 
+from jobs.queue import enqueue
+from mysite.pagination import paginate_by_cursor
+from notifications.models import Notification
+from notifications.tasks import deliver
+from tweets.likes import liked_tweet_ids
 from tweets.models import Like, Tweet
+from tweets.sharding import join_users, newest_first, shard_for_user
 
+from .blocking import block, get_block_set, unblock
 from .forms import LoginForm, SignUpForm
-from .models import FriendShip
+from .models import Block, FriendShip, follow_counts, following_index
+from .usernames import get_user_or_404
 
 User = get_user_model()
 
@@ -43,56 +53,121 @@ class UserProfileView(LoginRequiredMixin, DetailView):
     template_name = "accounts/profile.html"
     model = User
     context_object_name = "user"
-    slug_field = "username"
-    slug_url_kwarg = "username"
+
+    def get_object(self, queryset=None):
+        return get_user_or_404(self.kwargs["username"])
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         user = self.object
-        context["tweet_list"] = Tweet.objects.select_related("user").filter(user=user).order_by("-created_at")
-        context["is_following"] = FriendShip.objects.filter(following=user, follower=self.request.user).exists()
-        context["followings_num"] = FriendShip.objects.filter(follower=user).count()
-        context["followers_num"] = FriendShip.objects.filter(following=user).count()
-        user_like_list = (
-            Like.objects.select_related("tweet").filter(user=self.request.user).values_list("tweet", flat=True)
-        )
-        context["user_liked_list"] = user_like_list
+        blocks = get_block_set(self.request.user.pk)
+        if user.pk in blocks:
+            context["tweet_list"] = []
+        else:
+            context["tweet_list"] = join_users(
+                Tweet.objects.using(shard_for_user(user.pk)).defer("viewers").filter(user=user).order_by("-created_at")
+            )
+        context["block_kind"] = blocks.kind_of(user.pk)
+        context["is_following"] = following_index.contains(self.request.user.pk, user.pk)
+        context["followings_num"], context["followers_num"] = follow_counts(user.pk)
+        context["user_liked_list"] = liked_tweet_ids(self.request.user.pk, context["tweet_list"])
         return context
 
 
 class FollowView(LoginRequiredMixin, RedirectView):
     def post(self, request, *args, **kwargs):
-        following = get_object_or_404(User, username=self.kwargs["username"])
+        following = get_user_or_404(self.kwargs["username"])
         follower = request.user
 
         if following == follower:
             messages.warning(request, "自分自身はフォローできません。")
             return HttpResponseBadRequest(render(request, "error/400.html"))
 
-        if FriendShip.objects.filter(following=following, follower=follower).exists():
-            messages.warning(request, "すでにフォローしています。")
+        if get_block_set(following.pk).kind_of(follower.pk) == Block.Kind.BLOCK:
+            messages.warning(request, "このユーザーはフォローできません。")
             return HttpResponseBadRequest(render(request, "error/400.html"))
 
-        FriendShip.objects.create(following=following, follower=follower)
+        if FriendShip.objects.follow(follower, following):
+            enqueue(deliver, verb=Notification.Verb.FOLLOW, actor_id=follower.pk, recipient_ids=[following.pk])
         return HttpResponseRedirect(reverse("tweets:home"))
 
 
 class UnFollowView(LoginRequiredMixin, RedirectView):
     def post(self, request, *args, **kwargs):
-        following = get_object_or_404(User, username=self.kwargs["username"])
+        following = get_user_or_404(self.kwargs["username"])
         follower = request.user
-        unfollow = FriendShip.objects.filter(following=following, follower=follower)
 
         if following == follower:
             messages.warning(request, "自分自身を対象には出来ません。")
             return HttpResponseBadRequest(render(request, "error/400.html"))
 
-        elif unfollow.exists():
-            unfollow.delete()
-            return HttpResponseRedirect(reverse("tweets:home"))
-        else:
-            messages.warning(request, "無効な操作です。")
+        FriendShip.objects.unfollow(follower, following)
+        return HttpResponseRedirect(reverse("tweets:home"))
+
+
+class BulkFollowView(LoginRequiredMixin, View):
+    """Follow every user in the ``usernames`` list in one transaction, except the ones who blocked the requester."""
+
+    def post(self, request, *args, **kwargs):
+        usernames = set(request.POST.getlist("usernames"))
+        users = list(User.objects.filter(username__in=usernames).exclude(pk=request.user.pk).only("pk", "username"))
+        with transaction.atomic():
+            result = FriendShip.objects.bulk_follow(request.user, users)
+            if result.followed:
+                enqueue(
+                    deliver,
+                    verb=Notification.Verb.FOLLOW,
+                    actor_id=request.user.pk,
+                    recipient_ids=[user.pk for user in result.followed],
+                )
+        not_allowed = {user.username for user in result.not_allowed}
+        context = {
+            "following": sorted(user.username for user in users if user.username not in not_allowed),
+            "not_allowed": sorted(not_allowed),
+            "not_found": sorted(usernames - {user.username for user in users} - {request.user.username}),
+        }
+        return JsonResponse(context)
+
+
+class BulkUnFollowView(LoginRequiredMixin, View):
+    def post(self, request, *args, **kwargs):
+        usernames = request.POST.getlist("usernames")
+        users = User.objects.filter(username__in=usernames)
+        with transaction.atomic():
+            unfollowed = FriendShip.objects.bulk_unfollow(request.user, users)
+        context = {
+            "unfollowed": unfollowed,
+        }
+        return JsonResponse(context)
+
+
+class BlockView(LoginRequiredMixin, View):
+    kind = Block.Kind.BLOCK
+
+    def post(self, request, *args, **kwargs):
+        target = get_user_or_404(self.kwargs["username"])
+        if target == request.user:
+            messages.warning(request, "自分自身を対象には出来ません。")
             return HttpResponseBadRequest(render(request, "error/400.html"))
+        block(request.user, target, self.kind)
+        return HttpResponseRedirect(reverse("accounts:user_profile", kwargs={"username": target.username}))
+
+
+class MuteView(BlockView):
+    kind = Block.Kind.MUTE
+
+
+class UnBlockView(LoginRequiredMixin, View):
+    kind = Block.Kind.BLOCK
+
+    def post(self, request, *args, **kwargs):
+        target = get_user_or_404(self.kwargs["username"])
+        unblock(request.user, target, self.kind)
+        return HttpResponseRedirect(reverse("accounts:user_profile", kwargs={"username": target.username}))
+
+
+class UnMuteView(UnBlockView):
+    kind = Block.Kind.MUTE
 
 
 class FollowingListView(LoginRequiredMixin, ListView):
@@ -100,8 +175,9 @@ class FollowingListView(LoginRequiredMixin, ListView):
     context_object_name = "following_list"
 
     def get_queryset(self):
-        user = get_object_or_404(User, username=self.kwargs["username"])
-        return FriendShip.objects.select_related("following").filter(follower=user).order_by("-created_at")
+        user = get_user_or_404(self.kwargs["username"])
+        friendships = FriendShip.objects.select_related("following").filter(follower=user).order_by("-created_at")
+        return get_block_set(self.request.user.pk).exclude(friendships, "following_id")
 
 
 class FollowerListView(LoginRequiredMixin, ListView):
@@ -109,5 +185,21 @@ class FollowerListView(LoginRequiredMixin, ListView):
     context_object_name = "follower_list"
 
     def get_queryset(self):
-        user = get_object_or_404(User, username=self.kwargs["username"])
-        return FriendShip.objects.select_related("follower").filter(following=user).order_by("-created_at")
+        user = get_user_or_404(self.kwargs["username"])
+        friendships = FriendShip.objects.select_related("follower").filter(following=user).order_by("-created_at")
+        return get_block_set(self.request.user.pk).exclude(friendships, "follower_id")
+
+
+class LikedTweetListView(LoginRequiredMixin, TemplateView):
+    template_name = "accounts/liked_list.html"
+    paginate_by = 50
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        user = get_user_or_404(self.kwargs["username"])
+        likes = Like.objects.select_related("tweet").defer("tweet__viewers").filter(user=user)
+        page = paginate_by_cursor(likes, self.request.GET.get("cursor"), self.paginate_by, fetch=newest_first)
+        prefetch_related_objects([like.tweet for like in page.object_list], "user")
+        context["user"] = user
+        context["page"] = page
+        return context
@@ -0,0 +1,68 @@
+import os
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from jobs.queue import claim_jobs, extend_leases, run_job
+from mysite.processes import spawn_pool
+
+
+class Command(BaseCommand):
+    help = "Claim queued jobs and execute them in a thread or process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pool", choices=["thread", "process"], default="thread")
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument("--lease", type=int, default=settings.JOBS_LEASE_SECONDS, help="Lease length in seconds.")
+        parser.add_argument("--poll-interval", type=float, default=1.0)
+        parser.add_argument("--burst", action="store_true", help="Exit once the queue is empty.")
+
+    def handle(self, *args, **options):
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        concurrency = options["concurrency"]
+        if options["pool"] == "process":
+            executor = spawn_pool(concurrency)
+        else:
+            executor = ThreadPoolExecutor(concurrency, thread_name_prefix="jobs")
+
+        lease = options["lease"]
+        # Leases are renewed while their jobs run, so a job may take longer than one lease.
+        renew_at = time.monotonic() + lease / 3
+        running = {}
+        done_count = failed_count = 0
+        self.stdout.write(f"Worker {worker_id} started ({options['pool']} x {concurrency})")
+        try:
+            while True:
+                free = concurrency - len(running)
+                if free:
+                    for pk in claim_jobs(worker_id, limit=free, lease=lease):
+                        running[executor.submit(run_job, pk, worker_id)] = pk
+                if not running:
+                    if options["burst"]:
+                        break
+                    time.sleep(options["poll_interval"])
+                    continue
+                finished, _ = wait(running, timeout=options["poll_interval"], return_when=FIRST_COMPLETED)
+                for future in finished:
+                    del running[future]
+                    try:
+                        succeeded = future.result()
+                    except Exception as e:
+                        # The job keeps its lease and will be reclaimed once it expires.
+                        self.stderr.write(f"Worker error: {e!r}")
+                        succeeded = False
+                    if succeeded:
+                        done_count += 1
+                    else:
+                        failed_count += 1
+                if running and time.monotonic() >= renew_at:
+                    extend_leases(running.values(), worker_id, lease)
+                    renew_at = time.monotonic() + lease / 3
+        except KeyboardInterrupt:
+            self.stdout.write("Shutting down, waiting for running jobs...")
+        finally:
+            executor.shutdown(wait=True)
+        self.stdout.write(f"Worker {worker_id} stopped: {done_count} succeeded, {failed_count} failed")
@@ -0,0 +1,120 @@
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+_registry = {}
+
+
+def task(func):
+    """Register ``func`` so that it can be enqueued by name."""
+    name = f"{func.__module__}.{func.__qualname__}"
+    _registry[name] = func
+    func.job_name = name
+    return func
+
+
+def get_task(name):
+    if name not in _registry:
+        # Worker processes may not have imported the module that defines the task yet.
+        import_string(name)
+    return _registry[name]
+
+
+def enqueue(func, *, delay=None, max_attempts=None, **kwargs):
+    """Store a call to ``func(**kwargs)`` to be executed by ``runworker``.
+
+    The job row is written in the caller's transaction, so it is only visible to
+    workers once the request's own writes are committed.
+    """
+    name = func if isinstance(func, str) else func.job_name
+    job = Job(name=name, payload=kwargs)
+    if delay is not None:
+        job.run_at = timezone.now() + timedelta(seconds=delay)
+    if max_attempts is not None:
+        job.max_attempts = max_attempts
+    job.save()
+    return job
+
+
+def _expired_lease(now):
+    return Q(status=Job.Status.RUNNING, locked_until__lt=now)
+
+
+def _claimable(now):
+    retryable = _expired_lease(now) & Q(attempts__lt=F("max_attempts"))
+    return Q(status=Job.Status.QUEUED, run_at__lte=now) | retryable
+
+
+def claim_jobs(worker_id, limit=1, lease=None):
+    """Lease up to ``limit`` runnable jobs to ``worker_id`` and return their ids.
+
+    Each claim is a conditional UPDATE, so two workers racing for the same row can
+    never both win it. Jobs whose lease expired (e.g. the worker died) are claimable again
+    until they run out of attempts; after that they are marked failed.
+    """
+    lease = settings.JOBS_LEASE_SECONDS if lease is None else lease
+    now = timezone.now()
+    Job.objects.filter(_expired_lease(now), attempts__gte=F("max_attempts")).update(
+        status=Job.Status.FAILED, last_error="Lease expired on the last attempt.", finished_at=now
+    )
+    candidates = Job.objects.filter(_claimable(now)).order_by("run_at").values_list("pk", flat=True)[:limit]
+    claimed = []
+    for pk in list(candidates):
+        updated = Job.objects.filter(_claimable(now), pk=pk).update(
+            status=Job.Status.RUNNING,
+            locked_by=worker_id,
+            locked_until=now + timedelta(seconds=lease),
+            attempts=F("attempts") + 1,
+        )
+        if updated:
+            claimed.append(pk)
+    return claimed
+
+
+def extend_leases(pks, worker_id, lease):
+    """Push the leases ``worker_id`` still holds on ``pks`` ``lease`` seconds into the future."""
+    return Job.objects.filter(pk__in=pks, locked_by=worker_id, status=Job.Status.RUNNING).update(
+        locked_until=timezone.now() + timedelta(seconds=lease)
+    )
+
+
+def retry_delay(attempts):
+    base = settings.JOBS_RETRY_BACKOFF_SECONDS
+    return min(base * 2 ** (attempts - 1), settings.JOBS_RETRY_BACKOFF_MAX_SECONDS)
+
+
+def run_job(pk, worker_id):
+    """Execute a job previously claimed by ``worker_id`` and record the outcome."""
+    close_old_connections()
+    try:
+        job = Job.objects.get(pk=pk, locked_by=worker_id, status=Job.Status.RUNNING)
+    except Job.DoesNotExist:
+        return False
+    owned = Job.objects.filter(pk=pk, locked_by=worker_id, status=Job.Status.RUNNING)
+    try:
+        get_task(job.name)(**job.payload)
+    except Exception:
+        now = timezone.now()
+        if job.attempts >= job.max_attempts:
+            owned.update(status=Job.Status.FAILED, last_error=traceback.format_exc(), finished_at=now)
+        else:
+            owned.update(
+                status=Job.Status.QUEUED,
+                last_error=traceback.format_exc(),
+                locked_by="",
+                locked_until=None,
+                run_at=now + timedelta(seconds=retry_delay(job.attempts)),
+            )
+        return False
+    else:
+        owned.update(status=Job.Status.DONE, finished_at=timezone.now(), locked_until=None)
+        return True
+    finally:
+        close_old_connections()
@@ -0,0 +1,160 @@
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.queue import claim_jobs, enqueue, run_job, task
+from mysite.processes import spawn_pool
+
+calls = []
+
+
+@task
+def record(value):
+    calls.append(value)
+
+
+@task
+def explode():
+    raise ValueError("boom")
+
+
+@task
+def outlive_lease(seconds):
+    time.sleep(seconds)
+    calls.append(claim_jobs("other"))
+
+
+class TestEnqueue(TestCase):
+    def test_success_enqueue(self):
+        job = enqueue(record, value=1)
+        self.assertEqual(job.name, "jobs.tests.record")
+        self.assertEqual(job.payload, {"value": 1})
+        self.assertEqual(job.status, Job.Status.QUEUED)
+
+    def test_delayed_job_is_not_claimable_yet(self):
+        enqueue(record, delay=60, value=1)
+        self.assertEqual(claim_jobs("worker"), [])
+
+
+class TestClaimAndRun(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_success_run(self):
+        job = enqueue(record, value="a")
+        self.assertEqual(claim_jobs("worker"), [job.pk])
+        self.assertEqual(claim_jobs("other"), [])
+
+        self.assertTrue(run_job(job.pk, "worker"))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.DONE)
+        self.assertEqual(calls, ["a"])
+
+    def test_run_requires_lease_owner(self):
+        job = enqueue(record, value="a")
+        claim_jobs("worker")
+        self.assertFalse(run_job(job.pk, "other"))
+        self.assertEqual(calls, [])
+
+    def test_expired_lease_is_reclaimed(self):
+        job = enqueue(record, value="a")
+        claim_jobs("worker")
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(claim_jobs("other"), [job.pk])
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 2)
+
+    def test_expired_lease_on_last_attempt_fails(self):
+        job = enqueue(record, max_attempts=1, value="a")
+        claim_jobs("worker")
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(claim_jobs("other"), [])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertEqual(job.attempts, 1)
+
+    @override_settings(JOBS_RETRY_BACKOFF_SECONDS=10)
+    def test_failure_is_retried_with_backoff(self):
+        job = enqueue(explode)
+        claim_jobs("worker")
+        self.assertFalse(run_job(job.pk, "worker"))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.QUEUED)
+        self.assertIn("ValueError: boom", job.last_error)
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=5))
+
+    def test_failure_after_max_attempts(self):
+        job = enqueue(explode, max_attempts=1)
+        claim_jobs("worker")
+        run_job(job.pk, "worker")
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+
+
+def share_connection(conn):
+    connections[conn.alias] = conn
+
+
+class TestRunWorkerCommand(TransactionTestCase):
+    def setUp(self):
+        calls.clear()
+        # Like LiveServerTestCase, let the pool threads use this thread's connection: separate connections
+        # to the in-memory test database fail with "database table is locked" instead of waiting.
+        conn = connections["default"]
+        conn.inc_thread_sharing()
+        self.addCleanup(conn.dec_thread_sharing)
+        pool = partial(ThreadPoolExecutor, initializer=share_connection, initargs=(conn,))
+        patcher = mock.patch("jobs.management.commands.runworker.ThreadPoolExecutor", pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_success_burst(self):
+        for i in range(5):
+            enqueue(record, value=i)
+        enqueue(explode, max_attempts=1)
+        out = StringIO()
+        call_command("runworker", "--burst", "--concurrency=2", "--poll-interval=0.01", stdout=out)
+        self.assertEqual(sorted(calls), [0, 1, 2, 3, 4])
+        self.assertEqual(Job.objects.filter(status=Job.Status.DONE).count(), 5)
+        self.assertEqual(Job.objects.filter(status=Job.Status.FAILED).count(), 1)
+        self.assertIn("5 succeeded, 1 failed", out.getvalue())
+
+    def test_lease_is_renewed_while_the_job_runs(self):
+        job = enqueue(outlive_lease, seconds=1.5)
+        call_command("runworker", "--burst", "--lease=1", "--poll-interval=0.01", stdout=StringIO())
+        # The job ran past its first lease, yet no other worker could claim it.
+        self.assertEqual(calls, [[]])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.DONE)
+        self.assertEqual(job.attempts, 1)
+
+
+class TestProcessPool(TransactionTestCase):
+    def test_job_runs_in_spawned_process(self):
+        job = enqueue(record, value=1)
+        claim_jobs("worker")
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = str(Path(directory.name) / "db.sqlite3")
+        # The in-memory test database is private to this process; hand the child a copy on disk.
+        connection.ensure_connection()
+        copy = sqlite3.connect(path)
+        connection.connection.backup(copy)
+
+        with mock.patch.dict("os.environ", DATABASE_NAME=path), spawn_pool(1) as pool:
+            self.assertTrue(pool.submit(run_job, job.pk, "worker").result())
+        status = copy.execute("SELECT status FROM jobs_job WHERE id = ?", [job.pk]).fetchone()[0]
+        copy.close()
+        self.assertEqual(status, Job.Status.DONE)
@@ -0,0 +1,58 @@
+"""Admin building blocks for tables with millions of rows."""
+from django.conf import settings
+from django.contrib import admin
+from django.db import transaction
+
+from .pagination import EstimatedCountPaginator
+
+
+def chunked_pks(queryset, size):
+    """Yield the primary keys of ``queryset`` in ascending batches of ``size``, one keyset query per batch."""
+    queryset = queryset.order_by("pk").values_list("pk", flat=True)
+    last = None
+    while True:
+        batch = queryset if last is None else queryset.filter(pk__gt=last)
+        pks = list(batch[:size])
+        if not pks:
+            return
+        yield pks
+        last = pks[-1]
+
+
+class ScalableModelAdmin(admin.ModelAdmin):
+    """Change lists without a full COUNT(*) and bulk deletes that run in chunks.
+
+    Subclasses should join what ``__str__`` needs with ``list_select_related``,
+    use ``raw_id_fields`` for foreign keys to large tables and only filter on
+    indexed columns.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 100
+    actions = ["delete_in_chunks"]
+
+    def get_actions(self, request):
+        # The stock action collects and renders every object before deleting.
+        actions = super().get_actions(request)
+        actions.pop("delete_selected", None)
+        return actions
+
+    def update_in_chunks(self, queryset, **values):
+        updated = 0
+        for pks in chunked_pks(queryset, settings.ADMIN_ACTION_CHUNK_SIZE):
+            updated += self.model._default_manager.using(queryset.db).filter(pk__in=pks).update(**values)
+            self.chunk_updated(pks)
+        return updated
+
+    def chunk_updated(self, pks):
+        """Called after each chunk of ``update_in_chunks``, which sends no ``post_save``, e.g. to drop cached rows."""
+
+    @admin.action(description="選択された項目を分割して削除", permissions=["delete"])
+    def delete_in_chunks(self, request, queryset):
+        deleted = 0
+        for pks in chunked_pks(queryset, settings.ADMIN_ACTION_CHUNK_SIZE):
+            with transaction.atomic(using=queryset.db):
+                _, per_model = self.model._default_manager.using(queryset.db).filter(pk__in=pks).delete()
+            deleted += per_model.get(self.model._meta.label, 0)
+        self.message_user(request, f"{deleted}件を削除しました。")
@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+from django.core.signals import setting_changed
+from django.db.backends.signals import connection_created
+
+
+class MysiteConfig(AppConfig):
+    name = "mysite"
+
+    def ready(self):
+        from .slow_queries import install, move_log
+
+        connection_created.connect(install)
+        setting_changed.connect(move_log)
@@ -0,0 +1,38 @@
+"""Cache backends that count hits and misses in ``mysite.metrics``.
+
+Backends do not know their alias, so the label comes from the cache's
+``METRICS_NAME`` setting (``"default"`` if unset).
+"""
+
+from django.core.cache.backends import locmem
+
+from mysite import metrics
+
+_missing = object()
+
+
+class MetricsMixin:
+    def __init__(self, location, params):
+        super().__init__(location, params)
+        self.metrics_name = params.get("METRICS_NAME", "default")
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _missing, version)
+        if value is _missing:
+            metrics.cache_requests.inc(cache=self.metrics_name, result="miss")
+            return default
+        metrics.cache_requests.inc(cache=self.metrics_name, result="hit")
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values = super().get_many(keys, version)
+        if values:
+            metrics.cache_requests.inc(len(values), cache=self.metrics_name, result="hit")
+        if len(keys) > len(values):
+            metrics.cache_requests.inc(len(keys) - len(values), cache=self.metrics_name, result="miss")
+        return values
+
+
+class LocMemCache(MetricsMixin, locmem.LocMemCache):
+    pass
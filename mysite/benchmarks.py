@@ -0,0 +1,47 @@
+"""Registry and helpers for ``python manage.py benchmark``.
+
+Apps register scenarios in a ``benchmarks`` module::
+
+    @scenario("threads")
+    def threads(depth=100):
+        ...
+        return [("deep thread", timed(load_thread, repeat=5))]
+
+A scenario returns ``(label, metrics)`` rows. Keyword arguments can be
+overridden from the command line with ``--param depth=500``.
+"""
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+scenarios = {}
+
+
+def scenario(name):
+    def decorator(func):
+        scenarios[name] = func
+        return func
+
+    return decorator
+
+
+def timed(func, repeat=5):
+    """Run ``func`` ``repeat`` times and report the best wall time and its query count."""
+    best = None
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+        if best is None or elapsed < best[0]:
+            best = (elapsed, len(queries))
+    return {"best_ms": round(best[0] * 1000, 2), "queries": best[1]}
+
+
+@contextmanager
+def stopwatch(metrics, key):
+    start = time.perf_counter()
+    yield
+    metrics[key] = round((time.perf_counter() - start) * 1000, 2)
@@ -0,0 +1,167 @@
+"""Per-process Bloom filters answering "is X a member of Y's set?" without a query in the common "no" case.
+
+A ``MembershipIndex`` keeps one Bloom filter per owner (e.g. the tweets a user
+liked), built lazily from the database and kept in a bounded LRU. A lookup that
+misses the filter is a definite "no"; a possible "yes" is confirmed with one
+query for all candidates. Every process watches a version counter per owner in
+the shared cache: a new member bumps it, so other processes rebuild their
+filter on the next lookup while the writing process just sets the new bits.
+Removed members are not cleared (Bloom filters cannot forget); their stale bits
+only cost a confirming query until the filter is rebuilt.
+"""
+import hashlib
+import math
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+indexes = {}
+
+
+def new_version():
+    """A version no process can hold a filter for, unlike restarting the count after an eviction."""
+    return uuid.uuid4().int >> 65
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        # Double hashing: k positions from the two halves of one digest.
+        digest = hashlib.blake2b(str(item).encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & 1 << (position & 7) for position in self._positions(item))
+
+    @property
+    def is_full(self):
+        """Past its capacity the false positive rate climbs above ``error_rate``."""
+        return self.count > self.capacity
+
+
+@dataclass
+class Stats:
+    lookups: int = 0
+    negatives: int = 0
+    confirmed: int = 0
+    false_positives: int = 0
+    builds: int = 0
+
+    @property
+    def hit_rate(self):
+        """Share of lookups answered by the filter alone."""
+        return self.negatives / self.lookups if self.lookups else 0.0
+
+    @property
+    def false_positive_rate(self):
+        """Share of non-members the filter could not rule out (stale bits of removed members included)."""
+        non_members = self.negatives + self.false_positives
+        return self.false_positives / non_members if non_members else 0.0
+
+    def as_dict(self):
+        return {**asdict(self), "hit_rate": self.hit_rate, "false_positive_rate": self.false_positive_rate}
+
+
+class MembershipIndex:
+    """Bloom filters for one relation.
+
+    ``load(owner_id)`` returns every member of the owner's set and
+    ``confirm(owner_id, items)`` the items that really are members.
+    """
+
+    def __init__(self, name, load, confirm):
+        self.name = name
+        self._load = load
+        self._confirm = confirm
+        self._filters = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = Stats()
+        indexes[name] = self
+
+    def _version_key(self, owner_id):
+        return f"bloom:{self.name}:{owner_id}"
+
+    def _get_filter(self, owner_id):
+        key = self._version_key(owner_id)
+        cache.add(key, new_version(), None)
+        # Read the version before loading, so a member added meanwhile bumps it past ours.
+        version = cache.get(key)
+        with self._lock:
+            entry = self._filters.get(owner_id)
+            if entry is not None and entry[0] == version and not entry[1].is_full:
+                self._filters.move_to_end(owner_id)
+                return entry[1]
+
+        members = list(self._load(owner_id))
+        capacity = max(2 * len(members), settings.BLOOM_FILTER_MIN_CAPACITY)
+        bloom = BloomFilter(capacity, settings.BLOOM_FILTER_ERROR_RATE)
+        bloom.update(members)
+        with self._lock:
+            # Evicted again before it could be read: build again on the next lookup.
+            if version is not None:
+                self._filters[owner_id] = (version, bloom)
+                self._filters.move_to_end(owner_id)
+            while len(self._filters) > settings.BLOOM_FILTER_CACHE_SIZE:
+                self._filters.popitem(last=False)
+            self.stats.builds += 1
+        return bloom
+
+    def filter(self, owner_id, items):
+        """Return the set of ``items`` that are members, querying only for the possible ones."""
+        items = list(items)
+        bloom = self._get_filter(owner_id)
+        candidates = [item for item in items if item in bloom]
+        members = set(self._confirm(owner_id, candidates)) if candidates else set()
+        with self._lock:
+            self.stats.lookups += len(items)
+            self.stats.negatives += len(items) - len(candidates)
+            self.stats.confirmed += len(members)
+            self.stats.false_positives += len(candidates) - len(members)
+        return members
+
+    def contains(self, owner_id, item):
+        return item in self.filter(owner_id, [item])
+
+    def add(self, owner_id, item, using=None):
+        """Record a new member once the current transaction on ``using`` commits."""
+        transaction.on_commit(lambda: self._added(owner_id, item), using=using)
+
+    def _added(self, owner_id, item):
+        try:
+            version = cache.incr(self._version_key(owner_id))
+        except ValueError:
+            # The version was evicted: a new one makes every process build from scratch on its next lookup.
+            cache.add(self._version_key(owner_id), new_version(), None)
+            return
+        with self._lock:
+            entry = self._filters.get(owner_id)
+            # Keep our filter only if no other process added a member since we built it.
+            if entry is not None and entry[0] == version - 1:
+                entry[1].add(item)
+                self._filters[owner_id] = (version, entry[1])
+
+    def clear(self):
+        with self._lock:
+            self._filters.clear()
+            self.stats = Stats()
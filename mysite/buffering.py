@@ -0,0 +1,69 @@
+"""Per-process buffers that turn bursts of small writes into periodic batches.
+
+Items are grouped by key in memory and handed to a ``flush`` function once the
+oldest one has waited ``interval`` seconds or ``max_size`` keys are pending, so
+a thousand likes on one tweet within a second cost one write instead of a
+thousand. Buffers are also flushed at the end of a request when due and when
+the process exits. Items still pending when a process is killed are lost, so
+only buffer writes that can tolerate that.
+"""
+
+import atexit
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished
+
+
+class WriteBuffer:
+    def __init__(self, flush, size_setting, interval_setting):
+        self._flush = flush
+        self.size_setting = size_setting
+        self.interval_setting = interval_setting
+        self._pending = {}
+        self._started = None
+        self._lock = threading.Lock()
+        request_finished.connect(self._flush_if_due, weak=False)
+        atexit.register(self.flush)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, key, item):
+        with self._lock:
+            self._pending.setdefault(key, []).append(item)
+            if self._started is None:
+                self._started = time.monotonic()
+        self._flush_if_due()
+
+    def extend(self, pairs):
+        """``add`` every ``(key, item)`` pair under one lock."""
+        with self._lock:
+            for key, item in pairs:
+                self._pending.setdefault(key, []).append(item)
+            if self._pending and self._started is None:
+                self._started = time.monotonic()
+        self._flush_if_due()
+
+    def is_due(self):
+        if not self._pending:
+            return False
+        if len(self._pending) >= getattr(settings, self.size_setting):
+            return True
+        return time.monotonic() - self._started >= getattr(settings, self.interval_setting)
+
+    def flush(self):
+        """Hand every pending ``{key: [items]}`` to the flush function and start over."""
+        with self._lock:
+            pending, self._pending, self._started = self._pending, {}, None
+        if pending:
+            self._flush(pending)
+
+    def clear(self):
+        with self._lock:
+            self._pending, self._started = {}, None
+
+    def _flush_if_due(self, **kwargs):
+        if self.is_due():
+            self.flush()
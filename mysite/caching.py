@@ -0,0 +1,105 @@
+"""Cached values that stay cheap to serve while a hot key expires.
+
+With a plain get/set, every request that reads a popular key in the moment
+it expires recomputes the value at once (a cache stampede). ``get_or_compute``
+avoids that three ways:
+
+- Early refresh: a read refreshes the value before it expires with a
+  probability that grows as expiry nears and with how long the value took to
+  compute (the "XFetch" rule ``now - delta * beta * log(random()) >= expiry``),
+  so a hot key is usually recomputed before it expires at all.
+- Single flight: a refresh first takes a per-key lock with ``cache.add``,
+  which is atomic in every backend, so only one worker recomputes.
+- Stale while refreshing: values are kept ``stale_timeout`` seconds past
+  their expiry and the other workers get the stale value during a refresh.
+  Only a key without any value makes readers wait, polling until the value
+  lands or ``lock_timeout`` passes, after which they compute it themselves.
+
+``expire`` marks values stale after a write instead of deleting them, so the
+next read refreshes them while concurrent reads still get an answer at once.
+"""
+import math
+import random
+import time
+
+from django.core.cache import cache as default_cache
+
+from . import metrics
+
+DEFAULT_LOCK_TIMEOUT = 10
+POLL_INTERVAL = 0.01
+
+
+def lock_key(key):
+    return f"{key}:refreshing"
+
+
+def refresh_early(now, expires_at, delta, beta):
+    # 1 - random() is in (0, 1], so the logarithm is defined and never positive.
+    return now - delta * beta * math.log(1 - random.random()) >= expires_at
+
+
+def store(cache, key, compute, timeout, stale_timeout):
+    start = time.perf_counter()
+    value = compute()
+    delta = time.perf_counter() - start
+    cache.set(key, (value, time.time() + timeout, delta), timeout + stale_timeout)
+    return value
+
+
+def get_or_compute(
+    key, compute, timeout, *, stale_timeout=None, beta=1.0, lock_timeout=DEFAULT_LOCK_TIMEOUT, cache=None
+):
+    """The value of ``key``, computed by ``compute()`` and cached for ``timeout`` seconds.
+
+    Values are served stale for up to ``stale_timeout`` more seconds (default:
+    ``timeout``) while one worker refreshes them. ``beta`` above 1 refreshes
+    earlier, below 1 later.
+    """
+    cache = cache or default_cache
+    stale_timeout = timeout if stale_timeout is None else stale_timeout
+
+    entry = cache.get(key)
+    if entry is not None:
+        value, expires_at, delta = entry
+        now = time.time()
+        expired = now >= expires_at
+        if not expired and not refresh_early(now, expires_at, delta, beta):
+            metrics.cached_values.inc(result="hit")
+            return value
+        if not cache.add(lock_key(key), 1, lock_timeout):
+            metrics.cached_values.inc(result="stale")
+            return value
+        try:
+            metrics.cached_values.inc(result="refresh" if expired else "early_refresh")
+            return store(cache, key, compute, timeout, stale_timeout)
+        finally:
+            cache.delete(lock_key(key))
+
+    deadline = time.monotonic() + lock_timeout
+    while not cache.add(lock_key(key), 1, lock_timeout):
+        if time.monotonic() >= deadline:
+            metrics.cached_values.inc(result="wait_timeout")
+            return store(cache, key, compute, timeout, stale_timeout)
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            metrics.cached_values.inc(result="waited")
+            return entry[0]
+    try:
+        # Whoever held the lock may have stored the value since the first lookup.
+        entry = cache.get(key)
+        if entry is not None:
+            metrics.cached_values.inc(result="waited")
+            return entry[0]
+        metrics.cached_values.inc(result="miss")
+        return store(cache, key, compute, timeout, stale_timeout)
+    finally:
+        cache.delete(lock_key(key))
+
+
+def expire(keys, stale_timeout, cache=None):
+    """Mark the values of ``keys`` stale: the next read refreshes them, concurrent reads get the old value."""
+    cache = cache or default_cache
+    entries = cache.get_many(keys)
+    cache.set_many({key: (value, 0, delta) for key, (value, _, delta) in entries.items()}, stale_timeout)
@@ -0,0 +1,228 @@
+"""Mixed-workload load generator for ``python manage.py loadtest``.
+
+Each worker (a thread or a spawned process) drives the WSGI or ASGI
+application in-process (through Django's test client, or a minimal ASGI
+driver), with one logged-in session per simulated user. Actors are picked uniformly; the users whose profiles are
+viewed, who are followed and whose tweets are liked follow a Zipf distribution
+with exponent ``skew`` (0 is uniform), so a few accounts get most of the
+traffic as on a real network.
+"""
+
+import asyncio
+import bisect
+import itertools
+import random
+import string
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from urllib.parse import urlencode
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+OPERATIONS = ("timeline", "profile", "post", "like", "follow")
+
+
+def parse_mix(value):
+    """Parse ``timeline=70,post=10`` into relative weights."""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation {name!r}; choose from {', '.join(OPERATIONS)}.")
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise ValueError("The workload mix needs at least one positive weight.")
+    return mix
+
+
+class ZipfChooser:
+    """Pick items so that the item of rank ``r`` is chosen with probability proportional to ``1 / r ** skew``."""
+
+    def __init__(self, items, skew, rng):
+        self.items = list(items)
+        self.rng = rng
+        self.cumulative = list(itertools.accumulate(1 / rank**skew for rank in range(1, len(self.items) + 1)))
+
+    def choice(self):
+        position = self.rng.random() * self.cumulative[-1]
+        return self.items[min(bisect.bisect(self.cumulative, position), len(self.items) - 1)]
+
+
+def request_host():
+    """A Host header the application accepts (with an empty ALLOWED_HOSTS, DEBUG allows localhost)."""
+    for host in settings.ALLOWED_HOSTS:
+        if host != "*" and not host.startswith("."):
+            return host
+    return "localhost"
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+@dataclass
+class ASGIResponse:
+    status_code: int
+
+
+class ASGIClient:
+    """Just enough of an ASGI server to call the ASGI application in-process with a logged-in session."""
+
+    def __init__(self, application, session_client, host):
+        self.application = application
+        self.host = host
+        # An unmasked secret is accepted both as the cookie and as the header.
+        self.csrf_token = get_random_string(32, string.ascii_letters + string.digits)
+        cookies = {name: morsel.value for name, morsel in session_client.cookies.items()}
+        cookies[settings.CSRF_COOKIE_NAME] = self.csrf_token
+        self.cookie_header = "; ".join(f"{name}={value}" for name, value in cookies.items()).encode()
+
+    async def request(self, method, path, data=None):
+        body = urlencode(data or {}).encode() if method == "POST" else b""
+        headers = [(b"host", self.host.encode()), (b"cookie", self.cookie_header)]
+        if method == "POST":
+            headers += [
+                (b"content-type", b"application/x-www-form-urlencoded"),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-csrftoken", self.csrf_token.encode()),
+            ]
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": headers,
+            "client": ("127.0.0.1", 0),
+            "server": (self.host, 80),
+        }
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+        status = []
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            # The client never disconnects early.
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                status.append(message["status"])
+
+        await self.application(scope, receive, send)
+        return ASGIResponse(status[0])
+
+    def get(self, path, data=None):
+        return async_to_sync(self.request)("GET", path, data)
+
+    def post(self, path, data=None):
+        return async_to_sync(self.request)("POST", path, data)
+
+
+@dataclass
+class WorkerConfig:
+    interface: str
+    mix: dict
+    skew: float
+    duration: float
+    users: list  # (id, username), ordered by popularity for the skew
+    tweets_by_user: dict
+    seed: int = 0
+
+
+@dataclass
+class WorkerResult:
+    latencies: dict = field(default_factory=lambda: defaultdict(list))
+    errors: Counter = field(default_factory=Counter)
+    lock_wait: float = 0.0
+
+    def merge(self, other):
+        for operation, latencies in other.latencies.items():
+            self.latencies[operation].extend(latencies)
+        self.errors.update(other.errors)
+        self.lock_wait += other.lock_wait
+
+
+class Worker:
+    def __init__(self, config):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.targets = ZipfChooser(config.users, config.skew, self.rng)
+        self.tweets_by_user = {user_id: list(ids) for user_id, ids in config.tweets_by_user.items()}
+        self.operations = list(config.mix)
+        self.weights = [config.mix[operation] for operation in self.operations]
+        self.clients = {}
+        self.counter = itertools.count()
+        self.application = get_asgi_application() if config.interface == "asgi" else None
+
+    def client_for(self, user):
+        if user[0] not in self.clients:
+            client = Client(HTTP_HOST=request_host())
+            client.force_login(get_user_model().objects.get(pk=user[0]))
+            if self.application is not None:
+                client = ASGIClient(self.application, client, request_host())
+            self.clients[user[0]] = client
+        return self.clients[user[0]]
+
+    def request(self, client, method, path, data=None):
+        response = getattr(client, method)(path, data)
+        if getattr(response, "streaming", False):
+            # Read a streamed page to the end, as a browser would.
+            response.getvalue()
+        return response
+
+    def perform(self, operation, actor):
+        client = self.client_for(actor)
+        target = self.targets.choice()
+        if operation == "timeline":
+            return self.request(client, "get", reverse("tweets:home"))
+        if operation == "profile":
+            return self.request(client, "get", reverse("accounts:user_profile", args=[target[1]]))
+        if operation == "post":
+            content = f"loadtest {actor[1]} {next(self.counter)}"
+            return self.request(client, "post", reverse("tweets:create"), {"content": content})
+        if operation == "like":
+            tweet_ids = self.tweets_by_user.get(target[0])
+            if not tweet_ids:
+                return self.perform("post", actor)
+            return self.request(client, "post", reverse("tweets:like", args=[self.rng.choice(tweet_ids)]))
+        if actor == target:
+            target = self.rng.choice(self.config.users)
+        return self.request(client, "post", reverse("accounts:follow", args=[target[1]]))
+
+    def run(self):
+        result = WorkerResult()
+        deadline = time.perf_counter() + self.config.duration
+        while time.perf_counter() < deadline:
+            operation = self.rng.choices(self.operations, self.weights)[0]
+            actor = self.rng.choice(self.config.users)
+            start = time.perf_counter()
+            try:
+                response = self.perform(operation, actor)
+                if response.status_code >= 400:
+                    result.errors[f"{operation}: HTTP {response.status_code}"] += 1
+            except Exception as e:
+                result.errors[f"{operation}: {type(e).__name__}: {e}"] += 1
+            result.latencies[operation].append(time.perf_counter() - start)
+        result.lock_wait = sum(getattr(connection, "lock_wait", 0.0) for connection in connections.all())
+        connections.close_all()
+        return result
+
+
+def run_worker(config):
+    return Worker(config).run()
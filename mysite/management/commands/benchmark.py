@@ -0,0 +1,57 @@
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils.module_loading import autodiscover_modules
+
+from mysite.benchmarks import scenarios
+
+
+def parse_value(value):
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+class Command(BaseCommand):
+    help = "Run benchmark scenarios registered in the apps' benchmarks modules. All writes are rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument("names", nargs="*", help="Scenarios to run (default: all).")
+        parser.add_argument("--list", action="store_true", help="List the available scenarios.")
+        parser.add_argument(
+            "--param", action="append", default=[], metavar="KEY=VALUE", help="Override a scenario argument."
+        )
+
+    def handle(self, *args, **options):
+        autodiscover_modules("benchmarks")
+        if options["list"]:
+            for name, func in sorted(scenarios.items()):
+                summary = (func.__doc__ or "").strip().split("\n")[0]
+                self.stdout.write(f"{name}: {summary}")
+            return
+
+        names = options["names"] or sorted(scenarios)
+        unknown = set(names) - set(scenarios)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        try:
+            params = dict(param.split("=", 1) for param in options["param"])
+        except ValueError:
+            raise CommandError("--param must look like KEY=VALUE.")
+        params = {key: parse_value(value) for key, value in params.items()}
+
+        for name in names:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(transaction.atomic(using=alias))
+                rows = scenarios[name](**params)
+                for alias in connections:
+                    transaction.set_rollback(True, using=alias)
+            for label, metrics in rows:
+                values = "  ".join(f"{key}={value}" for key, value in metrics.items())
+                self.stdout.write(f"  {label:<40} {values}")
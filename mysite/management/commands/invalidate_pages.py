@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import NoReverseMatch
+
+from mysite.page_cache import invalidate_page, invalidate_view, page_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Drop pages cached for anonymous visitors, by URL name or path. Only reaches the web workers "
+        "when the pages cache is shared (Redis, Memcached)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("pages", nargs="*", help="URL names (welcome:index) or paths (/) to drop.")
+        parser.add_argument("--all", action="store_true", help="Drop every cached page.")
+
+    def handle(self, *args, **options):
+        if options["all"]:
+            page_cache().clear()
+            self.stdout.write("Dropped every cached page.")
+            return
+        if not options["pages"]:
+            views = ", ".join(settings.ANONYMOUS_PAGE_CACHE)
+            raise CommandError(f"Name the pages to drop or pass --all. Cached views: {views}")
+        for page in options["pages"]:
+            if page.startswith("/"):
+                invalidate_page(page)
+                continue
+            try:
+                invalidate_view(page)
+            except NoReverseMatch:
+                raise CommandError(f"Unknown URL name: {page}")
+        self.stdout.write(f"Dropped {len(options['pages'])} page(s).")
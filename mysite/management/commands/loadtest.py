@@ -0,0 +1,116 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+
+from mysite.loadtest import WorkerConfig, WorkerResult, parse_mix, percentile, run_worker
+from mysite.processes import spawn_pool
+from tweets.models import Tweet
+
+User = get_user_model()
+
+USERNAME_PREFIX = "loadtest-"
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a mixed workload against the application in-process from concurrent threads or processes and report "
+        "throughput, latency percentiles, errors and SQLite lock wait. Writes to the configured database; the "
+        f"{USERNAME_PREFIX}* users and their tweets are kept between runs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mode", choices=["thread", "process"], default="thread")
+        parser.add_argument("--interface", choices=["wsgi", "asgi"], default="wsgi")
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--duration", type=float, default=10, help="Seconds each worker keeps sending requests.")
+        parser.add_argument(
+            "--mix",
+            default="timeline=60,profile=10,post=10,like=15,follow=5",
+            help="Relative weights of timeline, profile, post, like and follow requests.",
+        )
+        parser.add_argument(
+            "--skew", type=float, default=1.0, help="Zipf exponent of target popularity; 0 is uniform."
+        )
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--tweets-per-user", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def setup_data(self, user_count, tweets_per_user):
+        usernames = [f"{USERNAME_PREFIX}{i}" for i in range(user_count)]
+        password = make_password(None)
+        User.objects.bulk_create(
+            [User(username=username, password=password) for username in usernames], ignore_conflicts=True
+        )
+        users = list(User.objects.filter(username__in=usernames).order_by("pk").values_list("pk", "username"))
+        tweets_by_user = {}
+        for user_id, username in users:
+            tweet_ids = list(Tweet.objects.filter(user_id=user_id).values_list("pk", flat=True)[:tweets_per_user])
+            for i in range(len(tweet_ids), tweets_per_user):
+                tweet = Tweet(user_id=user_id, content=f"seed {username} {i}")
+                tweet.save()
+                tweet_ids.append(tweet.pk)
+            tweets_by_user[user_id] = tweet_ids
+        return users, tweets_by_user
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options["mix"])
+        except ValueError as e:
+            raise CommandError(e)
+        if options["users"] < 2:
+            raise CommandError("--users must be at least 2.")
+
+        users, tweets_by_user = self.setup_data(options["users"], options["tweets_per_user"])
+        configs = [
+            WorkerConfig(
+                interface=options["interface"],
+                mix=mix,
+                skew=options["skew"],
+                duration=options["duration"],
+                users=users,
+                tweets_by_user=tweets_by_user,
+                seed=options["seed"] + i,
+            )
+            for i in range(options["concurrency"])
+        ]
+        if options["mode"] == "process":
+            executor = spawn_pool(options["concurrency"])
+        else:
+            executor = ThreadPoolExecutor(options["concurrency"], thread_name_prefix="loadtest")
+
+        self.stdout.write(
+            f"{options['concurrency']} {options['mode']} workers x {options['duration']}s "
+            f"over {options['interface']}, mix {mix}, skew {options['skew']}"
+        )
+        start = time.perf_counter()
+        with executor:
+            results = list(executor.map(run_worker, configs))
+        elapsed = time.perf_counter() - start
+        self.report(results, elapsed)
+
+    def report(self, results, elapsed):
+        total = WorkerResult()
+        for result in results:
+            total.merge(result)
+        requests = sum(len(latencies) for latencies in total.latencies.values())
+        errors = sum(total.errors.values())
+
+        self.stdout.write(f"{'operation':<10} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for operation, latencies in sorted(total.latencies.items()):
+            latencies.sort()
+            self.stdout.write(
+                f"{operation:<10} {len(latencies):>9} {len(latencies) / elapsed:>8.1f} "
+                f"{percentile(latencies, 0.5) * 1000:>8.1f} {percentile(latencies, 0.95) * 1000:>8.1f} "
+                f"{percentile(latencies, 0.99) * 1000:>8.1f}"
+            )
+        self.stdout.write(f"total: {requests} requests in {elapsed:.1f}s ({requests / elapsed:.1f} req/s)")
+        self.stdout.write(f"errors: {errors} ({errors / requests if requests else 0:.2%})")
+        for error, count in total.errors.most_common(5):
+            self.stdout.write(f"  {count:>6}  {error}")
+        self.stdout.write(
+            f"SQLite lock wait: {total.lock_wait * 1000:.1f} ms in total, "
+            f"{total.lock_wait * 1000 / requests if requests else 0:.2f} ms per request"
+        )
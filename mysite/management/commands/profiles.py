@@ -0,0 +1,66 @@
+import io
+import pstats
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from mysite.profiling import read_collapsed, view_directory
+
+
+class Command(BaseCommand):
+    help = "Aggregate the request profiles written by ProfilingMiddleware into the hottest functions."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--view", help="Only profiles of this URL name, e.g. tweets:home.")
+        parser.add_argument("--limit", type=int, default=20, help="Number of functions to show.")
+        parser.add_argument(
+            "--sort",
+            choices=["tottime", "cumulative"],
+            default="tottime",
+            help="Rank by time in the function itself or including its callees.",
+        )
+        parser.add_argument(
+            "--collapsed", metavar="PATH", help="Also write the merged sampled stacks here, for a flamegraph."
+        )
+
+    def handle(self, *args, **options):
+        directory = view_directory(options["view"]) if options["view"] else Path(settings.PROFILING_DIR)
+        prof_files = sorted(directory.rglob("*.prof"))
+        collapsed_files = sorted(directory.rglob("*.collapsed"))
+        if not prof_files and not collapsed_files:
+            raise CommandError(f"No profiles in {directory}.")
+
+        if prof_files:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"cProfile: {len(prof_files)} requests"))
+            out = io.StringIO()
+            stats = pstats.Stats(*map(str, prof_files), stream=out)
+            stats.strip_dirs().sort_stats(options["sort"]).print_stats(options["limit"])
+            self.stdout.write(out.getvalue())
+
+        if collapsed_files:
+            stacks = Counter()
+            for path in collapsed_files:
+                stacks.update(read_collapsed(path))
+            self.report_samples(stacks, len(collapsed_files), options)
+            if options["collapsed"]:
+                with open(options["collapsed"], "w") as f:
+                    for stack, count in stacks.most_common():
+                        f.write(f"{stack} {count}\n")
+                self.stdout.write(f"Merged stacks written to {options['collapsed']}")
+
+    def report_samples(self, stacks, requests, options):
+        total = sum(stacks.values())
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Sampled: {requests} requests, {total} samples"))
+        own = Counter()
+        inclusive = Counter()
+        for stack, count in stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for frame in set(frames):
+                inclusive[frame] += count
+        ranking = own if options["sort"] == "tottime" else inclusive
+        self.stdout.write(f"{'own':>7} {'total':>7}  function")
+        for frame, _ in ranking.most_common(options["limit"]):
+            self.stdout.write(f"{own[frame] / total:>7.1%} {inclusive[frame] / total:>7.1%}  {frame}")
@@ -0,0 +1,67 @@
+import json
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from mysite.loadtest import percentile
+
+
+def log_files(path):
+    """The log and its rotated backups (``.1`` is the newest backup)."""
+    path = Path(path)
+    backups = [backup for backup in path.parent.glob(f"{path.name}.*") if backup.suffix[1:].isdigit()]
+    backups.sort(key=lambda backup: int(backup.suffix[1:]), reverse=True)
+    return backups + ([path] if path.exists() else [])
+
+
+class Command(BaseCommand):
+    help = "Rank the fingerprints in the slow-query log by total time, count or p95 duration."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sort", choices=["total", "count", "p95"], default="total")
+        parser.add_argument("--limit", type=int, default=10, help="Number of fingerprints to show.")
+        parser.add_argument("--view", help="Only queries issued while handling this URL name.")
+        parser.add_argument("--log", default=settings.SLOW_QUERY_LOG, help="Log file (default: SLOW_QUERY_LOG).")
+
+    def handle(self, *args, **options):
+        files = log_files(options["log"])
+        if not files:
+            raise CommandError(f"No slow-query log at {options['log']}.")
+
+        durations = defaultdict(list)
+        origins = defaultdict(Counter)
+        for path in files:
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if options["view"] and entry["view"] != options["view"]:
+                        continue
+                    durations[entry["fingerprint"]].append(entry["duration"])
+                    origins[entry["fingerprint"]][(entry["view"], entry["location"])] += 1
+
+        rows = []
+        for sql, values in durations.items():
+            values.sort()
+            rows.append({"sql": sql, "total": sum(values), "count": len(values), "p95": percentile(values, 0.95)})
+        rows.sort(key=lambda row: row[options["sort"]], reverse=True)
+
+        total = sum(row["total"] for row in rows)
+        self.stdout.write(
+            f"{sum(row['count'] for row in rows)} slow queries, {total:.3f}s in {len(rows)} fingerprints"
+        )
+        for rank, row in enumerate(rows[: options["limit"]], 1):
+            share = row["total"] / total if total else 0
+            self.stdout.write(
+                self.style.MIGRATE_HEADING(
+                    f"{rank}. total {row['total']:.3f}s ({share:.0%})  count {row['count']}  "
+                    f"mean {row['total'] / row['count'] * 1000:.1f}ms  p95 {row['p95'] * 1000:.1f}ms"
+                )
+            )
+            self.stdout.write(f"   {row['sql']}")
+            for (view, location), count in origins[row["sql"]].most_common(3):
+                self.stdout.write(f"   {count:>6}x  {view or '-'}  {location or '-'}")
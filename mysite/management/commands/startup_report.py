@@ -0,0 +1,80 @@
+import json
+import os
+import subprocess
+import sys
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter so that nothing is imported yet.
+SCRIPT = """
+import json, time
+start = time.perf_counter()
+import mysite.wsgi
+loaded = time.perf_counter() - start
+steps = {{}}
+if {warm_up}:
+    from mysite.warmup import warm_up
+    steps = warm_up()
+print(json.dumps({{"application": loaded, "warm_up": steps}}))
+"""
+
+
+def parse_importtime(stderr):
+    """``[(module, self_us, cumulative_us)]`` from the output of ``python -X importtime``."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            continue  # the header
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+class Command(BaseCommand):
+    help = "Load the WSGI application in a fresh interpreter and report import and warm-up times."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=15, help="Number of modules and packages to show.")
+        parser.add_argument("--no-warm-up", action="store_false", dest="warm_up", help="Only load the application.")
+        parser.add_argument(
+            "--max-seconds", type=float, help="Fail if loading and warming up take longer, e.g. in CI."
+        )
+
+    def handle(self, *args, **options):
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": settings.SETTINGS_MODULE, "WARMUP_ON_STARTUP": "0"}
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", SCRIPT.format(warm_up=options["warm_up"])],
+            capture_output=True,
+            text=True,
+            cwd=settings.BASE_DIR,
+            env=env,
+        )
+        if process.returncode:
+            raise CommandError(f"Loading the application failed:\n{process.stderr[-2000:]}")
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        modules = parse_importtime(process.stderr)
+
+        total = result["application"]
+        self.stdout.write(self.style.MIGRATE_HEADING("Startup"))
+        self.stdout.write(f"  {'load application':<24} {result['application'] * 1000:>8.1f}ms")
+        for step, (seconds, detail) in result["warm_up"].items():
+            total += seconds
+            self.stdout.write(f"  {'warm up: ' + step:<24} {seconds * 1000:>8.1f}ms  ({detail})")
+        self.stdout.write(f"  {'total':<24} {total * 1000:>8.1f}ms")
+
+        packages = Counter()
+        for name, self_us, _ in modules:
+            packages[name.split(".")[0]] += self_us
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Imports by package ({len(modules)} modules)"))
+        for package, self_us in packages.most_common(options["limit"]):
+            self.stdout.write(f"  {package:<40} {self_us / 1000:>8.1f}ms")
+        self.stdout.write(self.style.MIGRATE_HEADING("Slowest modules (self time)"))
+        for name, self_us, cumulative_us in sorted(modules, key=lambda module: -module[1])[: options["limit"]]:
+            self.stdout.write(f"  {name:<40} {self_us / 1000:>8.1f}ms  cumulative {cumulative_us / 1000:.1f}ms")
+
+        if options["max_seconds"] is not None and total > options["max_seconds"]:
+            raise CommandError(f"Startup took {total:.2f}s, more than {options['max_seconds']}s.")
@@ -0,0 +1,41 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def copy_database(source, destination):
+    """Copy a live SQLite database with the online backup API."""
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(destination)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database to every replica, optionally repeating to simulate replication lag."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval", type=float, default=0, help="Seconds between copies. Copy once and exit when 0."
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError("No replicas configured. Set the DATABASE_REPLICAS environment variable.")
+        databases = [settings.DATABASES[alias] for alias in ["default", *settings.DATABASE_REPLICAS]]
+        if any("sqlite3" not in db["ENGINE"] for db in databases):
+            raise CommandError("sync_replicas only supports SQLite databases.")
+
+        primary = settings.DATABASES["default"]["NAME"]
+        while True:
+            for alias in settings.DATABASE_REPLICAS:
+                copy_database(primary, settings.DATABASES[alias]["NAME"])
+            self.stdout.write(f"Copied {primary} to {', '.join(settings.DATABASE_REPLICAS)}")
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,243 @@
+"""Prometheus metrics shared by every worker process through memory-mapped files.
+
+Each thread of each process owns one file in ``settings.METRICS_DIR`` and is
+the only writer of it, so recording a sample takes no lock: it adds to a
+float at a known offset of the mapping. Scraping ``/metrics`` sums the files
+of all processes, alive or dead, which keeps counters monotonic across
+worker restarts. Clear the directory when the whole server is redeployed.
+
+File layout: an 8-byte used-length header, then entries of
+``u32 key length | key (UTF-8, padded to 8 bytes) | f64 value``. An entry is
+written before the header grows over it, so a reader never sees half of one.
+"""
+
+import mmap
+import os
+import struct
+import threading
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+
+HEADER = struct.Struct("<Q")
+KEY_LENGTH = struct.Struct("<I")
+VALUE = struct.Struct("<d")
+INITIAL_SIZE = 64 * 1024
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+registry = {}
+
+
+class MetricsFile:
+    """One writer's values, keyed by sample name and labels."""
+
+    def __init__(self, path):
+        self.path = path
+        self.pid = os.getpid()
+        fd = os.open(path, os.O_RDWR | os.O_CREAT)
+        try:
+            size = os.fstat(fd).st_size
+            if size < INITIAL_SIZE:
+                os.ftruncate(fd, INITIAL_SIZE)
+                size = INITIAL_SIZE
+            self.mmap = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.used = HEADER.unpack_from(self.mmap, 0)[0] or HEADER.size
+        self.offsets = {key: offset for key, _, offset in read_entries(self.mmap, self.used)}
+
+    def add(self, key, amount):
+        offset = self.offsets.get(key)
+        if offset is None:
+            offset = self._allocate(key)
+        VALUE.pack_into(self.mmap, offset, VALUE.unpack_from(self.mmap, offset)[0] + amount)
+
+    def _allocate(self, key):
+        encoded = key.encode()
+        length = KEY_LENGTH.size + len(encoded)
+        length += -length % 8
+        entry_size = length + VALUE.size
+        if self.used + entry_size > len(self.mmap):
+            self._grow(self.used + entry_size)
+        KEY_LENGTH.pack_into(self.mmap, self.used, len(encoded))
+        self.mmap[self.used + KEY_LENGTH.size : self.used + KEY_LENGTH.size + len(encoded)] = encoded
+        offset = self.used + length
+        VALUE.pack_into(self.mmap, offset, 0.0)
+        self.used += entry_size
+        HEADER.pack_into(self.mmap, 0, self.used)
+        self.offsets[key] = offset
+        return offset
+
+    def _grow(self, needed):
+        size = len(self.mmap)
+        while size < needed:
+            size *= 2
+        self.mmap.close()
+        with open(self.path, "r+b") as f:
+            f.truncate(size)
+            self.mmap = mmap.mmap(f.fileno(), size)
+
+    def close(self):
+        self.mmap.close()
+
+
+def read_entries(buffer, used):
+    position = HEADER.size
+    while position < used:
+        length = KEY_LENGTH.unpack_from(buffer, position)[0]
+        start = position + KEY_LENGTH.size
+        key = bytes(buffer[start : start + length]).decode()
+        offset = start + length + (-(KEY_LENGTH.size + length) % 8)
+        yield key, VALUE.unpack_from(buffer, offset)[0], offset
+        position = offset + VALUE.size
+
+
+_local = threading.local()
+
+
+def _file():
+    directory = settings.METRICS_DIR
+    current = getattr(_local, "file", None)
+    # A forked worker inherits its parent's mapping; it must write to a file of its own.
+    if current is None or current.pid != os.getpid() or _local.directory != directory:
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        _local.file = MetricsFile(Path(directory) / f"{os.getpid()}-{threading.get_ident()}.metrics")
+        _local.directory = directory
+    return _local.file
+
+
+def read_values():
+    """The sum of every sample over all metrics files."""
+    totals = {}
+    directory = Path(settings.METRICS_DIR)
+    if not directory.is_dir():
+        return totals
+    for path in directory.glob("*.metrics"):
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < HEADER.size:
+            continue
+        used = min(HEADER.unpack_from(data, 0)[0], len(data))
+        for key, value, _ in read_entries(data, used):
+            totals[key] = totals.get(key, 0.0) + value
+    return totals
+
+
+def reset():
+    """Forget every recorded value, e.g. between tests."""
+    current = getattr(_local, "file", None)
+    if current is not None:
+        current.close()
+        _local.file = None
+    directory = Path(settings.METRICS_DIR)
+    if directory.is_dir():
+        for path in directory.glob("*.metrics"):
+            path.unlink()
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def sample_key(name, labels):
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{label}="{escape(value)}"' for label, value in labels) + "}"
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry[name] = self
+
+    def _labels(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes the labels {', '.join(self.labelnames)}.")
+        return tuple((label, labels[label]) for label in self.labelnames)
+
+    def render(self, values):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines += [f"{key} {format_value(values[key])}" for key in sorted(values) if is_sample_of(key, self.name)]
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        _file().add(sample_key(self.name, self._labels(labels)), amount)
+
+
+class Histogram(Metric):
+    """Buckets are stored non-cumulatively (one write per observation) and summed up when rendered."""
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        labels = self._labels(labels)
+        index = bisect_left(self.buckets, value)
+        le = format_value(self.buckets[index]) if index < len(self.buckets) else "+Inf"
+        file = _file()
+        file.add(sample_key(f"{self.name}_bucket", labels + (("le", le),)), 1)
+        file.add(sample_key(f"{self.name}_sum", labels), value)
+        file.add(sample_key(f"{self.name}_count", labels), 1)
+
+    def render(self, values):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        series = sorted(key for key in values if is_sample_of(key, f"{self.name}_count"))
+        for count_key in series:
+            labels = count_key[len(f"{self.name}_count") :]
+            prefix = labels[:-1] + "," if labels else "{"
+            cumulative = 0.0
+            for le in [format_value(bucket) for bucket in self.buckets] + ["+Inf"]:
+                key = f'{self.name}_bucket{prefix}le="{le}"}}'
+                cumulative += values.get(key, 0.0)
+                lines.append(f"{key} {format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{labels} {format_value(values.get(f'{self.name}_sum{labels}', 0.0))}")
+            lines.append(f"{count_key} {format_value(values[count_key])}")
+        return lines
+
+
+def is_sample_of(key, name):
+    return key == name or key.startswith(name + "{")
+
+
+def format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def render():
+    """Every registered metric in the Prometheus text exposition format."""
+    values = read_values()
+    lines = []
+    for name in sorted(registry):
+        lines += registry[name].render(values)
+    return "\n".join(lines) + "\n"
+
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "Time spent handling a request, by URL name.", ["view", "method"]
+)
+requests_total = Counter(
+    "http_requests_total", "Requests handled, by URL name and status.", ["view", "method", "status"]
+)
+db_queries = Counter("db_queries_total", "Database queries run while handling requests, by URL name.", ["view"])
+db_query_seconds = Counter("db_query_seconds_total", "Time spent in database queries, by URL name.", ["view"])
+cache_requests = Counter("cache_requests_total", "Cache lookups, by cache alias and result.", ["cache", "result"])
+writes = Counter("app_writes_total", "Tweets, likes and follows written.", ["kind"])
+feed_rankings = Counter(
+    "feed_rankings_total", 'Ranked "for you" feeds, by whether they fell back to newest first.', ["result"]
+)
+cached_values = Counter(
+    "cached_values_total", "get_or_compute lookups (see mysite.caching), by how they were answered.", ["result"]
+)
@@ -0,0 +1,82 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+from .routers import pin_to_primary
+from .streaming import after_response
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS", "TRACE")
+
+
+class PrimaryStickinessMiddleware:
+    """Read from the primary during and shortly after a client's write.
+
+    Unsafe requests (like, follow, tweet create, ...) set a short-lived cookie;
+    while it is present the client's reads skip the replicas, so they see their
+    own writes even when replication lags behind.
+    """
+
+    cookie_name = "pin_primary"
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        is_write = request.method not in SAFE_METHODS
+        with pin_to_primary(is_write or self.cookie_name in request.COOKIES):
+            response = self.get_response(request)
+        if is_write:
+            response.set_cookie(
+                self.cookie_name,
+                "1",
+                max_age=settings.PRIMARY_STICKINESS_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+
+class MetricsMiddleware:
+    """Record each request's latency, status and database queries, labeled by URL name (see ``mysite.metrics``)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = [0, 0.0]
+
+        def count_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries[0] += 1
+                queries[1] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(count_query))
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            stack.close()
+            raise
+
+        def record():
+            stack.close()
+            elapsed = time.perf_counter() - start
+            match = request.resolver_match
+            view = match.view_name if match else "<unresolved>"
+            metrics.request_duration.observe(elapsed, view=view, method=request.method)
+            metrics.requests_total.inc(view=view, method=request.method, status=response.status_code)
+            if queries[0]:
+                metrics.db_queries.inc(queries[0], view=view)
+                metrics.db_query_seconds.inc(queries[1], view=view)
+
+        # A streamed response is recorded once its body is sent.
+        after_response(response, record)
+        return response
@@ -0,0 +1,83 @@
+"""Whole-page cache for anonymous visitors.
+
+Pages whose URL name is in ``settings.ANONYMOUS_PAGE_CACHE`` (URL name ->
+seconds) are the same for every logged-out visitor. ``AnonymousPageCacheMiddleware``
+stores them in the ``"pages"`` cache by path and host and serves later GET
+and HEAD requests without a session cookie or query string from there,
+before the session, authentication and CSRF middleware run and without a
+database query.
+
+A page is only stored when its response sets no cookie, so nothing tied to
+one visitor (a CSRF token, a session) is handed to another. Stored pages are
+sent with ``Cache-Control: public, max-age=...`` and ``Vary: Cookie`` so
+proxies may keep them for logged-out visitors too; the same pages rendered
+for logged-in users are marked ``private``.
+
+Entries expire after their timeout; ``invalidate_page`` and
+``invalidate_view`` drop them earlier, e.g. when what a page shows changes.
+"""
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.urls import resolve, reverse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+CACHE_ALIAS = "pages"
+
+
+def page_cache():
+    return caches[CACHE_ALIAS]
+
+
+# Only paths of stored pages are resolved here, so the cache stays small.
+resolve_cached = lru_cache(maxsize=1024)(resolve)
+
+
+def page_key(path):
+    return f"pages:{path}"
+
+
+def invalidate_page(path):
+    page_cache().delete(page_key(path))
+
+
+def invalidate_view(view_name, *args, **kwargs):
+    invalidate_page(reverse(view_name, args=args, kwargs=kwargs))
+
+
+def is_cacheable_request(request):
+    return (
+        request.method in ("GET", "HEAD") and not request.GET and settings.SESSION_COOKIE_NAME not in request.COOKIES
+    )
+
+
+class AnonymousPageCacheMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        cacheable = is_cacheable_request(request)
+        if cacheable:
+            host = request.get_host()
+            # One entry per path holds the page for each host, so a hit is a single lookup.
+            pages = page_cache().get(page_key(request.path)) or {}
+            response = pages.get(host)
+            if response is not None:
+                # Label the request for the metrics and logs as if the view had run.
+                request.resolver_match = resolve_cached(request.path_info)
+                return response
+
+        response = self.get_response(request)
+        match = request.resolver_match
+        timeout = settings.ANONYMOUS_PAGE_CACHE.get(match.view_name) if match else None
+        if timeout is None:
+            return response
+        if not cacheable or response.cookies or response.status_code != 200 or response.streaming:
+            patch_cache_control(response, private=True)
+            return response
+        patch_cache_control(response, public=True, max_age=timeout)
+        patch_vary_headers(response, ["Cookie"])
+        if request.method == "GET":
+            page_cache().set(page_key(request.path), {**pages, host: response}, timeout)
+        return response
@@ -0,0 +1,19 @@
+"""Process pools for management commands.
+
+Children are started with "spawn" so they do not inherit open database
+connections. The initializer lives here, in a module that imports no models,
+because a child has to import it before Django is set up.
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+
+
+def setup_django():
+    django.setup()
+
+
+def spawn_pool(max_workers):
+    return ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context("spawn"), initializer=setup_django)
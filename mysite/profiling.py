@@ -0,0 +1,139 @@
+"""Per-request profiles, written to ``settings.PROFILING_DIR`` by URL name.
+
+``ProfilingMiddleware`` profiles a request when it carries
+``settings.PROFILING_TOKEN`` in the ``X-Profile`` header or the ``profile``
+query parameter, or with probability ``settings.PROFILING_SAMPLE_RATE``.
+``PROFILING_MODE`` picks the profiler:
+
+- ``"cprofile"`` traces every call and writes a ``.prof`` file (pstats).
+- ``"sampling"`` reads the request thread's stack every
+  ``PROFILING_INTERVAL`` seconds from another thread and writes the stacks in
+  collapsed format (``a;b;c count``), which flamegraph.pl and speedscope read.
+  Its overhead does not grow with the number of calls, so it suits sampling.
+
+Both profile the thread handling the request only, i.e. not the thread pool
+ASGI runs sync views in. ``python manage.py profiles`` aggregates the files.
+"""
+import cProfile
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+
+from .streaming import after_response
+
+SUFFIXES = {"cprofile": ".prof", "sampling": ".collapsed"}
+
+
+def frame_label(frame):
+    code = frame.f_code
+    filename = code.co_filename
+    if filename.startswith(str(settings.BASE_DIR)):
+        filename = os.path.relpath(filename, settings.BASE_DIR)
+    elif "site-packages" in filename:
+        filename = filename.rsplit("site-packages" + os.sep, 1)[-1]
+    return f"{code.co_qualname} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+class SamplingProfiler:
+    """Count the stacks of one thread, sampled from a background thread."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+
+    def start(self, thread_id=None):
+        self.thread_id = thread_id or threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def write(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class CProfiler:
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def write(self, path):
+        self.profile.dump_stats(path)
+
+
+def view_directory(view_name):
+    return Path(settings.PROFILING_DIR) / view_name.replace(":", ".")
+
+
+def read_collapsed(path):
+    stacks = Counter()
+    with open(path) as f:
+        for line in f:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            if stack:
+                stacks[stack] += int(count)
+    return stacks
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def should_profile(self, request):
+        token = settings.PROFILING_TOKEN
+        if token:
+            supplied = request.headers.get("X-Profile") or request.GET.get("profile")
+            if supplied and constant_time_compare(supplied, token):
+                return True
+        return random.random() < settings.PROFILING_SAMPLE_RATE
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        mode = settings.PROFILING_MODE
+        profiler = CProfiler() if mode == "cprofile" else SamplingProfiler(settings.PROFILING_INTERVAL)
+        profiler.start()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            profiler.stop()
+            raise
+
+        def write():
+            profiler.stop()
+            match = request.resolver_match
+            directory = view_directory(match.view_name if match else "unresolved")
+            directory.mkdir(parents=True, exist_ok=True)
+            profiler.write(directory / f"{time.time_ns()}-{os.getpid()}{SUFFIXES[mode]}")
+
+        # A streamed response is profiled until its body is sent.
+        after_response(response, write)
+        return response
@@ -0,0 +1,45 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+_pinned_to_primary = ContextVar("pinned_to_primary", default=False)
+
+
+@contextmanager
+def pin_to_primary(pinned=True):
+    """Send every read inside the block to the primary."""
+    token = _pinned_to_primary.set(pinned)
+    try:
+        yield
+    finally:
+        _pinned_to_primary.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """Route reads of the timeline models to a replica and all writes to the primary."""
+
+    route_app_labels = {"accounts", "tweets"}
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in self.route_app_labels:
+            return None
+        if not settings.DATABASE_REPLICAS or _pinned_to_primary.get():
+            return "default"
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {"default", *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema together with the data from the primary.
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -40,11 +41,31 @@ INSTALLED_APPS = [
     "accounts.apps.AccountsConfig",
     "tweets.apps.TweetsConfig",
     "welcome.apps.WelcomeConfig",
+    "jobs.apps.JobsConfig",
+    "notifications.apps.NotificationsConfig",
+    "mysite",
 ]
 
 AUTH_USER_MODEL = "accounts.User"
 
+AUTHENTICATION_BACKENDS = ["accounts.backends.CachedModelBackend"]
+
+# Seconds an authenticated user row is served from the cache instead of the database.
+USER_CACHE_TIMEOUT = 60
+
+# Username -> user resolution for the <str:username> routes (see accounts/usernames.py).
+USERNAME_CACHE_SIZE = 10000
+USERNAME_CACHE_LOCAL_TIMEOUT = 5
+USERNAME_CACHE_TIMEOUT = 600
+USERNAME_CACHE_MISSING_TIMEOUT = 30
+
 MIDDLEWARE = [
+    "mysite.middleware.MetricsMiddleware",
+    "mysite.profiling.ProfilingMiddleware",
+    "mysite.slow_queries.SlowQueryMiddleware",
+    "mysite.static.StaticFilesMiddleware",
+    "mysite.page_cache.AnonymousPageCacheMiddleware",
+    "mysite.middleware.PrimaryStickinessMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -70,6 +91,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "notifications.context_processors.unread_notifications",
             ],
         },
     },
@@ -77,17 +99,71 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "mysite.wsgi.application"
 
+# Sends the files written during a test run to a temporary directory instead of var/ (see mysite/testing.py).
+TEST_RUNNER = "mysite.testing.TestRunner"
+
 
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "ENGINE": "mysite.backends.sqlite3",
+        "NAME": os.environ.get("DATABASE_NAME", BASE_DIR / "db.sqlite3"),
+        # Keep connections open between requests; they are checked before reuse.
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# Read replicas, e.g. DATABASE_REPLICAS=replica1,replica2. Locally each one is a copy of the
+# primary SQLite file kept up to date with `python manage.py sync_replicas --interval 2`.
+DATABASE_REPLICAS = [alias for alias in os.environ.get("DATABASE_REPLICAS", "").split(",") if alias]
+
+for alias in DATABASE_REPLICAS:
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "NAME": BASE_DIR / f"db_{alias}.sqlite3",
+        "TEST": {"MIRROR": "default"},
+    }
+
+# Tweets and likes are sharded by author, e.g. TWEET_SHARD_COUNT=4 for three extra local SQLite shards.
+# Shard 0 is the default database, which also keeps every other table.
+TWEET_SHARDS = ["default"] + [f"shard{i}" for i in range(1, int(os.environ.get("TWEET_SHARD_COUNT", "1")))]
+
+for alias in TWEET_SHARDS[1:]:
+    DATABASES[alias] = {**DATABASES["default"], "NAME": BASE_DIR / f"db_{alias}.sqlite3"}
+
+# Must be unique per process generating ids (see tweets/ids.py). Left unset, each process claims
+# a free one by locking a file in SNOWFLAKE_LOCK_DIR; pin it when processes on several hosts generate ids.
+SNOWFLAKE_WORKER_ID = int(os.environ["SNOWFLAKE_WORKER_ID"]) if "SNOWFLAKE_WORKER_ID" in os.environ else None
+SNOWFLAKE_LOCK_DIR = os.environ.get("SNOWFLAKE_LOCK_DIR", BASE_DIR / "var" / "snowflake")
+
+DATABASE_ROUTERS = ["tweets.routers.TweetShardRouter", "mysite.routers.PrimaryReplicaRouter"]
+
+# After a write, the client's reads stay on the primary for this many seconds.
+PRIMARY_STICKINESS_SECONDS = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# Use a shared backend (Redis, Memcached) in production so all workers see the same entries.
+
+CACHES = {
+    "default": {
+        "BACKEND": "mysite.backends.cache.LocMemCache",
+    },
+    # Whole pages for anonymous visitors (see mysite/page_cache.py).
+    "pages": {
+        "BACKEND": "mysite.backends.cache.LocMemCache",
+        "LOCATION": "pages",
+        "METRICS_NAME": "pages",
+    },
+}
+
+# Sessions are read from the cache and written through to the database.
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -125,6 +201,18 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+STATICFILES_DIRS = [BASE_DIR / "static"]
+
+# `python manage.py collectstatic` output, served by mysite.static.StaticFilesMiddleware when DEBUG is off.
+STATIC_ROOT = os.environ.get("STATIC_ROOT", BASE_DIR / "var" / "static")
+
+# Without DEBUG, file names carry a content hash and gzip/brotli copies are written (see mysite/storage.py).
+if not DEBUG:
+    STATICFILES_STORAGE = "mysite.storage.CompressedManifestStaticFilesStorage"
+
+# Cache lifetime of static files without a content hash in their name.
+STATIC_MAX_AGE = 3600
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
@@ -134,6 +222,104 @@ LOGIN_URL = "accounts:login"
 LOGIN_REDIRECT_URL = "tweets:home"
 LOGOUT_REDIRECT_URL = "welcome:index"
 
+# Background jobs (see jobs/queue.py and `python manage.py runworker`)
+JOBS_LEASE_SECONDS = 300
+JOBS_RETRY_BACKOFF_SECONDS = 10
+JOBS_RETRY_BACKOFF_MAX_SECONDS = 3600
+
+# Notifications are buffered per process and written in batches (see notifications/notify.py).
+NOTIFICATIONS_BUFFER_SIZE = 500
+NOTIFICATIONS_FLUSH_INTERVAL = 2
+NOTIFICATIONS_UNREAD_CACHE_TIMEOUT = 300
+
+# Tweet views and impressions are counted per process and added in batches (see tweets/impressions.py).
+IMPRESSIONS_BUFFER_SIZE = 1000
+IMPRESSIONS_FLUSH_INTERVAL = 5
+
+# The ranked "for you" feed (see tweets/ranking.py). The ranked ids are
+# cached per viewer for RANKING_CACHE_TIMEOUT seconds (see mysite/caching.py).
+RANKING_BUDGET_MS = 250
+RANKING_CACHE_TIMEOUT = 30
+RANKING_CANDIDATE_HOURS = 72
+RANKING_MAX_CANDIDATES = 10000
+RANKING_SECOND_DEGREE_LIMIT = 500
+RANKING_AFFINITY_DAYS = 30
+RANKING_HALF_LIFE_HOURS = 6
+RANKING_WEIGHTS = {
+    "recency": 3.0,
+    "like_velocity": 1.5,
+    "affinity": 1.0,
+    "followed": 1.0,
+    "replies": 0.5,
+    "liked": -2.0,
+}
+
+# Send the home timeline's page first and its tweets this many at a time (see mysite/streaming.py).
+HOME_STREAMING = os.environ.get("HOME_STREAMING", "0") == "1"
+HOME_STREAMING_CHUNK_SIZE = 50
+
+# Pages served from the cache to visitors without a session, by URL name: seconds (see mysite/page_cache.py).
+ANONYMOUS_PAGE_CACHE = {
+    "welcome:index": 300,
+}
+
+# Each user's blocked and muted ids are cached (see accounts/blocking.py).
+BLOCK_CACHE_TIMEOUT = 600
+
+# Follow and follower counts on profiles are cached and expired on every
+# follow, unfollow and block (see accounts/models.py and mysite/caching.py).
+FOLLOW_COUNTS_CACHE_TIMEOUT = 60
+
+# Per-process Bloom filters for "has liked" and "is following" (see mysite/bloom.py).
+BLOOM_FILTER_ERROR_RATE = 0.01
+BLOOM_FILTER_MIN_CAPACITY = 256
+BLOOM_FILTER_CACHE_SIZE = 10000
+
+# Bulk admin actions work through the selection this many rows at a time (see mysite/admin.py).
+ADMIN_ACTION_CHUNK_SIZE = 1000
+
+# Compile templates, populate URL resolvers, connect, ... when a worker loads the application
+# (see mysite/warmup.py and `python manage.py startup_report`).
+WARMUP_ON_STARTUP = os.environ.get("WARMUP_ON_STARTUP", "1") == "1"
+
+# Per-process metrics files scraped at /metrics (see mysite/metrics.py); clear the directory on redeploy.
+METRICS_DIR = os.environ.get("METRICS_DIR", BASE_DIR / "var" / "metrics")
+METRICS_ALLOWED_IPS = ["127.0.0.1", "::1"]
+
+# Requests sending this token in X-Profile or ?profile=, and a random share of the others,
+# are profiled into PROFILING_DIR (see mysite/profiling.py and `python manage.py profiles`).
+PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN")
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_MODE = os.environ.get("PROFILING_MODE", "cprofile")  # or "sampling"
+PROFILING_INTERVAL = 0.005
+PROFILING_DIR = os.environ.get("PROFILING_DIR", BASE_DIR / "var" / "profiles")
+
+# Queries slower than this many seconds are logged to SLOW_QUERY_LOG (see mysite/slow_queries.py
+# and `python manage.py slow_queries`).
+SLOW_QUERY_THRESHOLD = float(os.environ.get("SLOW_QUERY_THRESHOLD", "0.1"))
+SLOW_QUERY_LOG = Path(os.environ.get("SLOW_QUERY_LOG", BASE_DIR / "var" / "slow_queries.log"))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "message": {"format": "%(message)s"},
+    },
+    "handlers": {
+        "slow_queries": {
+            "class": "mysite.slow_queries.RotatingFileHandler",
+            "filename": SLOW_QUERY_LOG,
+            "maxBytes": 10 * 1024 * 1024,
+            "backupCount": 5,
+            "delay": True,
+            "formatter": "message",
+        },
+    },
+    "loggers": {
+        "mysite.slow_queries": {"handlers": ["slow_queries"], "level": "WARNING", "propagate": False},
+    },
+}
+
 SQL_DEBUG = False
 
 if SQL_DEBUG:
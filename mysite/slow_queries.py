@@ -0,0 +1,133 @@
+"""Log queries slower than ``settings.SLOW_QUERY_THRESHOLD`` seconds.
+
+``record_slow_queries`` is installed as an execute wrapper on every database
+connection when it is created (see ``mysite.apps``). A slow query is logged to
+the ``mysite.slow_queries`` logger as one JSON line holding its fingerprint
+(the SQL with literals and parameter lists collapsed, so that no user data is
+logged and equal ORM calls group together), duration, row count, database,
+the URL name of the request (set by ``SlowQueryMiddleware``) and the first
+frame of project code that issued it. ``settings.LOGGING`` sends it to a
+rotating file which ``python manage.py slow_queries`` aggregates.
+"""
+import json
+import logging
+import logging.handlers
+import os
+import re
+import sys
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from .streaming import after_response
+
+logger = logging.getLogger(__name__)
+
+current_view = ContextVar("current_view", default=None)
+
+FINGERPRINT_RULES = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)"), "(...)"),
+    (re.compile(r"(?:\(\.\.\.\)\s*,\s*)+\(\.\.\.\)"), "(...)"),
+    (re.compile(r"\s+"), " "),
+]
+
+MYSITE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Execute wrappers and database backends sit between the ORM and the code that issued the query.
+SKIPPED_PREFIXES = (
+    os.path.join(MYSITE_DIR, "slow_queries.py"),
+    os.path.join(MYSITE_DIR, "middleware.py"),
+    os.path.join(MYSITE_DIR, "streaming.py"),
+    os.path.join(MYSITE_DIR, "backends") + os.sep,
+)
+
+
+def fingerprint(sql):
+    for pattern, replacement in FINGERPRINT_RULES:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def caller_location():
+    """``path:line in function`` of the innermost project frame outside the database layers."""
+    base_dir = str(settings.BASE_DIR) + os.sep
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(base_dir) and not filename.startswith(SKIPPED_PREFIXES):
+            return f"{os.path.relpath(filename, base_dir)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+def record_slow_queries(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        if duration >= settings.SLOW_QUERY_THRESHOLD:
+            rowcount = getattr(context["cursor"], "rowcount", -1)
+            entry = {
+                "time": time.time(),
+                "fingerprint": fingerprint(sql),
+                "duration": duration,
+                "rows": rowcount if rowcount >= 0 else None,
+                "database": context["connection"].alias,
+                "many": many,
+                "view": current_view.get(),
+                "location": caller_location(),
+            }
+            logger.warning(json.dumps(entry))
+
+
+def install(sender, connection, **kwargs):
+    # The connection is often created inside a ``connection.execute_wrapper()`` block (e.g. the one
+    # of ``MetricsMiddleware``), which pops the last wrapper on exit; the first one is never popped.
+    if record_slow_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_slow_queries)
+
+
+class SlowQueryMiddleware:
+    """Make the URL name of the current request, streamed body included, available to ``record_slow_queries``."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        current_view.set(None)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            current_view.set(None)
+            raise
+        # The queries of a streamed body belong to the view too.
+        after_response(response, lambda: current_view.set(None))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        current_view.set(request.resolver_match.view_name)
+
+
+def move_log(setting, value, **kwargs):
+    """Send later entries to the new ``SLOW_QUERY_LOG`` when the setting changes, e.g. under ``override_settings``."""
+    if setting != "SLOW_QUERY_LOG":
+        return
+    for handler in logger.handlers:
+        if isinstance(handler, logging.FileHandler):
+            with handler.lock:
+                if handler.stream is not None:
+                    handler.stream.close()
+                    handler.stream = None
+                handler.baseFilename = os.path.abspath(value)
+
+
+class RotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Create the log's directory on first write."""
+
+    def _open(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.baseFilename)), exist_ok=True)
+        return super()._open()
@@ -0,0 +1,59 @@
+"""Serve the output of ``collectstatic`` when DEBUG is off.
+
+Files whose names carry a content hash (``js/like.3f2a9c1e04b7.js``, written
+by ``mysite.storage.CompressedManifestStaticFilesStorage``) never change, so
+they are sent with ``Cache-Control: public, max-age=31536000, immutable``;
+other files get ``STATIC_MAX_AGE``. When the client accepts it, the ``.br``
+or ``.gz`` copy written at ``collectstatic`` time is sent instead of the
+file. A web server in front can do the same with ``gzip_static`` and
+``brotli_static``; this middleware keeps a single process deployable as is.
+With DEBUG on, ``runserver`` serves the source files itself.
+"""
+import mimetypes
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.http import FileResponse
+from django.utils.cache import patch_vary_headers
+
+HASHED_NAME = re.compile(r"\.[0-9a-f]{12}\.[^/]+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+
+def accepted_encodings(request):
+    return {part.split(";")[0].strip() for part in request.headers.get("Accept-Encoding", "").split(",")}
+
+
+def static_response(request, name):
+    """A response for ``name`` under ``STATIC_ROOT``, or None if there is no such file."""
+    root = Path(settings.STATIC_ROOT).resolve()
+    path = (root / name).resolve()
+    if root not in path.parents or not path.is_file():
+        return None
+    content_type, _ = mimetypes.guess_type(path.name)
+    accepted = accepted_encodings(request)
+    served, encoding = path, None
+    for candidate, suffix in ENCODINGS:
+        variant = path.with_name(path.name + suffix)
+        if candidate in accepted and variant.is_file():
+            served, encoding = variant, candidate
+            break
+    response = FileResponse(open(served, "rb"), content_type=content_type or "application/octet-stream")
+    if encoding:
+        response["Content-Encoding"] = encoding
+    patch_vary_headers(response, ["Accept-Encoding"])
+    response["Cache-Control"] = IMMUTABLE if HASHED_NAME.search(name) else f"public, max-age={settings.STATIC_MAX_AGE}"
+    return response
+
+
+class StaticFilesMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.DEBUG or not settings.STATIC_ROOT or not request.path.startswith(settings.STATIC_URL):
+            return self.get_response(request)
+        response = static_response(request, request.path[len(settings.STATIC_URL) :])
+        return response or self.get_response(request)
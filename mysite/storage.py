@@ -0,0 +1,44 @@
+"""Static files storage that also writes compressed copies of the hashed files.
+
+``collectstatic`` names every file after a hash of its content (see
+``ManifestStaticFilesStorage``) and then writes ``<name>.gz`` and, when the
+optional ``brotli`` package is installed, ``<name>.br`` next to each hashed
+text file, so ``mysite.static.StaticFilesMiddleware`` (or a web server with
+``gzip_static``/``brotli_static``) sends them without compressing per request.
+"""
+import gzip
+from pathlib import Path
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_SUFFIXES = {".css", ".js", ".json", ".map", ".svg", ".txt", ".html", ".xml"}
+
+
+def compressors():
+    yield ".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield ".br", lambda data: brotli.compress(data, quality=11)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, *args, **kwargs):
+        yield from super().post_process(*args, **kwargs)
+        if kwargs.get("dry_run"):
+            return
+        for name in set(self.hashed_files.values()):
+            if Path(name).suffix in COMPRESSIBLE_SUFFIXES:
+                self.compress(name)
+
+    def compress(self, name):
+        path = Path(self.path(name))
+        data = path.read_bytes()
+        for suffix, compress in compressors():
+            compressed = compress(data)
+            # Tiny files can grow; the original is served instead.
+            if len(compressed) < len(data):
+                path.with_name(path.name + suffix).write_bytes(compressed)
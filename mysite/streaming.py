@@ -0,0 +1,74 @@
+"""Streamed pages: the page around a long list is sent first, the list in chunks.
+
+``render_streamed`` renders a template with ``streamed_content`` standing in
+for the list, splits the result there and returns a ``StreamingHttpResponse``
+that sends the part before it, then the fragments, then the rest. The page
+around the list is rendered before the view returns, so the middleware still
+sets the CSRF cookie and saves the session and the messages shown on the page
+as for any other response; only the fragments are rendered while the response
+is sent. Once the first chunk is out an error can no longer become a 500 page.
+
+Django 4.1's ASGI handler iterates streamed content on the event loop, where
+the ORM may not be used, so ``can_stream`` is false for ASGI requests.
+
+Middleware that measures requests uses ``after_response`` to include the time
+and queries of the streamed body.
+"""
+from itertools import chain, islice
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+PLACEHOLDER = "<!-- streamed content -->"
+
+
+def can_stream(request):
+    return not isinstance(request, ASGIRequest)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def render_streamed(request, template_name, context, fragments):
+    """Stream ``template_name`` with the strings of ``fragments`` in place of ``{{ streamed_content }}``."""
+    page = render_to_string(template_name, {**context, "streamed_content": mark_safe(PLACEHOLDER)}, request)
+    head, tail = page.split(PLACEHOLDER)
+    return StreamingHttpResponse(chain([head], fragments, [tail]))
+
+
+class ClosingIterator:
+    """Iterate ``content`` and call ``callback`` once, after the last item or when closed early."""
+
+    def __init__(self, content, callback):
+        self.content = iter(content)
+        self.callback = callback
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.content)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.callback()
+
+
+def after_response(response, callback):
+    """Call ``callback()`` once ``response`` is sent: now, or after the body of a streamed response."""
+    if not response.streaming:
+        callback()
+        return
+    # The server closes the response, and so the iterator, if the client goes away early.
+    response.streaming_content = ClosingIterator(response.streaming_content, callback)
@@ -0,0 +1,51 @@
+"""Test runner that keeps the files written while tests run out of ``var/``.
+
+Each run gets a temporary directory. The settings in ``RUNTIME_PATHS`` point
+into it for the whole run, and so do the matching environment variables,
+which is where a spawned child process (see ``mysite.processes``) reads them
+from. ``setting_changed`` is sent for each of them, as ``override_settings``
+does, so that e.g. the slow query log handler follows. Tests that inspect
+these files still override them per test.
+"""
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.test.runner import DiscoverRunner
+
+# Setting -> name of the file or directory in the run's temporary directory.
+RUNTIME_PATHS = {
+    "METRICS_DIR": "metrics",
+    "SLOW_QUERY_LOG": "slow_queries.log",
+    "SNOWFLAKE_LOCK_DIR": "snowflake",
+}
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.runtime_dir = tempfile.mkdtemp(prefix="mysite-tests-")
+        paths = {setting: os.path.join(self.runtime_dir, name) for setting, name in RUNTIME_PATHS.items()}
+        # Assigned like setup_test_environment() does DEBUG: under override_settings(), SETTINGS_MODULE reads None.
+        self.saved_settings = {setting: getattr(settings, setting) for setting in paths}
+        self.saved_environ = {setting: os.environ.get(setting) for setting in paths}
+        for setting, path in paths.items():
+            self.change_setting(setting, path, enter=True)
+        os.environ.update(paths)
+
+    def teardown_test_environment(self, **kwargs):
+        for setting, value in self.saved_settings.items():
+            self.change_setting(setting, value, enter=False)
+        for setting, value in self.saved_environ.items():
+            if value is None:
+                os.environ.pop(setting, None)
+            else:
+                os.environ[setting] = value
+        shutil.rmtree(self.runtime_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
+
+    def change_setting(self, setting, value, enter):
+        setattr(settings, setting, value)
+        setting_changed.send(sender=self.__class__, setting=setting, value=value, enter=enter)
@@ -0,0 +1,880 @@
+import gzip
+import json
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.db.backends.sqlite3.base import DatabaseWrapper as StockDatabaseWrapper
+from django.http import HttpResponse
+from django.templatetags.static import static
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import get_resolver, reverse
+
+from mysite import metrics
+from mysite.admin import chunked_pks
+from mysite.backends.sqlite3.base import DatabaseWrapper as TunedDatabaseWrapper
+from mysite.bloom import BloomFilter, MembershipIndex, indexes
+from mysite.caching import expire, get_or_compute, lock_key
+from mysite.hyperloglog import HyperLogLog
+from mysite.loadtest import ZipfChooser, parse_mix, percentile
+from mysite.management.commands.sync_replicas import copy_database
+from mysite.middleware import PrimaryStickinessMiddleware
+from mysite.page_cache import invalidate_view, page_cache
+from mysite.pagination import EstimatedCountPaginator
+from mysite.processes import spawn_pool
+from mysite.profiling import SamplingProfiler, read_collapsed
+from mysite.routers import PrimaryReplicaRouter, pin_to_primary
+from mysite.slow_queries import fingerprint, record_slow_queries
+from mysite.warmup import warm_up
+from notifications.notify import buffer as notifications_buffer
+from tweets.impressions import buffer as impressions_buffer
+from tweets.models import Tweet
+
+
+def run_mixed_load(wrapper_class, path, threads=8, transactions=40):
+    """Run read-then-write transactions from several threads and count completed ones, lock errors and lock wait.
+
+    Another connection holds the write lock until every thread has read in its first transaction (or for at
+    most a second, if the threads cannot start one), so each first write contends with it.
+    """
+    settings_dict = {**connection.settings_dict, "NAME": str(path), "OPTIONS": {}, "TEST": {}}
+    setup = wrapper_class(settings_dict)
+    with setup.cursor() as cursor:
+        cursor.execute("CREATE TABLE IF NOT EXISTS counter (id INTEGER PRIMARY KEY, value INTEGER)")
+    setup.close()
+
+    holder = sqlite3.connect(path, isolation_level=None)
+    holder.execute("BEGIN IMMEDIATE")
+    holder.execute("INSERT INTO counter (value) VALUES (0)")
+    read = threading.Semaphore(0)
+    completed = []
+    errors = []
+    lock_wait = []
+
+    def worker():
+        db = wrapper_class(settings_dict)
+        done = 0
+        for i in range(transactions):
+            try:
+                db.ensure_connection()
+                db._start_transaction_under_autocommit()
+                with db.cursor() as cursor:
+                    cursor.execute("SELECT COUNT(*) FROM counter")
+                    if i == 0:
+                        read.release()
+                    if i % 2 == 0:
+                        cursor.execute("INSERT INTO counter (value) VALUES (%s)", [i])
+                    cursor.execute("COMMIT")
+                done += 1
+            except OperationalError as e:
+                errors.append(str(e))
+                if db.connection.in_transaction:
+                    db.connection.execute("ROLLBACK")
+        completed.append(done)
+        lock_wait.append(getattr(db, "lock_wait", 0.0))
+        db.close()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    deadline = time.monotonic() + 1
+    for _ in range(threads):
+        if not read.acquire(timeout=max(deadline - time.monotonic(), 0)):
+            break
+    holder.execute("COMMIT")
+    holder.close()
+    for t in workers:
+        t.join()
+    return sum(completed), errors, sum(lock_wait)
+
+
+def record_writes(count, barrier=None):
+    for _ in range(count):
+        metrics.writes.inc(kind="tweet")
+    if barrier is not None:
+        # Keep the thread alive until every thread has written, so none reuses another's ident.
+        barrier.wait()
+
+
+class TestTunedSQLiteBackend(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def test_pragmas_applied(self):
+        settings_dict = {**connection.settings_dict, "NAME": str(Path(self.tmpdir.name) / "db.sqlite3"), "TEST": {}}
+        settings_dict["OPTIONS"] = {"pragmas": {"busy_timeout": 1234}}
+        db = TunedDatabaseWrapper(settings_dict)
+        with db.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], "wal")
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 1234)
+        db.close()
+
+    def test_failure_with_invalid_transaction_mode(self):
+        settings_dict = {**connection.settings_dict, "OPTIONS": {"transaction_mode": "NOPE"}}
+        with self.assertRaises(ValueError):
+            TunedDatabaseWrapper(settings_dict)
+
+    def test_mixed_load_without_lock_errors(self):
+        tuned_done, tuned_errors, tuned_wait = run_mixed_load(
+            TunedDatabaseWrapper, Path(self.tmpdir.name) / "tuned.sqlite3"
+        )
+        stock_done, stock_errors, _ = run_mixed_load(StockDatabaseWrapper, Path(self.tmpdir.name) / "stock.sqlite3")
+        # BEGIN IMMEDIATE waits for the held lock, so every transaction completes.
+        self.assertEqual(tuned_errors, [])
+        self.assertEqual(tuned_done, 8 * 40)
+        self.assertGreater(tuned_wait, 0)
+        # A deferred transaction that has read cannot wait for the lock it needs to write: at least every
+        # thread's first transaction fails.
+        self.assertGreaterEqual(len(stock_errors), 8)
+        self.assertEqual(set(stock_errors), {"database is locked"})
+        self.assertEqual(stock_done, 8 * 40 - len(stock_errors))
+        self.assertLess(stock_done, tuned_done)
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class TestPrimaryReplicaRouter(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(self.router.db_for_read(Tweet), "replica")
+        self.assertIsNone(self.router.db_for_read(Session))
+
+    def test_writes_go_to_primary(self):
+        self.assertEqual(self.router.db_for_write(Tweet), "default")
+
+    def test_pinned_reads_go_to_primary(self):
+        with pin_to_primary():
+            self.assertEqual(self.router.db_for_read(Tweet), "default")
+        self.assertEqual(self.router.db_for_read(Tweet), "replica")
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        self.assertEqual(self.router.db_for_read(Tweet), "default")
+
+    def test_no_migrations_on_replica(self):
+        self.assertFalse(self.router.allow_migrate("replica", "tweets"))
+        self.assertIsNone(self.router.allow_migrate("default", "tweets"))
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class TestPrimaryStickinessMiddleware(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.read_from = []
+
+        def view(request):
+            self.read_from.append(PrimaryReplicaRouter().db_for_read(Tweet))
+            return HttpResponse()
+
+        self.middleware = PrimaryStickinessMiddleware(view)
+
+    def test_write_pins_and_sets_cookie(self):
+        response = self.middleware(self.factory.post("/tweets/1/like/"))
+        self.assertEqual(self.read_from, ["default"])
+        self.assertIn(PrimaryStickinessMiddleware.cookie_name, response.cookies)
+
+    def test_reads_stick_to_primary_after_write(self):
+        request = self.factory.get("/tweets/home/")
+        request.COOKIES[PrimaryStickinessMiddleware.cookie_name] = "1"
+        self.middleware(request)
+        self.middleware(self.factory.get("/tweets/home/"))
+        self.assertEqual(self.read_from, ["default", "replica"])
+
+
+class TestSyncReplicas(SimpleTestCase):
+    def test_replica_lags_until_next_copy(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            primary_path, replica_path = Path(tmpdir) / "primary.sqlite3", Path(tmpdir) / "replica.sqlite3"
+            primary = sqlite3.connect(primary_path)
+            primary.execute("CREATE TABLE t (id INTEGER PRIMARY KEY)")
+            primary.execute("INSERT INTO t VALUES (1)")
+            primary.commit()
+            copy_database(primary_path, replica_path)
+
+            primary.execute("INSERT INTO t VALUES (2)")
+            primary.commit()
+            replica = sqlite3.connect(replica_path)
+            self.assertEqual(replica.execute("SELECT COUNT(*) FROM t").fetchone()[0], 1)
+
+            copy_database(primary_path, replica_path)
+            self.assertEqual(replica.execute("SELECT COUNT(*) FROM t").fetchone()[0], 2)
+            replica.close()
+            primary.close()
+
+
+class TestBloomFilter(SimpleTestCase):
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.01)
+        bloom.update(range(1000))
+        self.assertTrue(all(i in bloom for i in range(1000)))
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(1000, 0.01)
+        bloom.update(range(1000))
+        false_positives = sum(i in bloom for i in range(1000, 11000))
+        self.assertLess(false_positives / 10000, 0.03)
+        self.assertFalse(bloom.is_full)
+        bloom.add(1000)
+        self.assertTrue(bloom.is_full)
+
+
+class TestMembershipIndex(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.members = {1: {10, 20}}
+        self.loads = []
+        self.confirms = []
+
+        def load(owner_id):
+            self.loads.append(owner_id)
+            return set(self.members.get(owner_id, ()))
+
+        def confirm(owner_id, items):
+            self.confirms.append(list(items))
+            return self.members.get(owner_id, set()) & set(items)
+
+        self.index = MembershipIndex("test", load, confirm)
+        self.addCleanup(indexes.pop, "test")
+
+    def test_negatives_without_confirmation(self):
+        self.assertEqual(self.index.filter(1, [10, 30, 40]), {10})
+        self.assertTrue(all(30 not in items and 40 not in items for items in self.confirms))
+        self.assertEqual(self.index.stats.lookups, 3)
+        self.assertEqual(self.index.stats.confirmed, 1)
+        self.assertEqual(self.loads, [1])
+        self.index.filter(1, [30])
+        self.assertEqual(self.loads, [1])
+
+    def test_add_keeps_local_filter(self):
+        self.index.filter(1, [10])
+        self.members[1].add(30)
+        self.index._added(1, 30)
+        self.assertTrue(self.index.contains(1, 30))
+        self.assertEqual(self.loads, [1])
+
+    def test_rebuild_after_other_process_adds(self):
+        self.index.filter(1, [10])
+        self.members[1].add(30)
+        cache.incr(self.index._version_key(1))
+        self.assertTrue(self.index.contains(1, 30))
+        self.assertEqual(self.loads, [1, 1])
+
+    def test_add_after_version_evicted(self):
+        self.index.filter(1, [10])
+        cache.delete(self.index._version_key(1))
+        self.members[1].add(30)
+        self.index._added(1, 30)
+        self.assertTrue(self.index.contains(1, 30))
+        self.assertEqual(self.loads, [1, 1])
+
+    def test_stats(self):
+        self.index.filter(1, range(100, 200))
+        stats = self.index.stats.as_dict()
+        self.assertEqual(stats["lookups"], 100)
+        self.assertEqual(stats["negatives"] + stats["false_positives"], 100)
+        self.assertGreater(stats["hit_rate"], 0.9)
+
+
+class TestMembershipStatsView(TestCase):
+    def test_staff_only(self):
+        user = get_user_model().objects.create_user(username="test", password="password1")
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse("membership_stats")).status_code, 403)
+        user.is_staff = True
+        user.save()
+        response = self.client.get(reverse("membership_stats"))
+        self.assertEqual(set(response.json()), {"likes", "following"})
+
+
+class TestEstimatedCountPaginator(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(username="test", password="password1")
+        Tweet.objects.bulk_create(Tweet(user=user, content=f"tweet {i}") for i in range(30))
+
+    def test_exact_below_limit(self):
+        paginator = EstimatedCountPaginator(Tweet.objects.order_by("pk"), 10)
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, 30)
+        self.assertEqual(paginator.num_pages, 3)
+
+    @mock.patch.object(EstimatedCountPaginator, "exact_limit", 10)
+    def test_estimate_above_limit(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+            cursor.execute("UPDATE sqlite_stat1 SET stat = '5000 1' WHERE tbl = 'tweets_tweet'")
+        self.assertEqual(EstimatedCountPaginator(Tweet.objects.order_by("pk"), 10).count, 5000)
+        # Filtered results are capped instead of estimated.
+        self.assertEqual(
+            EstimatedCountPaginator(Tweet.objects.filter(content__startswith="tweet").order_by("pk"), 10).count, 10
+        )
+
+    def test_chunked_pks(self):
+        chunks = list(chunked_pks(Tweet.objects.all(), 7))
+        self.assertEqual([len(chunk) for chunk in chunks], [7, 7, 7, 7, 2])
+        self.assertEqual(sum(chunks, []), sorted(Tweet.objects.values_list("pk", flat=True)))
+
+
+class TestLoadTestHelpers(SimpleTestCase):
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix("timeline=3,like"), {"timeline": 3.0, "like": 1.0})
+        with self.assertRaises(ValueError):
+            parse_mix("unknown=1")
+        with self.assertRaises(ValueError):
+            parse_mix("timeline=0")
+
+    def test_zipf_skew(self):
+        uniform, skewed = ZipfChooser(range(10), 0, random.Random(0)), ZipfChooser(range(10), 1.5, random.Random(0))
+        uniform = Counter(uniform.choice() for _ in range(10000))
+        skewed = Counter(skewed.choice() for _ in range(10000))
+        self.assertLess(max(uniform.values()) / min(uniform.values()), 1.5)
+        self.assertGreater(skewed[0], 10 * skewed[9])
+
+    def test_percentile(self):
+        values = list(range(100))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+
+class TestLoadTestCommand(TransactionTestCase):
+    def setUp(self):
+        # Buffered notifications and impressions would otherwise be flushed at exit, after the test database.
+        self.addCleanup(notifications_buffer.clear)
+        self.addCleanup(impressions_buffer.clear)
+
+    def run_loadtest(self, *args):
+        out = StringIO()
+        call_command(
+            "loadtest",
+            "--duration",
+            "0.5",
+            "--users",
+            "5",
+            "--tweets-per-user",
+            "1",
+            *args,
+            stdout=out,
+            stderr=StringIO(),
+        )
+        return out.getvalue()
+
+    def test_wsgi_threads(self):
+        output = self.run_loadtest("--concurrency", "2")
+        self.assertIn("total:", output)
+        self.assertIn("SQLite lock wait", output)
+        self.assertEqual(get_user_model().objects.filter(username__startswith="loadtest-").count(), 5)
+        self.assertGreaterEqual(Tweet.objects.count(), 5)
+
+    def test_asgi(self):
+        output = self.run_loadtest("--concurrency", "1", "--interface", "asgi", "--mix", "post=1")
+        self.assertIn("errors: 0 ", output)
+        self.assertGreater(Tweet.objects.filter(content__startswith="loadtest").count(), 0)
+
+
+class TestMetrics(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings_override = override_settings(METRICS_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(metrics.reset)
+        metrics.reset()
+
+    def test_threads_write_their_own_files(self):
+        barrier = threading.Barrier(4)
+        threads = [threading.Thread(target=record_writes, args=(100, barrier)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(list(Path(self.directory).glob("*.metrics"))), 4)
+        self.assertEqual(metrics.read_values()['app_writes_total{kind="tweet"}'], 400)
+
+    def test_processes_are_summed(self):
+        with mock.patch.dict("os.environ", METRICS_DIR=self.directory), spawn_pool(2) as pool:
+            list(pool.map(record_writes, [50, 70]))
+        self.assertEqual(metrics.read_values()['app_writes_total{kind="tweet"}'], 120)
+
+    def test_file_grows_and_reopens(self):
+        for i in range(3000):
+            metrics.cache_requests.inc(cache=f"cache{i}", result="hit")
+        path = next(Path(self.directory).glob("*.metrics"))
+        self.assertGreater(path.stat().st_size, metrics.INITIAL_SIZE)
+        reopened = metrics.MetricsFile(path)
+        self.assertEqual(len(reopened.offsets), 3000)
+        reopened.close()
+
+    def test_histogram_buckets_are_cumulative(self):
+        for value in [0.001, 0.02, 0.02, 20]:
+            metrics.request_duration.observe(value, view="tweets:home", method="GET")
+        lines = metrics.render().splitlines()
+        self.assertIn('http_request_duration_seconds_bucket{view="tweets:home",method="GET",le="0.005"} 1', lines)
+        self.assertIn('http_request_duration_seconds_bucket{view="tweets:home",method="GET",le="0.025"} 3', lines)
+        self.assertIn('http_request_duration_seconds_bucket{view="tweets:home",method="GET",le="+Inf"} 4', lines)
+        self.assertIn('http_request_duration_seconds_count{view="tweets:home",method="GET"} 4', lines)
+        self.assertIn("# TYPE http_request_duration_seconds histogram", lines)
+
+    def test_labels_must_match(self):
+        with self.assertRaises(ValueError):
+            metrics.writes.inc(view="tweets:home")
+
+
+class TestMetricsView(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(METRICS_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(metrics.reset)
+        metrics.reset()
+        cache.clear()
+
+    def test_requests_are_labeled_by_url_name(self):
+        user = get_user_model().objects.create_user(username="test", password="password1")
+        self.client.force_login(user)
+        self.client.get(reverse("tweets:home"))
+        self.client.post(reverse("tweets:create"), {"content": "hello"})
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('http_requests_total{view="tweets:home",method="GET",status="200"} 1', body)
+        self.assertIn('http_requests_total{view="tweets:create",method="POST",status="302"} 1', body)
+        self.assertIn('db_queries_total{view="tweets:home"}', body)
+        self.assertIn('app_writes_total{kind="tweet"} 1', body)
+        self.assertIn('cache_requests_total{cache="default",result="miss"}', body)
+
+    @override_settings(HOME_STREAMING=True)
+    def test_streamed_response_recorded_after_body(self):
+        user = get_user_model().objects.create_user(username="test", password="password1")
+        Tweet.objects.create(user=user, content="hello")
+        self.client.force_login(user)
+        response = self.client.get(reverse("tweets:home"))
+        self.assertNotIn('view="tweets:home"', self.client.get(reverse("metrics")).content.decode())
+        response.getvalue()
+        body = self.client.get(reverse("metrics")).content.decode()
+        self.assertIn('http_requests_total{view="tweets:home",method="GET",status="200"} 1', body)
+        self.assertIn('db_queries_total{view="tweets:home"}', body)
+
+    def test_other_addresses_are_refused(self):
+        response = self.client.get(reverse("metrics"), REMOTE_ADDR="10.0.0.1")
+        self.assertEqual(response.status_code, 403)
+
+
+def busy_wait(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class TestProfiling(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings_override = override_settings(PROFILING_DIR=self.directory, PROFILING_TOKEN="secret")
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        user = get_user_model().objects.create_user(username="test", password="password1")
+        self.client.force_login(user)
+
+    def profiles(self):
+        return sorted(path.relative_to(self.directory).parts[0] for path in self.directory.rglob("*.prof"))
+
+    def test_token_in_header_or_query(self):
+        self.client.get(reverse("tweets:home"), HTTP_X_PROFILE="secret")
+        self.client.get(reverse("accounts:user_profile", args=["test"]), {"profile": "secret"})
+        self.assertEqual(self.profiles(), ["accounts.user_profile", "tweets.home"])
+
+    def test_wrong_or_missing_token(self):
+        self.client.get(reverse("tweets:home"), HTTP_X_PROFILE="guess")
+        self.client.get(reverse("tweets:home"))
+        self.assertEqual(self.profiles(), [])
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_MODE="sampling")
+    def test_sampled_requests(self):
+        self.client.get(reverse("tweets:home"))
+        [path] = self.directory.rglob("*.collapsed")
+        self.assertEqual(path.parent.name, "tweets.home")
+
+    def test_profiles_command(self):
+        self.client.get(reverse("tweets:home"), HTTP_X_PROFILE="secret")
+        out = StringIO()
+        call_command("profiles", "--view", "tweets:home", "--limit", "5", stdout=out)
+        self.assertIn("cProfile: 1 requests", out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("profiles", "--view", "tweets:detail", stdout=StringIO())
+
+    def test_profiles_command_merges_stacks(self):
+        view = self.directory / "tweets.home"
+        view.mkdir()
+        (view / "1.collapsed").write_text("main;handle;render 3\nmain;handle;query 1\n")
+        (view / "2.collapsed").write_text("main;handle;render 1\n")
+        merged = self.directory / "merged.txt"
+        out = StringIO()
+        call_command("profiles", "--collapsed", str(merged), "--sort", "cumulative", stdout=out)
+        self.assertIn("Sampled: 2 requests, 5 samples", out.getvalue())
+        self.assertRegex(out.getvalue(), r"80\.0% +80\.0% +render")
+        self.assertRegex(out.getvalue(), r"0\.0% +100\.0% +handle")
+        self.assertEqual(read_collapsed(merged), Counter({"main;handle;render": 4, "main;handle;query": 1}))
+
+
+class TestSamplingProfiler(SimpleTestCase):
+    def test_samples_the_target_thread(self):
+        profiler = SamplingProfiler(0.001)
+        profiler.start()
+        busy_wait(0.1)
+        profiler.stop()
+        self.assertGreater(sum(profiler.stacks.values()), 10)
+        self.assertTrue(any("busy_wait" in stack.rsplit(";", 1)[-1] for stack in profiler.stacks))
+
+
+def use_temporary_slow_query_log(test):
+    """Send ``SLOW_QUERY_LOG`` to a file in a temporary directory for ``test`` and return its path."""
+    directory = tempfile.TemporaryDirectory()
+    test.addCleanup(directory.cleanup)
+    path = Path(directory.name) / "slow_queries.log"
+    settings_override = override_settings(SLOW_QUERY_LOG=path)
+    settings_override.enable()
+    # Runs before the directory is removed: moving the handler back closes the file.
+    test.addCleanup(settings_override.disable)
+    return path
+
+
+def read_slow_query_log(path):
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+class TestSlowQueryLog(TestCase):
+    def setUp(self):
+        self.log = use_temporary_slow_query_log(self)
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint("SELECT *  FROM t\n WHERE id IN (%s, %s, %s) AND name = 'x''y' LIMIT 21"),
+            "SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?",
+        )
+        self.assertEqual(
+            fingerprint('INSERT INTO "t" ("a", "b") VALUES (%s, %s), (%s, %s), (%s, %s)'),
+            'INSERT INTO "t" ("a", "b") VALUES (...)',
+        )
+
+    @override_settings(SLOW_QUERY_THRESHOLD=0)
+    def test_logs_view_and_location(self):
+        user = get_user_model().objects.create_user(username="test", password="password1")
+        self.client.force_login(user)
+        logged = len(read_slow_query_log(self.log))
+        self.assertGreater(logged, 0)
+        self.assertEqual({entry["view"] for entry in read_slow_query_log(self.log)}, {None})
+        self.client.get(reverse("tweets:home"))
+        entries = read_slow_query_log(self.log)[logged:]
+        tweet_queries = [entry for entry in entries if '"tweets_tweet"' in entry["fingerprint"]]
+        self.assertTrue(tweet_queries)
+        self.assertEqual({entry["view"] for entry in entries}, {"tweets:home"})
+        self.assertTrue(all(entry["location"].startswith("tweets/") for entry in tweet_queries))
+        self.assertEqual({entry["database"] for entry in entries}, {"default"})
+        self.assertNotIn("%s", "".join(entry["fingerprint"] for entry in entries))
+
+    @override_settings(SLOW_QUERY_THRESHOLD=0, HOME_STREAMING=True)
+    def test_streamed_body_keeps_the_view(self):
+        user = get_user_model().objects.create_user(username="test", password="password1")
+        Tweet.objects.create(user=user, content="hello")
+        self.client.force_login(user)
+        logged = len(read_slow_query_log(self.log))
+        self.client.get(reverse("tweets:home")).getvalue()
+        entries = read_slow_query_log(self.log)[logged:]
+        tweet_queries = [entry for entry in entries if '"tweets_tweet"' in entry["fingerprint"]]
+        self.assertTrue(tweet_queries)
+        self.assertEqual({entry["view"] for entry in entries}, {"tweets:home"})
+        self.assertTrue(all(entry["location"].startswith("tweets/views.py") for entry in tweet_queries))
+
+    def test_fast_queries_are_not_logged(self):
+        get_user_model().objects.count()
+        self.assertEqual(read_slow_query_log(self.log), [])
+
+
+class TestSlowQueryLogOnNewConnection(TransactionTestCase):
+    def setUp(self):
+        self.log = use_temporary_slow_query_log(self)
+
+    @override_settings(SLOW_QUERY_THRESHOLD=0)
+    def test_requests_after_the_connection_is_created(self):
+        user = get_user_model().objects.create_user(username="test", password="password1")
+        self.client.force_login(user)
+        # The in-memory test database can't be reopened, so the next connect() gets the same one back.
+        sqlite_connection = connection.connection
+        connection.connection = None
+        connection.execute_wrappers.remove(record_slow_queries)
+        # The first request creates the connection inside MetricsMiddleware's execute wrapper.
+        with mock.patch.object(connection, "get_new_connection", return_value=sqlite_connection):
+            self.client.get(reverse("tweets:home"))
+        for _ in range(2):
+            logged = len(read_slow_query_log(self.log))
+            self.client.get(reverse("tweets:home"))
+            entries = read_slow_query_log(self.log)[logged:]
+            self.assertTrue(entries)
+            self.assertEqual({entry["view"] for entry in entries}, {"tweets:home"})
+        self.assertEqual(connection.execute_wrappers, [record_slow_queries])
+
+
+class TestSlowQueriesCommand(SimpleTestCase):
+    def write_log(self, path, entries):
+        with open(path, "w") as f:
+            for sql, duration, view in entries:
+                entry = {
+                    "fingerprint": sql,
+                    "duration": duration,
+                    "view": view,
+                    "location": "tweets/views.py:1 in get",
+                }
+                f.write(json.dumps(entry) + "\n")
+
+    def test_ranks_fingerprints_across_rotated_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            log = Path(directory) / "slow.log"
+            self.write_log(log, [("SELECT a", 0.5, "tweets:home"), ("SELECT b", 0.2, "tweets:home")])
+            self.write_log(f"{log}.1", [("SELECT b", 0.2, "tweets:home"), ("SELECT b", 0.2, "accounts:user_profile")])
+            out = StringIO()
+            call_command("slow_queries", "--log", str(log), stdout=out)
+            self.assertIn("4 slow queries", out.getvalue())
+            self.assertLess(out.getvalue().index("SELECT b"), out.getvalue().index("SELECT a"))
+
+            out = StringIO()
+            call_command("slow_queries", "--log", str(log), "--sort", "p95", "--view", "tweets:home", stdout=out)
+            self.assertIn("3 slow queries", out.getvalue())
+            self.assertLess(out.getvalue().index("SELECT a"), out.getvalue().index("SELECT b"))
+
+    def test_missing_log(self):
+        with self.assertRaises(CommandError):
+            call_command("slow_queries", "--log", "/nonexistent/slow.log")
+
+
+class TestWarmUp(TestCase):
+    def test_steps(self):
+        timings = warm_up()
+        self.assertEqual(list(timings), ["templates", "url resolvers", "translations", "model caches", "databases"])
+        self.assertGreaterEqual(timings["templates"][1], 17)
+        self.assertIsNotNone(connection.connection)
+        self.assertTrue(get_resolver()._populated)
+
+
+class TestStartupReport(SimpleTestCase):
+    def test_report(self):
+        out = StringIO()
+        call_command("startup_report", "--no-warm-up", "--limit", "3", stdout=out)
+        self.assertIn("load application", out.getvalue())
+        self.assertIn("django", out.getvalue())
+        self.assertNotIn("warm up", out.getvalue())
+        with self.assertRaisesMessage(CommandError, "Startup took"):
+            call_command("startup_report", "--no-warm-up", "--max-seconds", "0", stdout=StringIO())
+
+
+class TestHyperLogLog(SimpleTestCase):
+    def test_estimates(self):
+        for count in [0, 10, 1000, 20000]:
+            sketch = HyperLogLog()
+            sketch.update(range(count))
+            sketch.update(range(count // 2))
+            self.assertAlmostEqual(len(sketch), count, delta=max(1, count * 0.06))
+
+    def test_merge(self):
+        first, second = HyperLogLog(), HyperLogLog()
+        first.update(range(0, 3000))
+        second.update(range(2000, 5000))
+        first.merge(second)
+        self.assertAlmostEqual(len(first), 5000, delta=300)
+        with self.assertRaises(ValueError):
+            first.merge(HyperLogLog(precision=12))
+
+    def test_serialization(self):
+        sketch = HyperLogLog()
+        sketch.update(range(10))
+        data = sketch.to_bytes()
+        self.assertLessEqual(len(data), 2 + 3 * 10)
+        self.assertEqual(HyperLogLog.from_bytes(data).registers, sketch.registers)
+
+        sketch.update(range(10000))
+        data = sketch.to_bytes()
+        self.assertEqual(len(data), 2 + 1024)
+        self.assertEqual(HyperLogLog.from_bytes(data).registers, sketch.registers)
+        self.assertEqual(len(HyperLogLog.from_bytes(b"")), 0)
+
+
+class TestGetOrCompute(SimpleTestCase):
+    key = "tests:caching"
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+        results = []
+        barrier = threading.Barrier(8)
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.05)
+            return "value"
+
+        def read():
+            barrier.wait()
+            results.append(get_or_compute(self.key, compute, 60))
+
+        threads = [threading.Thread(target=read) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["value"] * 8)
+
+    def test_stale_value_served_while_one_worker_refreshes(self):
+        get_or_compute(self.key, lambda: "old", 60)
+        expire([self.key], 60)
+        refreshing, release = threading.Event(), threading.Event()
+        refreshed = []
+
+        def compute():
+            refreshing.set()
+            release.wait(5)
+            return "new"
+
+        refresher = threading.Thread(target=lambda: refreshed.append(get_or_compute(self.key, compute, 60)))
+        refresher.start()
+        self.assertTrue(refreshing.wait(5))
+        for _ in range(3):
+            self.assertEqual(get_or_compute(self.key, self.fail, 60), "old")
+        release.set()
+        refresher.join()
+        self.assertEqual(refreshed, ["new"])
+        self.assertEqual(get_or_compute(self.key, self.fail, 60), "new")
+
+    def test_early_refresh(self):
+        # Expires in a second and took 10 seconds to compute.
+        cache.set(self.key, ("old", time.time() + 1, 10), 60)
+        with mock.patch("mysite.caching.random.random", return_value=0.0):
+            self.assertEqual(get_or_compute(self.key, self.fail, 60), "old")
+        with mock.patch("mysite.caching.random.random", return_value=0.5):
+            self.assertEqual(get_or_compute(self.key, lambda: "new", 60), "new")
+
+    def test_lock_released_when_compute_fails(self):
+        with self.assertRaises(ValueError):
+            get_or_compute(self.key, self.fail, 60)
+        self.assertIsNone(cache.get(lock_key(self.key)))
+        self.assertEqual(get_or_compute(self.key, lambda: "value", 60), "value")
+
+    def test_compute_after_lock_timeout(self):
+        cache.add(lock_key(self.key), 1, 60)
+        self.assertEqual(get_or_compute(self.key, lambda: "value", 60, lock_timeout=0.05), "value")
+
+    @staticmethod
+    def fail():
+        raise ValueError("not expected to compute")
+
+
+class TestAnonymousPageCache(TestCase):
+    def setUp(self):
+        page_cache().clear()
+        self.addCleanup(page_cache().clear)
+
+    def test_second_hit_served_from_cache(self):
+        first = self.client.get(reverse("welcome:index"))
+        self.assertTemplateUsed(first, "welcome/index.html")
+        self.assertFalse(first.cookies)
+        self.assertEqual(first["Cache-Control"], "public, max-age=300")
+        self.assertIn("Cookie", first["Vary"])
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse("welcome:index"))
+        self.assertEqual(second.templates, [])
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second["Cache-Control"], "public, max-age=300")
+
+    def test_logged_in_users_get_their_own_page(self):
+        self.client.get(reverse("welcome:index"))
+        user = get_user_model().objects.create_user(username="test", password="password1")
+        self.client.force_login(user)
+        response = self.client.get(reverse("welcome:index"))
+        self.assertContains(response, "ログアウト")
+        self.assertEqual(response["Cache-Control"], "private")
+
+    def test_not_cached(self):
+        for url in [reverse("welcome:index") + "?utm_source=x", reverse("accounts:login")]:
+            with self.subTest(url=url):
+                self.client.get(url)
+                response = self.client.get(url)
+                self.assertTrue(response.templates)
+                self.assertNotIn("public", response.get("Cache-Control", ""))
+
+    def test_invalidate(self):
+        self.client.get(reverse("welcome:index"))
+        invalidate_view("welcome:index")
+        self.assertTrue(self.client.get(reverse("welcome:index")).templates)
+        self.assertFalse(self.client.get(reverse("welcome:index")).templates)
+        call_command("invalidate_pages", "/", stdout=StringIO())
+        self.assertTrue(self.client.get(reverse("welcome:index")).templates)
+        with self.assertRaises(CommandError):
+            call_command("invalidate_pages", "welcome:missing", stdout=StringIO())
+
+
+class TestStaticFiles(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(
+            STATIC_ROOT=directory.name, STATICFILES_STORAGE="mysite.storage.CompressedManifestStaticFilesStorage"
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        call_command("collectstatic", interactive=False, verbosity=0, ignore_patterns=["admin"])
+        self.source = (Path(__file__).resolve().parent.parent / "static" / "js" / "like.js").read_bytes()
+
+    def test_hashed_name_served_compressed_and_immutable(self):
+        url = static("js/like.js")
+        self.assertRegex(url, r"^/static/js/like\.[0-9a-f]{12}\.js$")
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Content-Type"], "text/javascript")
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(gzip.decompress(response.getvalue()), self.source)
+
+        response = self.client.get(url)
+        self.assertNotIn("Content-Encoding", response)
+        self.assertEqual(response.getvalue(), self.source)
+
+    def test_unhashed_and_missing_files(self):
+        response = self.client.get("/static/js/like.js")
+        self.assertEqual(response["Cache-Control"], "public, max-age=3600")
+        response.close()
+        self.assertEqual(self.client.get("/static/js/missing.js").status_code, 404)
+        self.assertEqual(self.client.get("/static/../mysite/settings.py").status_code, 404)
+
+    def test_pages_link_the_script(self):
+        user = get_user_model().objects.create_user(username="test", password="password1")
+        self.client.force_login(user)
+        response = self.client.get(reverse("tweets:home"))
+        self.assertContains(response, f'<script src="{static("js/like.js")}" defer></script>', html=False)
+        self.assertNotContains(response, "X-CSRFToken")
+        self.assertNotContains(self.client.get(reverse("accounts:login")), "like.js")
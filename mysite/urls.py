@@ -17,10 +17,15 @@ from django.conf import settings
 from django.contrib import admin
 from django.urls import include, path
 
+from . import views
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("accounts/", include("accounts.urls")),
     path("tweets/", include("tweets.urls")),
+    path("notifications/", include("notifications.urls")),
+    path("stats/membership/", views.MembershipStatsView.as_view(), name="membership_stats"),
+    path("metrics", views.MetricsView.as_view(), name="metrics"),
     path("", include("welcome.urls")),
 ]
 
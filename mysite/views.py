@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse, JsonResponse
+from django.views.generic import View
+
+from . import metrics
+from .bloom import indexes
+
+
+class MembershipStatsView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """Hit and false positive rates of this process's membership filters."""
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse({name: index.stats.as_dict() for name, index in sorted(indexes.items())})
+
+
+class MetricsView(View):
+    """Metrics of all worker processes for Prometheus, served to ``METRICS_ALLOWED_IPS`` only."""
+
+    def get(self, request, *args, **kwargs):
+        if request.META.get("REMOTE_ADDR") not in settings.METRICS_ALLOWED_IPS:
+            raise PermissionDenied
+        return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
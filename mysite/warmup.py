@@ -0,0 +1,76 @@
+"""Do the one-off work of a fresh worker before it accepts requests.
+
+Without it the first requests a worker serves after a deploy compile their
+templates, populate the URL resolvers, load translation catalogs, build the
+models' relation caches and connect to the databases, which shows up as tail
+latency. ``mysite/wsgi.py`` and ``mysite/asgi.py`` call ``warm_up`` when
+``settings.WARMUP_ON_STARTUP`` is set.
+
+Database connections are per thread: the connections opened here serve the
+thread that loads the application, i.e. the whole worker for sync WSGI
+workers but not ASGI's sync thread pool, which still connects on first use.
+"""
+import time
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from django.template import engines
+from django.urls import get_resolver
+from django.utils import translation
+
+
+def compile_templates():
+    """Load every template under the project template directories into the cached loader."""
+    count = 0
+    for engine in engines.all():
+        for directory in engine.dirs:
+            for path in Path(directory).rglob("*.html"):
+                engine.get_template(path.relative_to(directory).as_posix())
+                count += 1
+    return count
+
+
+def populate_url_resolvers():
+    resolver = get_resolver()
+    # Accessing the reverse dictionary populates the resolver and every included one.
+    return len(resolver.reverse_dict)
+
+
+def load_translations():
+    translation.activate(settings.LANGUAGE_CODE)
+    translation.gettext("")
+    return settings.LANGUAGE_CODE
+
+
+def build_model_caches():
+    models = apps.get_models()
+    for model in models:
+        model._meta.get_fields()
+    return len(models)
+
+
+def connect_databases():
+    for alias in connections:
+        connections[alias].ensure_connection()
+    return len(connections.settings)
+
+
+STEPS = [
+    ("templates", compile_templates),
+    ("url resolvers", populate_url_resolvers),
+    ("translations", load_translations),
+    ("model caches", build_model_caches),
+    ("databases", connect_databases),
+]
+
+
+def warm_up():
+    """Run every step and return ``{step: (seconds, result)}``."""
+    timings = {}
+    for name, step in STEPS:
+        start = time.perf_counter()
+        result = step()
+        timings[name] = (time.perf_counter() - start, result)
+    return timings
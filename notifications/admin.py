@@ -0,0 +1,12 @@
+from django.contrib import admin
+
+from mysite.admin import ScalableModelAdmin
+
+from .models import Notification
+
+
+@admin.register(Notification)
+class NotificationAdmin(ScalableModelAdmin):
+    list_display = ("id", "recipient", "verb", "target_id", "actor_count", "updated_at", "read_at")
+    list_select_related = ("recipient",)
+    raw_id_fields = ("recipient", "last_actor")
@@ -0,0 +1,7 @@
+from .notify import unread_count
+
+
+def unread_notifications(request):
+    if not request.user.is_authenticated:
+        return {}
+    return {"unread_notification_count": unread_count(request.user.pk)}
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Notification(models.Model):
+    """Every unread like, follow or mention of the same target, aggregated into one row.
+
+    ``target_id`` is the liked or mentioning tweet (tweets may live on another
+    shard, so it is not a foreign key) and 0 for follows. Once the row is read,
+    new activity on the same target starts a new row.
+    """
+
+    class Verb(models.TextChoices):
+        LIKE = "like", "いいね"
+        FOLLOW = "follow", "フォロー"
+        MENTION = "mention", "メンション"
+
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="notifications")
+    verb = models.CharField(max_length=16, choices=Verb.choices)
+    target_id = models.BigIntegerField(default=0)
+    last_actor = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, on_delete=models.SET_NULL, related_name="+")
+    actor_count = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(default=timezone.now)
+    read_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["recipient", "-updated_at"], name="notification_recipient_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["recipient", "verb", "target_id"], condition=Q(read_at=None), name="unique_unread_notification"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.recipient} {self.verb} {self.target_id} ({self.actor_count})"
+
+    @property
+    def other_count(self):
+        return self.actor_count - 1
+
+
+class NotificationActor(models.Model):
+    """One actor of an aggregated notification, so an actor who comes back is only counted once."""
+
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name="actors")
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["notification", "actor"], name="unique_notification_actor"),
+        ]
@@ -0,0 +1,128 @@
+"""Creating, aggregating and counting notifications.
+
+``notify`` only appends to an in-process buffer (see ``mysite.buffering``);
+buffered events are written in batches by ``write_notifications``, which folds
+every event for the same recipient, verb and target into one row. The unread
+count shown on every page is kept in the cache and adjusted by the writer.
+Follows and mentions are queued as jobs instead (see ``notifications.tasks``).
+"""
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from mysite.buffering import WriteBuffer
+
+from .models import Notification, NotificationActor
+
+# Usernames may contain letters, digits and @.+-_; a trailing "." ends the sentence, not the name.
+MENTION_PATTERN = re.compile(r"(?<![\w@])@([\w.+-]+)")
+MAX_MENTIONS = 10
+# A write that loses a race for a new row is retried as an update of the winner's row.
+WRITE_ATTEMPTS = 3
+
+
+def unread_cache_key(user_id):
+    return f"notifications:unread:{user_id}"
+
+
+def write_notifications(batch):
+    """Write ``{(recipient_id, verb, target_id): [actor_id, ...]}`` with one UPDATE and two INSERTs."""
+    for attempt in range(WRITE_ATTEMPTS):
+        try:
+            created = _write_notifications(batch)
+            break
+        except IntegrityError:
+            # Another process created one of the rows first; the next attempt finds and updates it.
+            if attempt == WRITE_ATTEMPTS - 1:
+                raise
+
+    for recipient_id, count in Counter(n.recipient_id for n in created).items():
+        try:
+            cache.incr(unread_cache_key(recipient_id), count)
+        except ValueError:
+            # Not cached; the next read counts from the database.
+            pass
+
+
+def _write_notifications(batch):
+    now = timezone.now()
+    with transaction.atomic():
+        unread = Notification.objects.select_for_update().filter(
+            read_at=None,
+            recipient_id__in={recipient_id for recipient_id, _, _ in batch},
+            target_id__in={target_id for _, _, target_id in batch},
+        )
+        existing = {(n.recipient_id, n.verb, n.target_id): n for n in unread}
+        rows, changed, created = {}, [], []
+        for key, actor_ids in batch.items():
+            notification = existing.get(key)
+            if notification is None:
+                recipient_id, verb, target_id = key
+                notification = Notification(recipient_id=recipient_id, verb=verb, target_id=target_id, actor_count=0)
+                created.append(notification)
+            else:
+                changed.append(notification)
+            notification.last_actor_id = actor_ids[-1]
+            notification.updated_at = now
+            rows[key] = notification
+
+        # Actors already counted on the rows being updated, e.g. someone who liked, unliked and liked again.
+        counted = set()
+        if changed:
+            counted = set(
+                NotificationActor.objects.filter(
+                    notification__in=changed, actor_id__in={actor_id for ids in batch.values() for actor_id in ids}
+                ).values_list("notification_id", "actor_id")
+            )
+        actors = []
+        for key, actor_ids in batch.items():
+            notification = rows[key]
+            for actor_id in dict.fromkeys(actor_ids):
+                if (notification.pk, actor_id) not in counted:
+                    notification.actor_count += 1
+                    actors.append(NotificationActor(notification=notification, actor_id=actor_id))
+
+        Notification.objects.bulk_update(changed, ["actor_count", "last_actor", "updated_at"])
+        Notification.objects.bulk_create(created)
+        NotificationActor.objects.bulk_create(actors)
+    return created
+
+
+buffer = WriteBuffer(write_notifications, "NOTIFICATIONS_BUFFER_SIZE", "NOTIFICATIONS_FLUSH_INTERVAL")
+
+
+def notify(recipient_id, verb, actor_id, target_id=0):
+    if recipient_id == actor_id:
+        return
+    # Only buffer events whose transaction actually commits.
+    transaction.on_commit(lambda: buffer.add((recipient_id, verb, target_id), actor_id))
+
+
+def mentioned_usernames(content):
+    usernames = dict.fromkeys(name.rstrip(".") for name in MENTION_PATTERN.findall(content))
+    return [username for username in usernames if username][:MAX_MENTIONS]
+
+
+def unread_count(user_id):
+    key = unread_cache_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(recipient_id=user_id, read_at=None).count()
+        cache.set(key, count, settings.NOTIFICATIONS_UNREAD_CACHE_TIMEOUT)
+    return count
+
+
+def mark_read(user_id, notification_ids):
+    marked = Notification.objects.filter(recipient_id=user_id, pk__in=notification_ids, read_at=None).update(
+        read_at=timezone.now()
+    )
+    if marked:
+        try:
+            cache.decr(unread_cache_key(user_id), marked)
+        except ValueError:
+            # Not cached; the next read counts from the database.
+            pass
@@ -0,0 +1,19 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from tweets.models import Tweet
+
+from .models import Notification
+from .notify import unread_cache_key
+
+
+@receiver(post_delete, sender=Tweet)
+def delete_tweet_notifications(sender, instance, **kwargs):
+    notifications = Notification.objects.filter(
+        target_id=instance.pk, verb__in=[Notification.Verb.LIKE, Notification.Verb.MENTION]
+    )
+    recipient_ids = set(notifications.values_list("recipient_id", flat=True))
+    if recipient_ids:
+        notifications.delete()
+        cache.delete_many([unread_cache_key(recipient_id) for recipient_id in recipient_ids])
@@ -0,0 +1,29 @@
+"""Notifications written by ``runworker`` instead of the request.
+
+A worker has no request cycle to flush ``notify``'s buffer, so these tasks
+write their rows directly.
+"""
+from accounts.usernames import resolve_username
+from jobs.queue import task
+from tweets.models import Tweet
+from tweets.sharding import shard_for_id
+
+from .models import Notification
+from .notify import mentioned_usernames, write_notifications
+
+
+@task
+def deliver(verb, actor_id, recipient_ids, target_id=0):
+    batch = {(recipient_id, verb, target_id): [actor_id] for recipient_id in recipient_ids if recipient_id != actor_id}
+    if batch:
+        write_notifications(batch)
+
+
+@task
+def deliver_mentions(tweet_id):
+    tweet = Tweet.objects.using(shard_for_id(tweet_id)).filter(pk=tweet_id).only("user_id", "content").first()
+    if tweet is None:
+        # Deleted before a worker got to it.
+        return
+    users = (resolve_username(username) for username in mentioned_usernames(tweet.content))
+    deliver(Notification.Verb.MENTION, tweet.user_id, [user.pk for user in users if user is not None], tweet.pk)
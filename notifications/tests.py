@@ -0,0 +1,237 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from jobs.models import Job
+from jobs.queue import claim_jobs, run_job
+from mysite.buffering import WriteBuffer
+from notifications.models import Notification, NotificationActor
+from notifications.notify import buffer, mentioned_usernames, unread_count
+from notifications.views import NotificationListView
+from tweets.models import Tweet
+
+User = get_user_model()
+
+
+@override_settings(NOTIFICATIONS_BUFFER_SIZE=500, NOTIFICATIONS_FLUSH_INTERVAL=60)
+class NotificationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        buffer.clear()
+        self.user = User.objects.create_user(username="test", password="password1")
+        self.tweet = Tweet.objects.create(user=self.user, content="test")
+
+    def act(self, username, url, data=None):
+        """POST as ``username`` and buffer the notifications once the request's transaction commits."""
+        self.client.force_login(User.objects.get(username=username))
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(url, data)
+
+    def run_jobs(self):
+        for pk in claim_jobs("worker", limit=10):
+            run_job(pk, "worker")
+
+
+class TestNotify(NotificationTestCase):
+    def test_likes_are_aggregated(self):
+        for i in range(3):
+            User.objects.create_user(username=f"liker{i}", password="password1")
+            self.act(f"liker{i}", reverse("tweets:like", kwargs={"pk": self.tweet.pk}))
+        self.assertEqual(Notification.objects.count(), 0)
+
+        with self.assertNumQueries(5):
+            buffer.flush()
+        notification = Notification.objects.get()
+        self.assertEqual(notification.recipient, self.user)
+        self.assertEqual(notification.verb, Notification.Verb.LIKE)
+        self.assertEqual(notification.target_id, self.tweet.pk)
+        self.assertEqual(notification.actor_count, 3)
+        self.assertEqual(notification.last_actor.username, "liker2")
+
+        User.objects.create_user(username="liker3", password="password1")
+        self.act("liker3", reverse("tweets:like", kwargs={"pk": self.tweet.pk}))
+        buffer.flush()
+        notification.refresh_from_db()
+        self.assertEqual(notification.actor_count, 4)
+
+    def test_returning_actor_is_counted_once(self):
+        User.objects.create_user(username="liker", password="password1")
+        self.act("liker", reverse("tweets:like", kwargs={"pk": self.tweet.pk}))
+        buffer.flush()
+        self.act("liker", reverse("tweets:unlike", kwargs={"pk": self.tweet.pk}))
+        self.act("liker", reverse("tweets:like", kwargs={"pk": self.tweet.pk}))
+        buffer.flush()
+        self.assertEqual(Notification.objects.get().actor_count, 1)
+
+    def test_row_created_by_another_process_is_updated(self):
+        liker = User.objects.create_user(username="liker", password="password1")
+        User.objects.create_user(username="liker2", password="password1")
+        self.act("liker2", reverse("tweets:like", kwargs={"pk": self.tweet.pk}))
+        # Another process inserts the row after this one looked for it.
+        notification = Notification.objects.create(
+            recipient=self.user, verb=Notification.Verb.LIKE, target_id=self.tweet.pk, last_actor=liker
+        )
+        NotificationActor.objects.create(notification=notification, actor=liker)
+        select_for_update = Notification.objects.select_for_update
+        lookups = []
+
+        def racing_select_for_update():
+            lookups.append(1)
+            return Notification.objects.none() if len(lookups) == 1 else select_for_update()
+
+        with mock.patch.object(Notification.objects, "select_for_update", racing_select_for_update):
+            buffer.flush()
+        self.assertEqual(len(lookups), 2)
+        notification.refresh_from_db()
+        self.assertEqual(notification.actor_count, 2)
+        self.assertEqual(notification.last_actor.username, "liker2")
+
+    def test_own_like_is_not_notified(self):
+        self.act("test", reverse("tweets:like", kwargs={"pk": self.tweet.pk}))
+        self.assertEqual(len(buffer), 0)
+
+    def test_follow(self):
+        User.objects.create_user(username="follower", password="password1")
+        self.act("follower", reverse("accounts:follow", kwargs={"username": "test"}))
+        self.assertEqual(Job.objects.get().name, "notifications.tasks.deliver")
+        self.assertFalse(Notification.objects.exists())
+
+        self.run_jobs()
+        notification = Notification.objects.get()
+        self.assertEqual(notification.verb, Notification.Verb.FOLLOW)
+        self.assertEqual(notification.last_actor.username, "follower")
+
+    def test_mentions(self):
+        User.objects.create_user(username="mentioner", password="password1")
+        self.act("mentioner", reverse("tweets:create"), {"content": "hi @test and @unknown."})
+        tweet = Tweet.objects.get(content__startswith="hi")
+        self.assertEqual(Job.objects.get().payload, {"tweet_id": tweet.pk})
+        self.assertFalse(Notification.objects.exists())
+
+        self.run_jobs()
+        notification = Notification.objects.get()
+        self.assertEqual(notification.recipient, self.user)
+        self.assertEqual(notification.verb, Notification.Verb.MENTION)
+        self.assertEqual(notification.target_id, tweet.pk)
+
+    def test_reply_mentions(self):
+        User.objects.create_user(username="mentioner", password="password1")
+        self.act("mentioner", reverse("tweets:reply", kwargs={"pk": self.tweet.pk}), {"content": "@test hi"})
+        self.run_jobs()
+        self.assertEqual(Notification.objects.get().verb, Notification.Verb.MENTION)
+
+    def test_tweet_without_mentions_queues_nothing(self):
+        self.act("test", reverse("tweets:create"), {"content": "hello"})
+        self.assertFalse(Job.objects.exists())
+
+    def test_mention_of_deleted_tweet(self):
+        User.objects.create_user(username="mentioner", password="password1")
+        self.act("mentioner", reverse("tweets:create"), {"content": "hi @test"})
+        Tweet.objects.get(content="hi @test").delete()
+        self.run_jobs()
+        self.assertEqual(Job.objects.get().status, Job.Status.DONE)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_mentioned_usernames(self):
+        self.assertEqual(mentioned_usernames("@a, @b.c and @a. mail@example.com"), ["a", "b.c"])
+
+    def test_deleted_tweet_removes_notifications(self):
+        User.objects.create_user(username="liker", password="password1")
+        self.act("liker", reverse("tweets:like", kwargs={"pk": self.tweet.pk}))
+        buffer.flush()
+        self.tweet.delete()
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(unread_count(self.user.pk), 0)
+
+
+class TestUnreadCount(NotificationTestCase):
+    def setUp(self):
+        super().setUp()
+        User.objects.create_user(username="follower", password="password1")
+        self.act("follower", reverse("accounts:follow", kwargs={"username": "test"}))
+        self.run_jobs()
+
+    def test_cached(self):
+        self.assertEqual(unread_count(self.user.pk), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_count(self.user.pk), 1)
+
+    def test_incremented_on_flush(self):
+        self.assertEqual(unread_count(self.user.pk), 1)
+        User.objects.create_user(username="liker", password="password1")
+        self.act("liker", reverse("tweets:like", kwargs={"pk": self.tweet.pk}))
+        buffer.flush()
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_count(self.user.pk), 2)
+
+    def test_shown_in_base(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("tweets:home"))
+        self.assertEqual(response.context["unread_notification_count"], 1)
+        self.assertContains(response, "通知 (1)")
+
+
+class TestNotificationListView(NotificationTestCase):
+    def setUp(self):
+        super().setUp()
+        User.objects.create_user(username="liker", password="password1")
+        self.act("liker", reverse("tweets:like", kwargs={"pk": self.tweet.pk}))
+        buffer.flush()
+        self.client.force_login(self.user)
+
+    def test_success_get(self):
+        response = self.client.get(reverse("notifications:list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "notifications/list.html")
+        self.assertContains(response, "いいねしました")
+        self.assertEqual(unread_count(self.user.pk), 0)
+        self.assertIsNotNone(Notification.objects.get().read_at)
+
+    def test_only_the_shown_page_is_marked_read(self):
+        for i in range(3):
+            tweet = Tweet.objects.create(user=self.user, content=f"tweet {i}")
+            self.act("liker", reverse("tweets:like", kwargs={"pk": tweet.pk}))
+        buffer.flush()
+        self.client.force_login(self.user)
+        self.assertEqual(unread_count(self.user.pk), 4)
+        with mock.patch.object(NotificationListView, "paginate_by", 3):
+            response = self.client.get(reverse("notifications:list"))
+        self.assertEqual(len(response.context["notification_list"]), 3)
+        self.assertEqual(unread_count(self.user.pk), 1)
+        self.assertEqual(Notification.objects.filter(read_at=None).count(), 1)
+
+    def test_new_activity_after_read_starts_new_row(self):
+        self.client.get(reverse("notifications:list"))
+        User.objects.create_user(username="liker2", password="password1")
+        self.act("liker2", reverse("tweets:like", kwargs={"pk": self.tweet.pk}))
+        buffer.flush()
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(unread_count(self.user.pk), 1)
+
+    def test_failure_get_without_login(self):
+        self.client.logout()
+        response = self.client.get(reverse("notifications:list"))
+        self.assertEqual(response.status_code, 302)
+
+
+class TestWriteBuffer(SimpleTestCase):
+    def setUp(self):
+        self.batches = []
+        self.buffer = WriteBuffer(self.batches.append, "NOTIFICATIONS_BUFFER_SIZE", "NOTIFICATIONS_FLUSH_INTERVAL")
+
+    @override_settings(NOTIFICATIONS_BUFFER_SIZE=2, NOTIFICATIONS_FLUSH_INTERVAL=60)
+    def test_flush_when_full(self):
+        self.buffer.add("a", 1)
+        self.buffer.add("a", 2)
+        self.assertEqual(self.batches, [])
+        self.buffer.add("b", 3)
+        self.assertEqual(self.batches, [{"a": [1, 2], "b": [3]}])
+        self.assertEqual(len(self.buffer), 0)
+
+    @override_settings(NOTIFICATIONS_BUFFER_SIZE=500, NOTIFICATIONS_FLUSH_INTERVAL=0)
+    def test_flush_when_due(self):
+        self.buffer.add("a", 1)
+        self.assertEqual(self.batches, [{"a": [1]}])
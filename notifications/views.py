@@ -0,0 +1,25 @@
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.views.generic import ListView
+
+from .models import Notification
+from .notify import mark_read
+
+
+class NotificationListView(LoginRequiredMixin, ListView):
+    template_name = "notifications/list.html"
+    context_object_name = "notification_list"
+    paginate_by = 50
+
+    def get_queryset(self):
+        return (
+            Notification.objects.filter(recipient=self.request.user)
+            .select_related("last_actor")
+            .order_by("-updated_at", "-id")
+        )
+
+    def get(self, request, *args, **kwargs):
+        response = super().get(request, *args, **kwargs)
+        # The rows are already loaded for rendering; mark the ones on this page read afterwards.
+        response.render()
+        mark_read(request.user.pk, [n.pk for n in response.context_data["notification_list"] if n.read_at is None])
+        return response
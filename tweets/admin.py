@@ -1,8 +1,25 @@
 from django.contrib import admin
+from django.utils.text import Truncator
+
+from mysite.admin import ScalableModelAdmin
 
 from .models import Like, Tweet
 
-admin.site.register(Tweet)
-admin.site.register(Like)
 
-# Register your models here.
+@admin.register(Tweet)
+class TweetAdmin(ScalableModelAdmin):
+    list_display = ("id", "user", "short_content", "created_at", "reply_count")
+    list_select_related = ("user",)
+    list_filter = ("created_at",)
+    raw_id_fields = ("user", "parent")
+
+    @admin.display(description="内容")
+    def short_content(self, obj):
+        return Truncator(obj.content).chars(50)
+
+
+@admin.register(Like)
+class LikeAdmin(ScalableModelAdmin):
+    list_display = ("id", "user", "tweet", "created_at")
+    list_select_related = ("user", "tweet")
+    raw_id_fields = ("user", "tweet")
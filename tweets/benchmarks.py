@@ -0,0 +1,151 @@
+import random
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import FriendShip
+from mysite.benchmarks import scenario, timed
+from mysite.loadtest import request_host
+
+from .models import Like, Tweet
+from .ranking import (
+    Candidates,
+    candidate_authors,
+    feature_matrix,
+    fetch_candidates,
+    rank_for_you,
+    score_in_python,
+    viewer_likes,
+    weights,
+)
+from .threads import get_descendants
+
+User = get_user_model()
+
+
+def load_recursively(tweet):
+    """The per-level alternative: one query for the replies of every tweet in the thread."""
+    replies = list(Tweet.objects.select_related("user").filter(parent=tweet))
+    descendants = list(replies)
+    for reply in replies:
+        descendants.extend(load_recursively(reply))
+    return descendants
+
+
+@scenario("threads")
+def threads(depth=100, width=2000, repeat=5):
+    """Load a deep and a wide conversation by path range vs. recursive per-level queries."""
+    user = User.objects.create(username="benchmark-threads")
+
+    deep_root = parent = Tweet(user=user, content="deep")
+    deep_root.save()
+    for i in range(depth):
+        parent = Tweet(user=user, content=f"reply {i}", parent=parent)
+        parent.save()
+
+    wide_root = Tweet(user=user, content="wide")
+    wide_root.save()
+    for i in range(width):
+        reply = Tweet(user=user, content=f"reply {i}", parent=wide_root)
+        reply.save()
+        if i % 10 == 0:
+            Tweet(user=user, content=f"nested {i}", parent=reply).save()
+
+    return [
+        (f"deep ({depth} levels): path range", timed(lambda: get_descendants(deep_root), repeat)),
+        (f"deep ({depth} levels): recursive", timed(lambda: load_recursively(deep_root), repeat)),
+        ("deep: first 5 levels", timed(lambda: get_descendants(deep_root, max_depth=5), repeat)),
+        (f"wide ({width} replies): path range", timed(lambda: get_descendants(wide_root), repeat)),
+        (f"wide ({width} replies): recursive", timed(lambda: load_recursively(wide_root), repeat)),
+    ]
+
+
+@scenario("for_you")
+def for_you(candidates=10000, followed=200, second_degree=50, likes=20000, repeat=5):
+    """Rank a "for you" feed over ``candidates`` tweets: NumPy feature matrix vs. a per-tweet Python loop."""
+    viewer = User.objects.create(username="benchmark-viewer")
+    authors = User.objects.bulk_create(User(username=f"benchmark-author-{i}") for i in range(followed + second_degree))
+    FriendShip.objects.bulk_follow(viewer, authors[:followed])
+    for author in authors[:followed:10]:
+        FriendShip.objects.bulk_follow(author, authors[followed:])
+
+    now = timezone.now()
+    tweets = Tweet.objects.bulk_create(
+        Tweet(user=random.choice(authors), content=f"tweet {i}", path="") for i in range(candidates)
+    )
+    for tweet in tweets:
+        tweet.created_at = now - timedelta(minutes=random.uniform(0, 70 * 60))
+    Tweet.objects.bulk_update(tweets, ["created_at"], batch_size=500)
+    pairs = {(random.choice(authors), random.choice(tweets)) for _ in range(likes)}
+    pairs |= {(viewer, random.choice(tweets)) for _ in range(200)}
+    Like.objects.bulk_create((Like(user=user, tweet=tweet) for user, tweet in pairs), batch_size=500)
+
+    followed_ids, second_degree_ids = candidate_authors(viewer.pk)
+    author_ids = followed_ids | second_degree_ids
+    since = now - timedelta(hours=72)
+    rows = fetch_candidates(author_ids, since, candidates)
+    liked = viewer_likes(viewer.pk, now - timedelta(days=30))
+    ts = now.timestamp()
+    arrays = Candidates.from_rows(rows)
+
+    def without_likes():
+        return list(
+            Tweet.objects.filter(user_id__in=author_ids, created_at__gte=since)
+            .order_by("-created_at", "-id")
+            .values_list("id", "user_id", "created_at", "reply_count")[:candidates]
+        )
+
+    with override_settings(RANKING_BUDGET_MS=10**6):
+        assert not rank_for_you(viewer.pk).fallback
+        return [
+            (f"fetch {len(rows)} candidates", timed(lambda: fetch_candidates(author_ids, since, candidates), repeat)),
+            ("fetch without like counts", timed(without_likes, repeat)),
+            ("rows to arrays", timed(lambda: Candidates.from_rows(rows), repeat)),
+            ("score: numpy", timed(lambda: feature_matrix(arrays, ts, followed_ids, liked) @ weights(), repeat)),
+            ("score: python loop", timed(lambda: score_in_python(rows, ts, followed_ids, liked), repeat)),
+            ("rank_for_you (end to end)", timed(lambda: rank_for_you(viewer.pk), repeat)),
+        ]
+
+
+def fetch_page(client, url):
+    """``(seconds to the first chunk, seconds to the last chunk)`` of a GET of ``url``."""
+    start = time.perf_counter()
+    response = client.get(url)
+    chunks = iter(response.streaming_content if response.streaming else [response.content])
+    next(chunks)
+    first = time.perf_counter() - start
+    for _ in chunks:
+        pass
+    return first, time.perf_counter() - start
+
+
+@scenario("home_ttfb")
+def home_ttfb(tweets=5000, chunk_size=50, repeat=5):
+    """Time to first byte, total time and peak memory of the home timeline, rendered whole vs. streamed."""
+    user = User.objects.create(username="benchmark-home")
+    Tweet.objects.bulk_create(Tweet(user=user, content=f"tweet {i}", path="") for i in range(tweets))
+    client = Client(HTTP_HOST=request_host())
+    client.force_login(user)
+    url = reverse("tweets:home")
+
+    def measure(streaming):
+        with override_settings(HOME_STREAMING=streaming, HOME_STREAMING_CHUNK_SIZE=chunk_size):
+            first, total = min(fetch_page(client, url) for _ in range(repeat))
+            tracemalloc.start()
+            try:
+                fetch_page(client, url)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        return {"ttfb_ms": round(first * 1000, 2), "total_ms": round(total * 1000, 2), "peak_kib": peak // 1024}
+
+    return [
+        (f"home ({tweets} tweets): rendered whole", measure(False)),
+        (f"home ({tweets} tweets): streamed", measure(True)),
+    ]
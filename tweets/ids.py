@@ -0,0 +1,135 @@
+"""Snowflake-style 64-bit ids for sharded rows.
+
+Layout (most significant bit first)::
+
+    0 | 41 bits milliseconds since EPOCH_MS | 7 bits shard | 7 bits worker | 8 bits sequence
+
+Ids sort by creation time, are unique across workers without coordination and
+carry the index of the shard the row lives on, so a row can be located from its
+id alone. Ids below ``1 << TIMESTAMP_SHIFT`` predate sharding and live on shard 0.
+
+Each process needs its own worker id. Unless ``SNOWFLAKE_WORKER_ID`` pins it,
+a process claims the first free one by locking ``worker-<n>.lock`` in
+``SNOWFLAKE_LOCK_DIR`` (a forked child claims another). The operating system
+drops the lock when the process exits, however it exits. Processes on other
+hosts cannot see these locks and must pin their ids.
+"""
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+EPOCH_MS = 1672531200000  # 2023-01-01T00:00:00Z
+
+SEQUENCE_BITS = 8
+WORKER_BITS = 7
+SHARD_BITS = 7
+
+WORKER_SHIFT = SEQUENCE_BITS
+SHARD_SHIFT = SEQUENCE_BITS + WORKER_BITS
+TIMESTAMP_SHIFT = SEQUENCE_BITS + WORKER_BITS + SHARD_BITS
+
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+MAX_WORKER = (1 << WORKER_BITS) - 1
+MAX_SHARD = (1 << SHARD_BITS) - 1
+
+
+class Snowflake:
+    def __init__(self, worker_id):
+        if not 0 <= worker_id <= MAX_WORKER:
+            raise ValueError(f"worker_id must be between 0 and {MAX_WORKER}.")
+        self.worker_id = worker_id
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+
+    def next_id(self, shard=0):
+        with self._lock:
+            now = int(time.time() * 1000)
+            # Never go back in time if the clock is adjusted; keep counting on the last millisecond.
+            now = max(now, self._last_ms)
+            if now == self._last_ms:
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    while now <= self._last_ms:
+                        now = int(time.time() * 1000)
+            else:
+                self._sequence = 0
+            self._last_ms = now
+            sequence = self._sequence
+        return (now - EPOCH_MS) << TIMESTAMP_SHIFT | self.worker_id << WORKER_SHIFT | sequence | shard << SHARD_SHIFT
+
+
+_generator = None
+_generator_lock = threading.Lock()
+# Lock files of claimed worker ids, open for the life of the process.
+_claimed = []
+
+
+def _lock(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+
+
+def claim_worker_id():
+    directory = Path(settings.SNOWFLAKE_LOCK_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    for candidate in range(MAX_WORKER + 1):
+        fd = os.open(directory / f"worker-{candidate}.lock", os.O_RDWR | os.O_CREAT)
+        try:
+            _lock(fd)
+        except OSError:
+            # Held by another process.
+            os.close(fd)
+            continue
+        _claimed.append(fd)
+        return candidate
+    raise ImproperlyConfigured(
+        f"All {MAX_WORKER + 1} Snowflake worker ids in {directory} are taken; set SNOWFLAKE_WORKER_ID per process."
+    )
+
+
+def worker_id():
+    if settings.SNOWFLAKE_WORKER_ID is not None:
+        return settings.SNOWFLAKE_WORKER_ID
+    return claim_worker_id()
+
+
+def get_generator():
+    global _generator
+    generator = _generator
+    # A forked worker must not keep generating with its parent's worker id and sequence.
+    if generator is None or generator.pid != os.getpid():
+        with _generator_lock:
+            if _generator is None or _generator.pid != os.getpid():
+                _generator = Snowflake(worker_id())
+            generator = _generator
+    return generator
+
+
+def next_id():
+    return get_generator().next_id()
+
+
+def with_shard(id, shard):
+    if not 0 <= shard <= MAX_SHARD:
+        raise ValueError(f"shard must be between 0 and {MAX_SHARD}.")
+    return id & ~(MAX_SHARD << SHARD_SHIFT) | shard << SHARD_SHIFT
+
+
+def shard_of(id):
+    if id < 1 << TIMESTAMP_SHIFT:
+        return 0
+    return id >> SHARD_SHIFT & MAX_SHARD
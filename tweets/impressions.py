@@ -0,0 +1,74 @@
+"""Tweet view counts, timeline impressions and approximate unique viewers.
+
+Opening a tweet's detail page counts a view and adds the user to the tweet's
+viewers; showing a tweet on a timeline counts an impression. Both only append
+to an in-process buffer (see ``mysite.buffering``), which ``write_impressions``
+turns into a few ``UPDATE ... SET view_count = view_count + n`` statements:
+tweets with the same increments share one statement. New viewers are merged
+into each tweet's HyperLogLog sketch, so sketches written by different
+workers add up to the distinct viewers of all of them.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+from mysite.buffering import WriteBuffer
+from mysite.hyperloglog import HyperLogLog
+
+from .models import Tweet
+from .sharding import shard_for_id
+
+VIEW = "view"
+IMPRESSION = "impression"
+
+
+def write_impressions(batch):
+    """Write ``{tweet_id: [(VIEW, user_id) | (IMPRESSION, None), ...]}``."""
+    by_shard = defaultdict(dict)
+    for tweet_id, events in batch.items():
+        by_shard[shard_for_id(tweet_id)][tweet_id] = events
+    for alias, events_by_tweet in by_shard.items():
+        with transaction.atomic(using=alias):
+            write_counts(alias, events_by_tweet)
+            write_viewers(alias, events_by_tweet)
+
+
+def write_counts(alias, events_by_tweet):
+    tweets_by_increment = defaultdict(list)
+    for tweet_id, events in events_by_tweet.items():
+        views = sum(1 for kind, _ in events if kind == VIEW)
+        tweets_by_increment[views, len(events) - views].append(tweet_id)
+    for (views, impressions), tweet_ids in tweets_by_increment.items():
+        Tweet.objects.using(alias).filter(pk__in=tweet_ids).update(
+            view_count=F("view_count") + views, impression_count=F("impression_count") + impressions
+        )
+
+
+def write_viewers(alias, events_by_tweet):
+    viewers = {}
+    for tweet_id, events in events_by_tweet.items():
+        user_ids = {user_id for kind, user_id in events if kind == VIEW}
+        if user_ids:
+            viewers[tweet_id] = user_ids
+    if not viewers:
+        return
+    tweets = list(Tweet.objects.using(alias).select_for_update().filter(pk__in=viewers).only("viewers"))
+    for tweet in tweets:
+        sketch = HyperLogLog.from_bytes(tweet.viewers)
+        sketch.update(viewers[tweet.pk])
+        tweet.viewers = sketch.to_bytes()
+    Tweet.objects.using(alias).bulk_update(tweets, ["viewers"])
+
+
+buffer = WriteBuffer(write_impressions, "IMPRESSIONS_BUFFER_SIZE", "IMPRESSIONS_FLUSH_INTERVAL")
+
+
+def record_view(tweet, user_id):
+    # Like notifications, only count requests whose transaction (if any) commits.
+    transaction.on_commit(lambda: buffer.add(tweet.pk, (VIEW, user_id)))
+
+
+def record_impressions(tweets):
+    pairs = [(tweet.pk, (IMPRESSION, None)) for tweet in tweets]
+    transaction.on_commit(lambda: buffer.extend(pairs))
@@ -0,0 +1,33 @@
+"""Which tweets a user has liked, answered through a Bloom filter (see ``mysite.bloom``)."""
+
+from collections import defaultdict
+
+from mysite.bloom import MembershipIndex
+
+from .models import Like
+from .sharding import on_all_shards, shard_for_id
+
+
+def _liked_tweet_ids(user_id):
+    return on_all_shards(Like.objects.filter(user_id=user_id).values_list("tweet_id", flat=True))
+
+
+def _confirm_liked(user_id, tweet_ids):
+    # A like lives on the shard of its tweet, so each candidate is looked up on one shard only.
+    by_shard = defaultdict(list)
+    for tweet_id in tweet_ids:
+        by_shard[shard_for_id(tweet_id)].append(tweet_id)
+    liked = set()
+    for alias, ids in by_shard.items():
+        liked.update(
+            Like.objects.using(alias).filter(user_id=user_id, tweet_id__in=ids).values_list("tweet_id", flat=True)
+        )
+    return liked
+
+
+liked_index = MembershipIndex("likes", _liked_tweet_ids, _confirm_liked)
+
+
+def liked_tweet_ids(user_id, tweets):
+    """The ids of ``tweets`` that ``user_id`` has liked."""
+    return liked_index.filter(user_id, [tweet.pk for tweet in tweets])
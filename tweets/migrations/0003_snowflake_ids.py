@@ -0,0 +1,48 @@
+# Generated by Django 4.1.13 on 2026-10-18 23:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import tweets.ids
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("tweets", "0002_like_like_like_unique"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="like",
+            name="id",
+            field=models.BigIntegerField(
+                default=tweets.ids.next_id, editable=False, primary_key=True, serialize=False
+            ),
+        ),
+        migrations.AlterField(
+            model_name="like",
+            name="user",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="likes",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="tweet",
+            name="id",
+            field=models.BigIntegerField(
+                default=tweets.ids.next_id, editable=False, primary_key=True, serialize=False
+            ),
+        ),
+        migrations.AlterField(
+            model_name="tweet",
+            name="user",
+            field=models.ForeignKey(
+                db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.1.13 on 2026-10-18 23:30
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tweets", "0003_snowflake_ids"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="like",
+            name="created_at",
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name="like",
+            index=models.Index(fields=["tweet", "created_at", "id"], name="like_tweet_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="like",
+            index=models.Index(fields=["user", "created_at", "id"], name="like_user_created_idx"),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.1.13 on 2026-10-18 23:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 500
+
+
+def set_root_paths(apps, schema_editor):
+    Tweet = apps.get_model("tweets", "Tweet")
+    tweets = Tweet.objects.using(schema_editor.connection.alias)
+    batch = []
+    for pk in tweets.values_list("pk", flat=True).iterator(chunk_size=BATCH_SIZE):
+        batch.append(Tweet(pk=pk, path=f"{pk:016x}"))
+        if len(batch) == BATCH_SIZE:
+            tweets.bulk_update(batch, ["path"])
+            batch = []
+    tweets.bulk_update(batch, ["path"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tweets", "0004_like_created_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tweet",
+            name="depth",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="tweet",
+            name="parent",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="replies",
+                to="tweets.tweet",
+            ),
+        ),
+        migrations.AddField(
+            model_name="tweet",
+            name="path",
+            field=models.CharField(default="", editable=False, max_length=1616),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="tweet",
+            name="reply_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(set_root_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="tweet",
+            index=models.Index(fields=["path"], name="tweet_path_idx"),
+        ),
+    ]
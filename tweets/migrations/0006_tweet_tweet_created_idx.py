@@ -0,0 +1,17 @@
+# Generated by Django 4.1.13 on 2026-10-18 23:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tweets", "0005_tweet_replies"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="tweet",
+            index=models.Index(fields=["created_at", "id"], name="tweet_created_idx"),
+        ),
+    ]
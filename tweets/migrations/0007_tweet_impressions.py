@@ -0,0 +1,28 @@
+# Generated by Django 4.1.13 on 2026-10-19 00:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tweets", "0006_tweet_tweet_created_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tweet",
+            name="impression_count",
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="tweet",
+            name="view_count",
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="tweet",
+            name="viewers",
+            field=models.BinaryField(default=b""),
+        ),
+    ]
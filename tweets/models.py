@@ -1,24 +1,123 @@
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import F
+
+from mysite.hyperloglog import HyperLogLog
+
+from . import ids
+from .sharding import shard_for_id, shard_index_for_user
+
+# Each level of a reply's materialized path is its id as fixed-width hex, so sorting
+# by path lists a conversation depth-first and a subtree is one index range.
+PATH_SEGMENT_LENGTH = 16
+MAX_REPLY_DEPTH = 100
+
+# Only ever changed with F() expressions (replies, tweets/impressions.py), never by saving a loaded tweet.
+COUNTER_FIELDS = ("reply_count", "view_count", "impression_count", "viewers")
+
+
+def path_segment(id):
+    return f"{id:0{PATH_SEGMENT_LENGTH}x}"
 
 
 class Tweet(models.Model):
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    id = models.BigIntegerField(primary_key=True, default=ids.next_id, editable=False)
+    # Users stay on the default database while tweets may live on another shard.
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_constraint=False)
     content = models.TextField(max_length=200)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Replies can live on another shard than the tweet they answer.
+    parent = models.ForeignKey(
+        "self", null=True, blank=True, related_name="replies", on_delete=models.SET_NULL, db_constraint=False
+    )
+    path = models.CharField(max_length=PATH_SEGMENT_LENGTH * (MAX_REPLY_DEPTH + 1), editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    reply_count = models.PositiveIntegerField(default=0, editable=False)
+    # Counted in memory and added in batches (see tweets/impressions.py).
+    view_count = models.PositiveBigIntegerField(default=0, editable=False)
+    impression_count = models.PositiveBigIntegerField(default=0, editable=False)
+    # HyperLogLog sketch of the users who opened the tweet (see mysite/hyperloglog.py).
+    viewers = models.BinaryField(default=b"", editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="tweet_created_idx"),
+            models.Index(fields=["path"], name="tweet_path_idx"),
+        ]
 
     def __str__(self):
         return self.content
 
+    @property
+    def unique_viewers(self):
+        return len(HyperLogLog.from_bytes(self.viewers))
+
+    @property
+    def ancestor_ids(self):
+        return [
+            int(self.path[i : i + PATH_SEGMENT_LENGTH], 16)
+            for i in range(0, len(self.path) - PATH_SEGMENT_LENGTH, PATH_SEGMENT_LENGTH)
+        ]
+
+    def get_parent(self):
+        """Return the parent tweet, loading it from its own shard if it is not cached."""
+        if self.parent_id is None or Tweet.parent.is_cached(self):
+            return self.parent
+        self.parent = Tweet.objects.using(shard_for_id(self.parent_id)).get(pk=self.parent_id)
+        return self.parent
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if adding:
+            self.pk = ids.with_shard(self.pk, shard_index_for_user(self.user_id))
+            kwargs["using"] = shard_for_id(self.pk) or kwargs.get("using")
+            parent = self.get_parent()
+            if parent is None:
+                self.path, self.depth = path_segment(self.pk), 0
+            elif parent.depth >= MAX_REPLY_DEPTH:
+                raise ValidationError("This conversation is too deep to reply to.")
+            else:
+                self.path, self.depth = parent.path + path_segment(self.pk), parent.depth + 1
+        elif not args and kwargs.get("update_fields") is None:
+            # Writing back the loaded counters would undo the increments made since.
+            deferred = self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in COUNTER_FIELDS and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+        if adding and self.parent_id is not None:
+            Tweet.objects.using(shard_for_id(self.parent_id)).filter(pk=self.parent_id).update(
+                reply_count=F("reply_count") + 1
+            )
+
 
 class Like(models.Model):
+    id = models.BigIntegerField(primary_key=True, default=ids.next_id, editable=False)
     tweet = models.ForeignKey(Tweet, related_name="likes", on_delete=models.CASCADE)
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name="likes", on_delete=models.CASCADE)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, related_name="likes", on_delete=models.CASCADE, db_constraint=False
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=["tweet", "user"], name="like_unique"),
         ]
+        indexes = [
+            # The id tie-breaker keeps cursor pagination on (created_at, id) inside the index.
+            models.Index(fields=["tweet", "created_at", "id"], name="like_tweet_created_idx"),
+            models.Index(fields=["user", "created_at", "id"], name="like_user_created_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            # Likes live next to the tweet they belong to.
+            self.pk = ids.with_shard(self.pk, ids.shard_of(self.tweet_id))
+            kwargs["using"] = shard_for_id(self.pk) or kwargs.get("using")
+        super().save(*args, **kwargs)
 
 
 # from django.db import models
@@ -0,0 +1,37 @@
+from django.conf import settings
+
+from .sharding import shard_for_id
+
+SHARDED_MODELS = {"tweets.tweet", "tweets.like"}
+
+
+class TweetShardRouter:
+    """Send tweets and likes to the shard encoded in their id.
+
+    Querysets have no instance to look at, so code that reads sharded models
+    passes the alias explicitly with ``.using()`` (see ``tweets.sharding``).
+    """
+
+    def _shard_for_instance(self, model, instance):
+        if model._meta.label_lower not in SHARDED_MODELS or instance is None:
+            return None
+        if instance._meta.label_lower not in SHARDED_MODELS or instance.pk is None:
+            return None
+        return shard_for_id(instance.pk)
+
+    def db_for_read(self, model, **hints):
+        return self._shard_for_instance(model, hints.get("instance"))
+
+    def db_for_write(self, model, **hints):
+        return self._shard_for_instance(model, hints.get("instance"))
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Tweets and likes may point at users on the default database.
+        if {obj1._meta.app_label, obj2._meta.app_label} <= {"accounts", "tweets"}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.TWEET_SHARDS[1:]:
+            return app_label == "tweets"
+        return None
@@ -0,0 +1,72 @@
+"""Helpers for tweets and likes sharded by author across ``settings.TWEET_SHARDS``.
+
+A tweet lives on the shard of its author and a like on the shard of the tweet,
+so a tweet's likes never cross shards. Users stay on the default database.
+
+With a single shard every helper returns ``None`` for the alias, which leaves
+database selection to the other routers (e.g. primary/replica routing).
+"""
+import heapq
+from itertools import chain, islice
+from operator import attrgetter
+
+from django.conf import settings
+
+from . import ids
+
+
+def is_sharded():
+    return len(settings.TWEET_SHARDS) > 1
+
+
+def shard_index_for_user(user_id):
+    return user_id % len(settings.TWEET_SHARDS)
+
+
+def shard_for_user(user_id):
+    if not is_sharded():
+        return None
+    return settings.TWEET_SHARDS[shard_index_for_user(user_id)]
+
+
+def shard_for_id(id):
+    if not is_sharded():
+        return None
+    return settings.TWEET_SHARDS[ids.shard_of(id)]
+
+
+def join_users(queryset):
+    """Attach ``user`` to each row; the users table can only be joined on the default database."""
+    if queryset.db in settings.TWEET_SHARDS[1:]:
+        return queryset.prefetch_related("user")
+    return queryset.select_related("user")
+
+
+def on_all_shards(queryset):
+    """Evaluate ``queryset`` on every shard, or return it untouched when not sharded."""
+    if not is_sharded():
+        return queryset
+    return list(chain.from_iterable(queryset.using(alias) for alias in settings.TWEET_SHARDS))
+
+
+def scatter(queryset, key, limit=None, reverse=True):
+    """Run an ordered ``queryset`` on every shard and merge the results by ``key``.
+
+    Each shard returns at most ``limit`` rows, so the merge costs
+    O(shards * limit) no matter how large the shards are.
+    """
+    results = []
+    for alias in settings.TWEET_SHARDS:
+        shard_queryset = queryset.using(alias)
+        if limit is not None:
+            shard_queryset = shard_queryset[:limit]
+        results.append(list(shard_queryset))
+    return list(islice(heapq.merge(*results, key=key, reverse=reverse), limit))
+
+
+def newest_first(queryset, limit=None):
+    """Rows of ``queryset`` ordered by ``(-created_at, -id)``, gathered from every shard if sharded."""
+    queryset = queryset.order_by("-created_at", "-id")
+    if not is_sharded():
+        return list(queryset[:limit])
+    return scatter(queryset, key=attrgetter("created_at", "id"), limit=limit)
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from mysite import metrics
+
+from .likes import liked_index
+from .models import Like, Tweet
+from .sharding import shard_for_id
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def delete_sharded_rows(sender, instance, using, **kwargs):
+    """Cascade a user's deletion to the shards the deletion collector cannot see."""
+    for alias in settings.TWEET_SHARDS:
+        if alias != using:
+            Like.objects.using(alias).filter(user_id=instance.pk).delete()
+            Tweet.objects.using(alias).filter(user_id=instance.pk).delete()
+
+
+@receiver(post_delete, sender=Tweet)
+def decrement_reply_count(sender, instance, **kwargs):
+    if instance.parent_id is not None:
+        Tweet.objects.using(shard_for_id(instance.parent_id)).filter(pk=instance.parent_id, reply_count__gt=0).update(
+            reply_count=F("reply_count") - 1
+        )
+
+
+@receiver(post_save, sender=Tweet)
+def record_tweet(sender, instance, created, **kwargs):
+    if created:
+        metrics.writes.inc(kind="tweet")
+
+
+@receiver(post_save, sender=Like)
+def record_like(sender, instance, created, using, **kwargs):
+    if created:
+        liked_index.add(instance.user_id, instance.tweet_id, using=using)
+        metrics.writes.inc(kind="like")
@@ -1,8 +1,29 @@
+import os
+import tempfile
+import threading
+from unittest import mock, skipUnless
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from tweets.models import Like, Tweet
+from accounts.blocking import block
+from accounts.models import FriendShip
+from mysite.processes import spawn_pool
+from tweets import ids, views
+from tweets.ids import Snowflake
+from tweets.impressions import buffer as impressions_buffer
+from tweets.likes import liked_index, liked_tweet_ids
+from tweets.models import Like, Tweet, path_segment
+from tweets.ranking import rank_for_you
+from tweets.routers import TweetShardRouter
+from tweets.sharding import shard_for_user
+from tweets.threads import get_ancestors, get_descendants
 
 User = get_user_model()
 
@@ -24,6 +45,56 @@ class TestHomeView(TestCase):
         self.assertEqual(tweets.first().created_at, Tweet.objects.first().created_at)
 
 
+@override_settings(HOME_STREAMING=True, HOME_STREAMING_CHUNK_SIZE=2)
+class TestStreamingHomeView(TestCase):
+    def setUp(self):
+        cache.clear()
+        liked_index.clear()
+        self.user = User.objects.create_user(username="test", password="password1")
+        self.other = User.objects.create_user(username="other", password="password1")
+        self.client.force_login(self.user)
+        self.tweets = [Tweet.objects.create(user=self.user, content=f"tweet {i}") for i in range(5)]
+        self.addCleanup(impressions_buffer.clear)
+
+    def test_page_sent_before_tweets(self):
+        response = self.client.get(reverse("tweets:home"))
+        self.assertTrue(response.streaming)
+        self.assertIn(settings.CSRF_COOKIE_NAME, response.cookies)
+        chunks = [chunk.decode() for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 1 + 3 + 1)
+        self.assertIn("Homeです", chunks[0])
+        self.assertIn("csrfmiddlewaretoken", chunks[0])
+        self.assertNotIn("tweet 4", chunks[0])
+        self.assertIn("tweet 4", chunks[1])
+        self.assertIn("</html>", chunks[-1])
+        body = "".join(chunks)
+        positions = [body.index(f"内容 : tweet {i}") for i in reversed(range(5))]
+        self.assertEqual(positions, sorted(positions))
+
+    def test_matches_rendered_page(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(user=self.user, tweet=self.tweets[1])
+        streamed = self.client.get(reverse("tweets:home")).getvalue().decode()
+        with override_settings(HOME_STREAMING=False):
+            rendered = self.client.get(reverse("tweets:home")).content.decode()
+        self.assertEqual(streamed.count('data-is-liked="true"'), 1)
+
+        def timeline(page):
+            return "".join(page.split("<h1>")[1].split("<script>")[0].split())
+
+        self.assertEqual(timeline(streamed), timeline(rendered))
+
+    def test_hidden_users_and_impressions(self):
+        Tweet.objects.create(user=self.other, content="hidden tweet")
+        block(self.user, self.other)
+        with self.captureOnCommitCallbacks(execute=True):
+            body = self.client.get(reverse("tweets:home")).getvalue().decode()
+        self.assertNotIn("hidden tweet", body)
+        impressions_buffer.flush()
+        self.assertEqual(set(Tweet.objects.filter(user=self.user).values_list("impression_count", flat=True)), {1})
+        self.assertEqual(Tweet.objects.get(user=self.other).impression_count, 0)
+
+
 class TestTweetCreateView(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(username="test", password="password1")
@@ -133,6 +204,29 @@ class TestFavoriteView(TestCase):
         self.assertEqual(Like.objects.all().count(), 1)
 
 
+class TestLikedState(TestCase):
+    def setUp(self):
+        cache.clear()
+        liked_index.clear()
+        self.user = User.objects.create_user(username="test", password="password1")
+        self.client.login(username="test", password="password1")
+        self.tweets = [Tweet.objects.create(user=self.user, content=f"tweet {i}") for i in range(20)]
+
+    def test_unliked_tweets_without_query(self):
+        self.assertEqual(liked_tweet_ids(self.user.pk, self.tweets), set())
+        with self.assertNumQueries(0):
+            liked_tweet_ids(self.user.pk, self.tweets)
+
+    def test_liked_after_like(self):
+        self.assertEqual(liked_tweet_ids(self.user.pk, self.tweets), set())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("tweets:like", kwargs={"pk": self.tweets[0].pk}))
+        response = self.client.get(reverse("tweets:home"))
+        self.assertEqual(response.context["user_liked_list"], {self.tweets[0].pk})
+        self.assertContains(response, 'data-is-liked="true"', count=1)
+        self.assertEqual(liked_index.stats.builds, 1)
+
+
 class TestUnfavoriteView(TestCase):
     def setUp(self):
         self.user01 = User.objects.create_user(
@@ -159,3 +253,391 @@ class TestUnfavoriteView(TestCase):
         response = self.client.post(reverse("tweets:unlike", kwargs={"pk": self.tweet01.pk}))
         self.assertEqual(response.status_code, 200)
         self.assertFalse(Like.objects.filter(user=self.user01, tweet=self.tweet01).count(), 0)
+
+
+class TestLikerListView(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="test", password="password1")
+        self.client.login(username="test", password="password1")
+        self.tweet = Tweet.objects.create(user=self.user, content="test")
+        for i in range(3):
+            liker = User.objects.create_user(username=f"liker{i}", password="password1")
+            Like.objects.create(user=liker, tweet=self.tweet)
+        self.url = reverse("tweets:likers", kwargs={"pk": self.tweet.pk})
+
+    @mock.patch.object(views.LikerListView, "paginate_by", 2)
+    def test_success_get_pages(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "tweets/likers.html")
+        page = response.context["page"]
+        self.assertEqual([like.user.username for like in page.object_list], ["liker2", "liker1"])
+
+        response = self.client.get(self.url, {"cursor": page.next_cursor})
+        page = response.context["page"]
+        self.assertEqual([like.user.username for like in page.object_list], ["liker0"])
+        self.assertFalse(page.has_next)
+
+    def test_failure_get_with_invalid_cursor(self):
+        response = self.client.get(self.url, {"cursor": "invalid"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_failure_get_with_not_exist_tweet(self):
+        response = self.client.get(reverse("tweets:likers", kwargs={"pk": 1000}))
+        self.assertEqual(response.status_code, 404)
+
+
+class TestReplyView(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="test", password="password1")
+        self.client.login(username="test", password="password1")
+        self.tweet = Tweet.objects.create(user=self.user, content="root")
+
+    def test_success_post(self):
+        response = self.client.post(reverse("tweets:reply", kwargs={"pk": self.tweet.pk}), {"content": "reply"})
+        self.assertRedirects(response, reverse("tweets:detail", kwargs={"pk": self.tweet.pk}))
+        reply = Tweet.objects.get(content="reply")
+        self.assertEqual(reply.parent, self.tweet)
+        self.assertEqual(reply.depth, 1)
+        self.assertEqual(reply.path, self.tweet.path + path_segment(reply.pk))
+        self.tweet.refresh_from_db()
+        self.assertEqual(self.tweet.reply_count, 1)
+
+    def test_failure_post_with_empty_content(self):
+        response = self.client.post(reverse("tweets:reply", kwargs={"pk": self.tweet.pk}), {"content": ""})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Tweet.objects.count(), 1)
+
+    def test_failure_post_with_not_exist_tweet(self):
+        response = self.client.post(reverse("tweets:reply", kwargs={"pk": 1000}), {"content": "reply"})
+        self.assertEqual(response.status_code, 404)
+
+    @mock.patch("tweets.models.MAX_REPLY_DEPTH", 1)
+    def test_failure_post_too_deep(self):
+        reply = Tweet.objects.create(user=self.user, content="reply", parent=self.tweet)
+        response = self.client.post(reverse("tweets:reply", kwargs={"pk": reply.pk}), {"content": "too deep"})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Tweet.objects.filter(content="too deep").exists())
+
+
+class TestThreads(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="test", password="password1")
+        self.root = Tweet.objects.create(user=self.user, content="root")
+        self.first = Tweet.objects.create(user=self.user, content="first", parent=self.root)
+        self.nested = Tweet.objects.create(user=self.user, content="nested", parent=self.first)
+        self.second = Tweet.objects.create(user=self.user, content="second", parent=self.root)
+        self.other = Tweet.objects.create(user=self.user, content="other")
+
+    def test_descendants_depth_first(self):
+        with self.assertNumQueries(1):
+            descendants = get_descendants(self.root)
+        self.assertEqual(descendants, [self.first, self.nested, self.second])
+
+    def test_descendants_with_max_depth(self):
+        self.assertEqual(get_descendants(self.root, max_depth=1), [self.first, self.second])
+        self.assertEqual(get_descendants(self.first), [self.nested])
+
+    def test_ancestors(self):
+        self.assertEqual(get_ancestors(self.nested), [self.root, self.first])
+        self.assertEqual(get_ancestors(self.root), [])
+
+    def test_reply_count_on_delete(self):
+        self.nested.delete()
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.reply_count, 0)
+
+    def test_detail_shows_conversation(self):
+        self.client.login(username="test", password="password1")
+        response = self.client.get(reverse("tweets:detail", kwargs={"pk": self.first.pk}))
+        self.assertEqual(response.context["ancestors"], [self.root])
+        self.assertEqual(response.context["replies"], [self.nested])
+
+
+class TestTweetAdmin(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="admin", password="password1")
+        self.client.force_login(self.admin)
+        self.tweets = [Tweet.objects.create(user=self.admin, content=f"tweet {i}") for i in range(5)]
+
+    def test_success_get_changelist(self):
+        response = self.client.get(reverse("admin:tweets_tweet_changelist"))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "tweet 4")
+
+    def test_success_get_change_form(self):
+        response = self.client.get(reverse("admin:tweets_tweet_change", args=[self.tweets[0].pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, '<select name="user"')
+
+    @override_settings(ADMIN_ACTION_CHUNK_SIZE=2)
+    def test_success_delete_in_chunks(self):
+        data = {"action": "delete_in_chunks", "_selected_action": [tweet.pk for tweet in self.tweets[:3]]}
+        response = self.client.post(reverse("admin:tweets_tweet_changelist"), data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Tweet.objects.count(), 2)
+
+
+class TestSnowflake(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.lock_dir = directory.name
+        override = override_settings(SNOWFLAKE_WORKER_ID=None, SNOWFLAKE_LOCK_DIR=self.lock_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+        for name, value in [("_generator", None), ("_claimed", [])]:
+            patcher = mock.patch(f"tweets.ids.{name}", value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.release_worker_ids)
+
+    def release_worker_ids(self):
+        for fd in ids._claimed:
+            os.close(fd)
+
+    def test_ids_are_unique_and_increasing(self):
+        generator = Snowflake(worker_id=3)
+        generated = [generator.next_id() for _ in range(2000)]
+        self.assertEqual(generated, sorted(set(generated)))
+
+    def test_shard_roundtrip(self):
+        id = ids.with_shard(Snowflake(worker_id=1).next_id(), 5)
+        self.assertEqual(ids.shard_of(id), 5)
+        self.assertEqual(ids.shard_of(ids.with_shard(id, 0)), 0)
+
+    def test_legacy_ids_live_on_first_shard(self):
+        self.assertEqual(ids.shard_of(12345), 0)
+
+    def test_failure_with_invalid_worker_id(self):
+        with self.assertRaises(ValueError):
+            Snowflake(worker_id=ids.MAX_WORKER + 1)
+
+    def test_worker_id_is_claimed(self):
+        generator = ids.get_generator()
+        self.assertEqual(generator.worker_id, 0)
+        self.assertIs(ids.get_generator(), generator)
+        # A forked child claims an id of its own.
+        with mock.patch("os.getpid", return_value=os.getpid() + 1):
+            self.assertEqual(ids.get_generator().worker_id, 1)
+
+    def test_other_processes_skip_claimed_ids(self):
+        self.assertEqual(ids.claim_worker_id(), 0)
+        with mock.patch.dict("os.environ", SNOWFLAKE_LOCK_DIR=self.lock_dir), spawn_pool(1) as pool:
+            self.assertEqual(pool.submit(ids.claim_worker_id).result(), 1)
+        # The child's lock went away with it.
+        self.assertEqual(ids.claim_worker_id(), 1)
+
+    def test_failure_when_every_worker_id_is_taken(self):
+        with mock.patch("tweets.ids.MAX_WORKER", 1):
+            ids.claim_worker_id()
+            ids.claim_worker_id()
+            with self.assertRaises(ImproperlyConfigured):
+                ids.claim_worker_id()
+
+    def test_one_generator_across_threads(self):
+        barrier = threading.Barrier(8)
+        generated = []
+
+        def generate():
+            barrier.wait()
+            generated.extend(ids.next_id() for _ in range(100))
+
+        threads = [threading.Thread(target=generate) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(generated)), 800)
+        self.assertEqual(len(ids._claimed), 1)
+
+
+@override_settings(TWEET_SHARDS=["default", "shard1"])
+class TestTweetShardRouter(TestCase):
+    def setUp(self):
+        self.router = TweetShardRouter()
+
+    def test_tweet_routed_by_id(self):
+        tweet = Tweet(id=ids.with_shard(ids.next_id(), 1))
+        self.assertEqual(self.router.db_for_write(Tweet, instance=tweet), "shard1")
+        self.assertEqual(self.router.db_for_read(Like, instance=tweet), "shard1")
+        self.assertIsNone(self.router.db_for_read(Tweet))
+        self.assertIsNone(self.router.db_for_read(User, instance=tweet))
+
+    def test_only_tweets_migrate_on_shards(self):
+        self.assertTrue(self.router.allow_migrate("shard1", "tweets"))
+        self.assertFalse(self.router.allow_migrate("shard1", "accounts"))
+        self.assertIsNone(self.router.allow_migrate("default", "accounts"))
+
+
+@skipUnless(len(settings.TWEET_SHARDS) > 1, "Run with TWEET_SHARD_COUNT=3 to test against local SQLite shards.")
+class TestShardedTimeline(TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        cache.clear()
+        liked_index.clear()
+        self.users = [User.objects.create_user(username=f"user{i}", password="password1") for i in range(6)]
+        self.client.login(username="user0", password="password1")
+        for user in self.users:
+            tweet = Tweet.objects.create(user=user, content=f"tweet by {user.username}")
+            Like.objects.create(user=self.users[0], tweet=tweet)
+
+    def test_rows_live_on_author_shard(self):
+        for user in self.users:
+            alias = shard_for_user(user.pk)
+            self.assertEqual(Tweet.objects.using(alias).filter(user=user).count(), 1)
+            self.assertEqual(Like.objects.using(alias).filter(tweet__user=user).count(), 1)
+
+    def test_home_merges_all_shards(self):
+        response = self.client.get(reverse("tweets:home"))
+        tweets = response.context["tweet_list"]
+        self.assertEqual(len(tweets), len(self.users))
+        self.assertEqual([t.created_at for t in tweets], sorted((t.created_at for t in tweets), reverse=True))
+        self.assertEqual(len(response.context["user_liked_list"]), len(self.users))
+
+    def test_detail_and_like_on_other_shard(self):
+        tweet = Tweet.objects.using(shard_for_user(self.users[1].pk)).get(user=self.users[1])
+        response = self.client.get(reverse("tweets:detail", kwargs={"pk": tweet.pk}))
+        self.assertEqual(response.context["tweet"], tweet)
+        response = self.client.post(reverse("tweets:unlike", kwargs={"pk": tweet.pk}))
+        self.assertEqual(response.json()["liked_count"], 0)
+
+
+class TestImpressions(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="test", password="password1")
+        self.other = User.objects.create_user(username="other", password="password1")
+        self.tweet = Tweet.objects.create(user=self.user, content="test_tweet")
+        self.addCleanup(impressions_buffer.clear)
+
+    def get(self, url, user):
+        self.client.force_login(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(url)
+
+    def test_views_and_unique_viewers(self):
+        url = reverse("tweets:detail", kwargs={"pk": self.tweet.pk})
+        self.get(url, self.user)
+        self.get(url, self.user)
+        self.get(url, self.other)
+        self.tweet.refresh_from_db()
+        self.assertEqual(self.tweet.view_count, 0)
+
+        impressions_buffer.flush()
+        self.tweet.refresh_from_db()
+        self.assertEqual(self.tweet.view_count, 3)
+        self.assertEqual(self.tweet.unique_viewers, 2)
+
+    def test_viewers_merge_across_flushes(self):
+        url = reverse("tweets:detail", kwargs={"pk": self.tweet.pk})
+        self.get(url, self.user)
+        impressions_buffer.flush()
+        self.get(url, self.user)
+        self.get(url, self.other)
+        impressions_buffer.flush()
+        self.tweet.refresh_from_db()
+        self.assertEqual((self.tweet.view_count, self.tweet.unique_viewers), (3, 2))
+
+    def test_home_impressions_in_one_update(self):
+        Tweet.objects.bulk_create([Tweet(user=self.other, content=f"tweet {i}", path="") for i in range(20)])
+        self.get(reverse("tweets:home"), self.user)
+        self.get(reverse("tweets:home"), self.user)
+        with CaptureQueriesContext(connection) as queries:
+            impressions_buffer.flush()
+        self.assertEqual(sum(query["sql"].startswith("UPDATE") for query in queries), 1)
+        self.assertEqual(set(Tweet.objects.values_list("impression_count", flat=True)), {2})
+        self.assertEqual(set(Tweet.objects.values_list("view_count", flat=True)), {0})
+
+    def test_timeline_does_not_load_viewers(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("tweets:home"))
+        self.assertIn("viewers", response.context["tweet_list"][0].get_deferred_fields())
+
+    def test_save_keeps_counters(self):
+        self.get(reverse("tweets:detail", kwargs={"pk": self.tweet.pk}), self.other)
+        impressions_buffer.flush()
+        # self.tweet was loaded before the view was counted.
+        self.tweet.content = "edited"
+        self.tweet.save()
+        self.tweet.refresh_from_db()
+        self.assertEqual((self.tweet.content, self.tweet.view_count, self.tweet.unique_viewers), ("edited", 1, 1))
+
+    @override_settings(IMPRESSIONS_BUFFER_SIZE=1)
+    def test_flush_when_full(self):
+        self.get(reverse("tweets:detail", kwargs={"pk": self.tweet.pk}), self.other)
+        self.tweet.refresh_from_db()
+        self.assertEqual(self.tweet.view_count, 1)
+        self.assertEqual(len(impressions_buffer), 0)
+
+
+class TestForYouView(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.viewer = User.objects.create_user(username="viewer", password="password1")
+        self.followed = User.objects.create_user(username="followed", password="password1")
+        self.second = User.objects.create_user(username="second", password="password1")
+        self.stranger = User.objects.create_user(username="stranger", password="password1")
+        FriendShip.objects.follow(self.viewer, self.followed)
+        FriendShip.objects.follow(self.followed, self.second)
+        self.addCleanup(impressions_buffer.clear)
+
+    def tweet(self, user, content, likes=()):
+        tweet = Tweet.objects.create(user=user, content=content)
+        for liker in likes:
+            Like.objects.create(user=liker, tweet=tweet)
+        return tweet
+
+    def test_candidates(self):
+        followed = self.tweet(self.followed, "followed")
+        second = self.tweet(self.second, "second")
+        self.tweet(self.stranger, "stranger")
+        self.tweet(self.viewer, "own")
+        self.client.force_login(self.viewer)
+        response = self.client.get(reverse("tweets:for_you"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "tweets/for_you.html")
+        self.assertEqual({tweet.pk for tweet in response.context["tweet_list"]}, {followed.pk, second.pk})
+        self.assertFalse(response.context["ranking_fallback"])
+
+    def test_liked_and_followed_tweets_rank_first(self):
+        plain = self.tweet(self.second, "plain")
+        popular = self.tweet(self.second, "popular", likes=[self.stranger])
+        followed = self.tweet(self.followed, "followed")
+        Tweet.objects.filter(pk=followed.pk).update(created_at=plain.created_at)
+        Tweet.objects.filter(pk=popular.pk).update(created_at=plain.created_at)
+        feed = rank_for_you(self.viewer.pk)
+        self.assertEqual([tweet.pk for tweet in feed.tweets], [popular.pk, followed.pk, plain.pk])
+
+        # Tweets the viewer already liked sink.
+        Like.objects.create(user=self.viewer, tweet=popular)
+        feed = rank_for_you(self.viewer.pk)
+        self.assertEqual([tweet.pk for tweet in feed.tweets], [followed.pk, plain.pk, popular.pk])
+
+    def test_hidden_authors_are_excluded(self):
+        self.tweet(self.second, "second")
+        block(self.viewer, self.second)
+        self.assertEqual(rank_for_you(self.viewer.pk).tweets, [])
+
+    def test_ranked_ids_are_cached(self):
+        first = self.tweet(self.followed, "first")
+        self.client.force_login(self.viewer)
+        self.client.get(reverse("tweets:for_you"))
+        self.tweet(self.followed, "later")
+        response = self.client.get(reverse("tweets:for_you"))
+        self.assertEqual([tweet.pk for tweet in response.context["tweet_list"]], [first.pk])
+
+        # Accounts hidden since the ids were ranked are left out at once.
+        block(self.viewer, self.followed)
+        self.assertEqual(self.client.get(reverse("tweets:for_you")).context["tweet_list"], [])
+
+    @override_settings(RANKING_BUDGET_MS=-1)
+    def test_fallback_to_newest_first(self):
+        old = self.tweet(self.followed, "old", likes=[self.second, self.stranger])
+        new = self.tweet(self.second, "new")
+        feed = rank_for_you(self.viewer.pk)
+        self.assertTrue(feed.fallback)
+        self.assertEqual([tweet.pk for tweet in feed.tweets], [new.pk, old.pk])
+        self.client.force_login(self.viewer)
+        self.assertContains(self.client.get(reverse("tweets:for_you")), "新しい順に表示しています")
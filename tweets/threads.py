@@ -0,0 +1,37 @@
+"""Conversation retrieval on top of the materialized reply path (see ``Tweet.path``)."""
+from operator import attrgetter
+
+from django.db.models import prefetch_related_objects
+
+from .models import Tweet
+from .sharding import is_sharded, on_all_shards
+
+# Sorts after every hex digit, so [path, path + PATH_END) is exactly the subtree of path.
+PATH_END = "g"
+
+
+def _fetch_by_path(queryset):
+    if not is_sharded():
+        return list(queryset.select_related("user").order_by("path"))
+    tweets = on_all_shards(queryset)
+    prefetch_related_objects(tweets, "user")
+    return sorted(tweets, key=attrgetter("path"))
+
+
+def get_ancestors(tweet):
+    """Tweets from the conversation root down to ``tweet``'s parent."""
+    if not tweet.parent_id:
+        return []
+    return _fetch_by_path(Tweet.objects.defer("viewers").filter(pk__in=tweet.ancestor_ids))
+
+
+def get_descendants(tweet, max_depth=None):
+    """Replies below ``tweet`` in depth-first order, at most ``max_depth`` levels down.
+
+    The whole subtree is a single range scan on the path index (one per shard),
+    however deep or wide the conversation is.
+    """
+    queryset = Tweet.objects.defer("viewers").filter(path__gt=tweet.path, path__lt=tweet.path + PATH_END)
+    if max_depth is not None:
+        queryset = queryset.filter(depth__lte=tweet.depth + max_depth)
+    return _fetch_by_path(queryset)
@@ -5,9 +5,12 @@ from . import views
 app_name = "tweets"
 urlpatterns = [
     path("home/", views.HomeView.as_view(), name="home"),
+    path("for-you/", views.ForYouView.as_view(), name="for_you"),
     path("create/", views.TweetCreateView.as_view(), name="create"),
     path("<int:pk>/", views.TweetDetailView.as_view(), name="detail"),
     path("<int:pk>/delete/", views.TweetDeleteView.as_view(), name="delete"),
     path("<int:pk>/like/", views.LikeView.as_view(), name="like"),
     path("<int:pk>/unlike/", views.UnlikeView.as_view(), name="unlike"),
+    path("<int:pk>/likers/", views.LikerListView.as_view(), name="likers"),
+    path("<int:pk>/reply/", views.ReplyView.as_view(), name="reply"),
 ]
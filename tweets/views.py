@@ -1,12 +1,30 @@
+from django.conf import settings
+from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.http import JsonResponse
-from django.shortcuts import get_object_or_404
-from django.urls import reverse_lazy
-from django.views.generic import CreateView, DeleteView, DetailView, ListView, View
+from django.core.exceptions import ValidationError
+from django.db.models import QuerySet, prefetch_related_objects
+from django.http import HttpResponseBadRequest, HttpResponseRedirect, JsonResponse
+from django.shortcuts import get_object_or_404, render
+from django.template.loader import get_template
+from django.urls import reverse, reverse_lazy
+from django.views.generic import CreateView, DeleteView, DetailView, ListView, TemplateView, View
+
+from accounts.blocking import get_block_set
+from jobs.queue import enqueue
+from mysite.pagination import paginate_by_cursor
+from mysite.streaming import can_stream, chunked, render_streamed
+from notifications.models import Notification
+from notifications.notify import mentioned_usernames, notify
+from notifications.tasks import deliver_mentions
 
 from .forms import TweetForm
+from .impressions import record_impressions, record_view
+from .likes import liked_tweet_ids
 from .models import Like, Tweet
+from .ranking import cached_for_you
+from .sharding import is_sharded, join_users, newest_first, shard_for_id
+from .threads import get_ancestors, get_descendants
 
 User = get_user_model()
 
@@ -14,15 +32,60 @@ User = get_user_model()
 class HomeView(LoginRequiredMixin, ListView):
     model = Tweet
     template_name = "tweets/home.html"
+    context_object_name = "tweet_list"
     ordering = "-created_at"
-    queryset = model.objects.select_related("user").prefetch_related("likes")
+    # The viewers sketch is only shown on the detail page.
+    queryset = model.objects.defer("viewers").select_related("user").prefetch_related("likes")
+
+    def get(self, request, *args, **kwargs):
+        if not (settings.HOME_STREAMING and can_stream(request)):
+            return super().get(request, *args, **kwargs)
+        tweets = self.get_timeline()
+        if isinstance(tweets, QuerySet):
+            # Pick the database now: PrimaryStickinessMiddleware's pin ends when the view returns.
+            tweets = tweets.using(tweets.db).iterator(chunk_size=settings.HOME_STREAMING_CHUNK_SIZE)
+        fragments = self.render_chunks(tweets, get_block_set(request.user.pk))
+        return render_streamed(request, self.template_name, {"view": self}, fragments)
+
+    def get_timeline(self):
+        if not is_sharded():
+            return super().get_queryset()
+        tweets = newest_first(Tweet.objects.defer("viewers").prefetch_related("likes"))
+        prefetch_related_objects(tweets, "user")
+        return tweets
+
+    def get_queryset(self):
+        return get_block_set(self.request.user.pk).exclude(self.get_timeline())
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        user_like_list = (
-            Like.objects.select_related("tweet").filter(user=self.request.user).values_list("tweet", flat=True)
-        )
-        context["user_liked_list"] = user_like_list
+        context["user_liked_list"] = liked_tweet_ids(self.request.user.pk, context["tweet_list"])
+        record_impressions(context["tweet_list"])
+        return context
+
+    def render_chunks(self, tweets, block_set):
+        """Render ``tweets`` ``HOME_STREAMING_CHUNK_SIZE`` at a time, while the response is sent."""
+        template = get_template("tweets/tweet_list.html")
+        user_id = self.request.user.pk
+        for chunk in chunked(tweets, settings.HOME_STREAMING_CHUNK_SIZE):
+            chunk = block_set.exclude(chunk)
+            yield template.render({"tweet_list": chunk, "user_liked_list": liked_tweet_ids(user_id, chunk)})
+            record_impressions(chunk)
+
+
+class ForYouView(LoginRequiredMixin, TemplateView):
+    """Tweets of followed and second-degree accounts, ranked by ``tweets.ranking``."""
+
+    template_name = "tweets/for_you.html"
+    paginate_by = 50
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        feed = cached_for_you(self.request.user.pk, limit=self.paginate_by)
+        context["tweet_list"] = feed.tweets
+        context["ranking_fallback"] = feed.fallback
+        context["user_liked_list"] = liked_tweet_ids(self.request.user.pk, feed.tweets)
+        record_impressions(feed.tweets)
         return context
 
 
@@ -34,31 +97,80 @@ class TweetCreateView(LoginRequiredMixin, CreateView):
 
     def form_valid(self, form):
         form.instance.user = self.request.user
-        return super().form_valid(form)
+        response = super().form_valid(form)
+        if mentioned_usernames(self.object.content):
+            enqueue(deliver_mentions, tweet_id=self.object.pk)
+        return response
+
+
+class ShardedTweetMixin:
+    def get_queryset(self):
+        return join_users(Tweet.objects.using(shard_for_id(self.kwargs["pk"])))
 
 
-class TweetDetailView(LoginRequiredMixin, DetailView):
+class TweetDetailView(LoginRequiredMixin, ShardedTweetMixin, DetailView):
     template_name = "tweets/detail.html"
     model = Tweet
-    queryset = model.objects.select_related("user")
+    reply_depth = 5
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["ancestors"] = get_ancestors(self.object)
+        context["replies"] = get_descendants(self.object, max_depth=self.reply_depth)
+        context["reply_form"] = TweetForm()
+        record_view(self.object, self.request.user.pk)
+        return context
 
-class TweetDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
+
+class ReplyView(LoginRequiredMixin, View):
+    def post(self, request, *args, **kwargs):
+        parent = get_object_or_404(Tweet.objects.using(shard_for_id(kwargs["pk"])), pk=kwargs["pk"])
+        form = TweetForm(request.POST)
+        if not form.is_valid():
+            for error in form.errors["content"]:
+                messages.warning(request, error)
+            return HttpResponseBadRequest(render(request, "error/400.html"))
+        reply = Tweet(user=request.user, content=form.cleaned_data["content"], parent=parent)
+        try:
+            reply.save()
+        except ValidationError as e:
+            messages.warning(request, e.message)
+            return HttpResponseBadRequest(render(request, "error/400.html"))
+        if mentioned_usernames(reply.content):
+            enqueue(deliver_mentions, tweet_id=reply.pk)
+        return HttpResponseRedirect(reverse("tweets:detail", kwargs={"pk": parent.pk}))
+
+
+class TweetDeleteView(LoginRequiredMixin, UserPassesTestMixin, ShardedTweetMixin, DeleteView):
     template_name = "tweets/delete.html"
     model = Tweet
     success_url = reverse_lazy("tweets:home")
-    queryset = model.objects.select_related("user")
 
     def test_func(self, **kwargs):
         tweet = self.get_object()
         return tweet.user == self.request.user
 
 
+class LikerListView(LoginRequiredMixin, ShardedTweetMixin, TemplateView):
+    template_name = "tweets/likers.html"
+    paginate_by = 50
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        tweet = get_object_or_404(self.get_queryset(), pk=self.kwargs["pk"])
+        likes = join_users(Like.objects.using(shard_for_id(tweet.pk)).filter(tweet=tweet))
+        context["tweet"] = tweet
+        context["page"] = paginate_by_cursor(likes, self.request.GET.get("cursor"), self.paginate_by)
+        return context
+
+
 class LikeView(LoginRequiredMixin, View):
     def post(self, request, *arg, **kwargs):
-        tweet = get_object_or_404(Tweet, pk=kwargs["pk"])
+        tweet = get_object_or_404(Tweet.objects.using(shard_for_id(kwargs["pk"])), pk=kwargs["pk"])
         user = request.user
-        Like.objects.get_or_create(user=user, tweet=tweet)
+        _, created = Like.objects.using(shard_for_id(tweet.pk)).get_or_create(user=user, tweet=tweet)
+        if created:
+            notify(tweet.user_id, Notification.Verb.LIKE, user.pk, tweet.pk)
         like_count = tweet.likes.count()
         context = {
             "liked_count": like_count,
@@ -69,9 +181,9 @@ class LikeView(LoginRequiredMixin, View):
 
 class UnlikeView(LoginRequiredMixin, View):
     def post(self, request, *arg, **kwargs):
-        tweet = get_object_or_404(Tweet, pk=kwargs["pk"])
+        tweet = get_object_or_404(Tweet.objects.using(shard_for_id(kwargs["pk"])), pk=kwargs["pk"])
         user = request.user
-        like = Like.objects.filter(user=user, tweet=tweet)
+        like = Like.objects.using(shard_for_id(tweet.pk)).filter(user=user, tweet=tweet)
 
         if like.exists():
             like.delete()
@@ -0,0 +1,47 @@
+import io
+import time
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from mysite.benchmarks import scenario
+from mysite.loadtest import request_host
+from mysite.page_cache import page_cache
+
+
+def throughput(application, environ, requests):
+    """Call the WSGI ``application`` like a server would, ``requests`` times in a row."""
+
+    def start_response(status, headers):
+        pass
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = application({**environ, "wsgi.input": io.BytesIO()}, start_response)
+        for _ in response:
+            pass
+        response.close()
+    elapsed = time.perf_counter() - start
+    return {"requests_per_s": round(requests / elapsed), "mean_us": round(elapsed / requests * 1e6)}
+
+
+@scenario("anonymous_pages")
+def anonymous_pages(requests=5000):
+    """Anonymous requests per second for the welcome page through the WSGI handler, rendered vs. cached."""
+    host = request_host()
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": reverse("welcome:index"),
+        "SERVER_NAME": host,
+        "SERVER_PORT": "80",
+        "HTTP_HOST": host,
+        "wsgi.url_scheme": "http",
+    }
+    application = WSGIHandler()
+    page_cache().clear()
+    with override_settings(ANONYMOUS_PAGE_CACHE={}):
+        rendered = throughput(application, environ, requests)
+    cached = throughput(application, environ, requests)
+    page_cache().clear()
+    return [("welcome: rendered", rendered), ("welcome: page cache", cached)]